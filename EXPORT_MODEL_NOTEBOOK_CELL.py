@@ -57,6 +57,15 @@ try:
         pickle.dump(model_info, f)
     print("✅ Model info saved to model/model_info.pkl")
     
+    # 5. Rebuild the single-file bundle, which the backend prefers over the files above
+    try:
+        from model_bundle import BUNDLE_FILE, convert_artifacts
+        convert_artifacts('model')
+        print(f"✅ Bundle saved to model/{BUNDLE_FILE}")
+    except ImportError:
+        print("⚠️  model_bundle.py not found; run 'python model_bundle.py --model-dir model' "
+              "from the project folder before deploying")
+    
     print(f"\n🎉 MODEL EXPORT COMPLETE!")
     print("=" * 50)
     print("📁 Files created in 'model/' directory:")
@@ -0,0 +1,196 @@
+"""
+Sharded Audio Containers
+========================
+Stores many short clips in a few large files instead of one file per clip.
+
+A shard is a plain concatenation of encoded clips (``shard-00000.bin``) with a
+JSON-lines index beside it (``shard-00000.index.jsonl``). Each index line holds
+the clip's key, byte offset and length, codec and whatever metadata the
+writer was given (note label, source, transform parameters, ...):
+
+    with ShardWriter('augmented_talking_drum_dataset', codec='flac') as writer:
+        writer.append('Do/x.wav', encode_audio(audio, 22050, 'flac'), {'note': 'Do'})
+
+    reader = ShardReader('augmented_talking_drum_dataset')
+    for audio, entry in reader:             # sequential, one pass per shard
+        ...
+    audio, entry = reader['Do/x.wav']       # random access by key or position
+
+Clips are encoded as 16-bit WAV (what the per-file output writes) or FLAC,
+which is lossless relative to it and about half the size. A clip's index line
+is written only after its bytes, so an interrupted writer never indexes a
+truncated clip. If the same key is written again, the later entry wins.
+"""
+
+import hashlib
+import io
+import json
+from pathlib import Path
+
+import soundfile as sf
+
+SHARD_CODECS = ('wav', 'flac')
+SHARD_PREFIX = 'shard'
+DATA_SUFFIX = '.bin'
+INDEX_SUFFIX = '.index.jsonl'
+
+
+def encode_audio(audio, sr, codec='wav'):
+    """Encode a clip as 16-bit PCM in a WAV or FLAC container"""
+    if codec not in SHARD_CODECS:
+        raise ValueError(f"Unknown shard codec: {codec}")
+    buffer = io.BytesIO()
+    sf.write(buffer, audio, sr, format='WAV', subtype='PCM_16')
+    if codec == 'wav':
+        return buffer.getvalue()
+
+    # libsndfile's FLAC path rounds floats differently, so FLAC re-encodes the
+    # WAV's 16-bit samples; both codecs then hold exactly what a per-file WAV holds
+    buffer.seek(0)
+    pcm, _ = sf.read(buffer, dtype='int16')
+    buffer = io.BytesIO()
+    sf.write(buffer, pcm, sr, format='FLAC', subtype='PCM_16')
+    return buffer.getvalue()
+
+
+def decode_audio(data):
+    """Decode a clip written by ``encode_audio``: (audio, sample rate)"""
+    return sf.read(io.BytesIO(data), dtype='float32')
+
+
+def shard_blob_sha256(shard_path, offset, length):
+    """SHA-256 of one clip's bytes in a shard, or None if the shard is missing or short"""
+    try:
+        with open(shard_path, 'rb') as f:
+            f.seek(offset)
+            data = f.read(length)
+    except OSError:
+        return None
+    return hashlib.sha256(data).hexdigest() if len(data) == length else None
+
+
+def _shard_numbers(path, prefix):
+    numbers = []
+    for index_path in Path(path).glob(f'{prefix}-*{INDEX_SUFFIX}'):
+        number = index_path.name[len(prefix) + 1:-len(INDEX_SUFFIX)]
+        if number.isdigit():
+            numbers.append(int(number))
+    return sorted(numbers)
+
+
+class ShardWriter:
+    """
+    Appends encoded clips to size-capped shards, starting after any existing
+    ones. Writers that share a folder without coordinating (e.g. separate
+    machines whose outputs are merged later) need distinct prefixes.
+    """
+
+    def __init__(self, path, codec='wav', shard_size_mb=256, prefix=SHARD_PREFIX):
+        if codec not in SHARD_CODECS:
+            raise ValueError(f"Unknown shard codec: {codec}")
+        self.path = Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+        self.codec = codec
+        self.max_bytes = int(shard_size_mb * 1e6)
+        self.prefix = prefix
+        existing = _shard_numbers(self.path, prefix)
+        self._next_shard = existing[-1] + 1 if existing else 0
+        self._data_file = None
+        self._index_file = None
+
+    def _open_next(self):
+        self.close()
+        name = f'{self.prefix}-{self._next_shard:05d}'
+        self._next_shard += 1
+        self.shard_name = name + DATA_SUFFIX
+        self._data_file = open(self.path / self.shard_name, 'ab')
+        self._index_file = open(self.path / (name + INDEX_SUFFIX), 'a')
+
+    def append(self, key, data, metadata):
+        """
+        Append one encoded clip under a key
+
+        Returns:
+            Its location: {'shard', 'offset', 'length'}, with 'shard'
+            relative to the writer's folder
+        """
+        if self._data_file is None or self._data_file.tell() >= self.max_bytes:
+            self._open_next()
+
+        offset = self._data_file.tell()
+        self._data_file.write(data)
+        self._data_file.flush()
+
+        location = {'shard': self.shard_name, 'offset': offset, 'length': len(data)}
+        self._index_file.write(json.dumps({'key': key, **metadata, 'codec': self.codec, **location}) + '\n')
+        self._index_file.flush()
+        return location
+
+    def close(self):
+        for f in (self._data_file, self._index_file):
+            if f is not None:
+                f.close()
+        self._data_file = self._index_file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class ShardReader:
+    """Sequential and random access to the clips in a folder of shards"""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        entries = {}
+        for index_path in sorted(self.path.glob(f'{SHARD_PREFIX}*{INDEX_SUFFIX}')):
+            with open(index_path) as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue  # Partially written line from an interrupted writer
+                    entries.pop(entry['key'], None)  # Re-insert so order follows the latest write
+                    entries[entry['key']] = entry
+
+        self.entries = list(entries.values())
+        self._positions = {entry['key']: i for i, entry in enumerate(self.entries)}
+        self._handles = {}
+
+    def __len__(self):
+        return len(self.entries)
+
+    def keys(self):
+        return list(self._positions)
+
+    def read_bytes(self, entry):
+        handle = self._handles.get(entry['shard'])
+        if handle is None:
+            handle = self._handles[entry['shard']] = open(self.path / entry['shard'], 'rb')
+        handle.seek(entry['offset'])
+        return handle.read(entry['length'])
+
+    def __getitem__(self, key):
+        """(audio, index entry) by key or position"""
+        entry = self.entries[key if isinstance(key, int) else self._positions[key]]
+        audio, _ = decode_audio(self.read_bytes(entry))
+        return audio, entry
+
+    def __iter__(self):
+        """Yield (audio, index entry) for every clip, reading each shard front to back"""
+        for entry in sorted(self.entries, key=lambda e: (e['shard'], e['offset'])):
+            audio, _ = decode_audio(self.read_bytes(entry))
+            yield audio, entry
+
+    def close(self):
+        for handle in self._handles.values():
+            handle.close()
+        self._handles.clear()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,192 @@
+"""
+Augmentation Profiling
+======================
+Per-transform instrumentation for ``TalkingDrumAugmentationSystem``, and a
+standalone throughput benchmark of each transform on synthetic clips.
+
+A profiler attached to the augmenter (``augmenter.profiler = TransformProfiler()``,
+or ``--profile`` on the command line) records call count, total and mean time
+for each transform and for load/write I/O, and the memory each stage allocated:
+the peak of traced allocations (``tracemalloc``, which NumPy reports its
+buffers to) above what was allocated when the stage began. Tracing slows
+allocation-heavy code, so ``TransformProfiler(trace_memory=False)`` records
+time alone, as the time budget's planned-vs-actual report needs. Worker
+processes send their measurements back with each variation, so a parallel run
+reports the time spent across all workers.
+"""
+
+import json
+import os
+import tempfile
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+import numpy as np
+
+PROFILE_FILE = 'augmentation_profile.json'
+
+# Clip lengths (seconds) used by the benchmark
+BENCHMARK_LENGTHS = (1.0, 2.5, 5.0, 10.0)
+
+
+class TransformProfiler:
+    """Accumulates call count, time and (if traced) allocation peaks per named stage"""
+
+    def __init__(self, trace_memory=True):
+        self.trace_memory = trace_memory
+        self.stats = {}  # Plain dict so the profiler pickles with the augmenter
+        self._open = []  # [allocated at start, peak so far] of each stage in progress, outermost first
+
+    def _entry(self, name):
+        return self.stats.setdefault(name, {'calls': 0, 'seconds': 0.0, 'peak_bytes': 0, 'max_peak_bytes': 0})
+
+    def record(self, name, seconds, peak_bytes=0):
+        entry = self._entry(name)
+        entry['calls'] += 1
+        entry['seconds'] += seconds
+        entry['peak_bytes'] += int(peak_bytes)
+        entry['max_peak_bytes'] = max(entry['max_peak_bytes'], int(peak_bytes))
+
+    @contextmanager
+    def stage(self, name):
+        """
+        Time the enclosed block and measure its allocation peak. Stages may
+        nest; an enclosing stage's peak still covers the nested one.
+        """
+        if not self.trace_memory:
+            start = time.perf_counter()
+            try:
+                yield
+            finally:
+                self.record(name, time.perf_counter() - start)
+            return
+
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+        current, peak = tracemalloc.get_traced_memory()
+        if self._open:
+            self._open[-1][1] = max(self._open[-1][1], peak)
+        tracemalloc.reset_peak()
+        self._open.append([current, current])
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - start
+            base, earlier_peak = self._open.pop()
+            stage_peak = max(earlier_peak, tracemalloc.get_traced_memory()[1])
+            if self._open:
+                self._open[-1][1] = max(self._open[-1][1], stage_peak)
+            self.record(name, seconds, stage_peak - base)
+
+    def merge(self, stats):
+        """Add measurements taken elsewhere (e.g. by a worker process)"""
+        for name, other in stats.items():
+            entry = self._entry(name)
+            for key in ('calls', 'seconds', 'peak_bytes'):
+                entry[key] += other[key]
+            entry['max_peak_bytes'] = max(entry['max_peak_bytes'], other['max_peak_bytes'])
+
+    def drain(self):
+        """Return the measurements so far as a plain dict and reset"""
+        stats = {name: dict(entry) for name, entry in self.stats.items()}
+        self.stats.clear()
+        return stats
+
+    def summary(self):
+        """Per-stage totals, slowest first, with mean time, mean and largest allocation peak, and share of the total"""
+        total = sum(entry['seconds'] for entry in self.stats.values()) or 1.0
+        rows = {}
+        for name, entry in sorted(self.stats.items(), key=lambda item: -item[1]['seconds']):
+            rows[name] = {
+                'calls': entry['calls'],
+                'total_s': entry['seconds'],
+                'mean_ms': 1000.0 * entry['seconds'] / max(entry['calls'], 1),
+                'mean_peak_bytes': entry['peak_bytes'] / max(entry['calls'], 1),
+                'max_peak_bytes': entry['max_peak_bytes'],
+                'share': entry['seconds'] / total,
+            }
+        return rows
+
+    def format_table(self):
+        memory = f"{'peak MB':>10}{'max MB':>10}" if self.trace_memory else ''
+        lines = [f"   {'stage':<16}{'calls':>8}{'total s':>10}{'mean ms':>10}{memory}{'share':>8}"]
+        for name, row in self.summary().items():
+            if self.trace_memory:
+                memory = f"{row['mean_peak_bytes'] / 1e6:>10.2f}{row['max_peak_bytes'] / 1e6:>10.2f}"
+            lines.append(f"   {name:<16}{row['calls']:>8}{row['total_s']:>10.2f}{row['mean_ms']:>10.2f}"
+                         f"{memory}{row['share']:>8.1%}")
+        return '\n'.join(lines)
+
+    def save(self, path):
+        with open(path, 'w') as f:
+            json.dump(self.summary(), f, indent=2)
+
+
+def synthetic_clip(seconds, sr, rng):
+    """Decaying two-partial tone with a little noise, roughly like a drum stroke"""
+    t = np.arange(int(seconds * sr)) / sr
+    tone = np.sin(2 * np.pi * 180 * t * (1 - 0.05 * t)) + 0.4 * np.sin(2 * np.pi * 540 * t)
+    clip = np.exp(-3 * t) * tone + 0.01 * rng.standard_normal(len(t))
+    return (0.8 * clip / np.max(np.abs(clip))).astype(np.float32)
+
+
+def benchmark_transforms(augmenter, lengths=BENCHMARK_LENGTHS, repeats=5, seed=0):
+    """
+    Time every transform, writing the result as a real run does (a WAV file in
+    a temporary folder, or shard bytes), and a full variation on synthetic
+    clips. A profiler attached to the augmenter is detached meanwhile, so the
+    synthetic calls are not recorded as real work.
+
+    Returns:
+        {transform: {seconds: samples per second}}
+    """
+    profiler, augmenter.profiler = augmenter.profiler, None
+    try:
+        return _benchmark_transforms(augmenter, lengths, repeats, seed)
+    finally:
+        augmenter.profiler = profiler
+
+
+def _benchmark_transforms(augmenter, lengths, repeats, seed):
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        return _time_transforms(augmenter, lengths, repeats, seed, os.path.join(tmp_dir, 'benchmark.wav'))
+
+
+def _time_transforms(augmenter, lengths, repeats, seed, output_path):
+    sr = augmenter.sample_rate
+    rng = np.random.default_rng(seed)
+    transforms = {
+        'time_stretch': lambda audio: augmenter.apply_time_stretch(audio, 0.9),
+        'volume': lambda audio: augmenter.apply_volume_variation(audio, 3.0),
+        'freq_filter': lambda audio: augmenter.apply_frequency_filtering(audio, sr, rng),
+        'noise': lambda audio: augmenter.add_realistic_noise(audio, -35.0, rng),
+        'reverb': lambda audio: augmenter.apply_subtle_reverb(audio, rng),
+        'pitch_shift': lambda audio: augmenter.apply_subtle_pitch_shift(audio, 0.3),
+        'compression': lambda audio: augmenter.apply_dynamic_compression(audio, 2.0, -12.0),
+        'write': lambda audio: augmenter.write_output(audio, output_path),
+        'variation': lambda audio: augmenter.create_augmented_variation(audio, 0, rng),
+    }
+
+    results = {name: {} for name in transforms}
+    for seconds in lengths:
+        clip = synthetic_clip(seconds, sr, rng)
+        for name, transform in transforms.items():
+            # Warm-up; later runs hit the caches a real run hits across one source's variations
+            transform(clip)
+            start = time.perf_counter()
+            for _ in range(repeats):
+                transform(clip)
+            elapsed = time.perf_counter() - start
+            results[name][seconds] = repeats * len(clip) / elapsed
+    return results
+
+
+def format_benchmark(results):
+    lengths = list(next(iter(results.values())))
+    header = f"   {'transform':<16}" + ''.join(f"{f'{s:g} s':>12}" for s in lengths)
+    lines = [header, f"   {'':<16}{'(samples per second)':>{12 * len(lengths)}}"]
+    for name, by_length in results.items():
+        lines.append(f"   {name:<16}" + ''.join(f"{by_length[s] / 1e6:>11.2f}M" for s in lengths))
+    return '\n'.join(lines)
@@ -0,0 +1,207 @@
+"""
+Budget-Aware Augmentation Scheduling
+====================================
+Plans an augmentation run to fit a wall-clock or CPU-time budget, using a
+cost model measured on this machine.
+
+The cost model gives each transform's time per call as a fixed cost plus a
+cost per sample, fitted from ``benchmark_transforms``. From it the scheduler
+predicts the expected cost of one variation of each original, then decides how
+many variations each note gets: notes are grown one variation per file at a
+time, always the note with the fewest samples, until the budget or the target
+is reached.
+
+Within each original the transforms are stratified instead of drawn
+independently: a transform with probability p is applied to p * n of the n
+variations (rounded), spread evenly. The configured mix is kept exactly
+per file and the cost of a run becomes predictable, instead of depending on
+how many variations happen to hit stretch, pitch shift and a long reverb at
+once. The variations still make their usual random draws, so transform
+parameters do not change.
+"""
+
+import json
+import math
+import zlib
+
+import numpy as np
+import librosa
+
+from augmentation_profiler import BENCHMARK_LENGTHS, benchmark_transforms
+from dataset_augmentation import TRANSFORM_PROBABILITIES
+
+BUDGET_MODES = ('wall', 'cpu')
+BUDGET_REPORT_FILE = 'budget_report.json'
+
+
+class CostModel:
+    """Seconds per call of each stage, as a fixed cost plus a cost per sample"""
+
+    def __init__(self, coefficients):
+        self.coefficients = coefficients  # stage -> (fixed seconds, seconds per sample)
+
+    @classmethod
+    def measure(cls, augmenter, lengths=BENCHMARK_LENGTHS, repeats=3):
+        """Fit the model from a benchmark of every transform on this machine"""
+        results = benchmark_transforms(augmenter, lengths=lengths, repeats=repeats)
+        coefficients = {}
+        for name, by_length in results.items():
+            if name == 'variation':
+                continue
+            samples = np.array([seconds * augmenter.sample_rate for seconds in by_length])
+            call_seconds = samples / np.array(list(by_length.values()))
+            per_sample, fixed = np.polyfit(samples, call_seconds, 1)
+            coefficients[name] = (max(float(fixed), 0.0), max(float(per_sample), 0.0))
+        return cls(coefficients)
+
+    def predict(self, name, num_samples):
+        fixed, per_sample = self.coefficients[name]
+        return fixed + per_sample * num_samples
+
+    def save(self, path):
+        with open(path, 'w') as f:
+            json.dump(self.coefficients, f, indent=2)
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as f:
+            return cls({name: tuple(value) for name, value in json.load(f).items()})
+
+
+class BudgetScheduler:
+    """Chooses variation counts and transform gates that fit a time budget"""
+
+    def __init__(self, augmenter, cost_model, budget_seconds, budget_mode='wall'):
+        """
+        Args:
+            augmenter: TalkingDrumAugmentationSystem to schedule
+            cost_model: CostModel for this machine
+            budget_seconds: Time budget for the whole run
+            budget_mode: 'wall' (elapsed time; every worker of every machine
+                shard is assumed busy) or 'cpu' (time summed over workers)
+        """
+        if budget_mode not in BUDGET_MODES:
+            raise ValueError(f"Unknown budget mode: {budget_mode}")
+        self.augmenter = augmenter
+        self.cost_model = cost_model
+        self.budget_seconds = budget_seconds
+        self.budget_mode = budget_mode
+        self.variations = {}  # note -> variations per file
+        self.targets = {}  # note -> variations per file without a budget
+        self.lengths = {}  # original path -> samples
+        self.planned_cost = 0.0
+        self._scheduled = {}  # stage -> planned calls and seconds for this run
+
+    @property
+    def capacity(self):
+        """CPU seconds the budget allows across all workers and machine shards"""
+        if self.budget_mode == 'cpu':
+            return self.budget_seconds
+        return self.budget_seconds * max(1, self.augmenter.workers) * self.augmenter.num_shards
+
+    def expected_variation_cost(self, num_samples):
+        """Mean CPU seconds of one variation (transforms and write) of a clip"""
+        cost = self.cost_model.predict('write', num_samples)
+        for name, probability in TRANSFORM_PROBABILITIES.items():
+            cost += probability * self.cost_model.predict(name, num_samples)
+        return cost
+
+    def plan(self):
+        """Decide the variations per file of every note; returns {note: count}"""
+        augmenter = self.augmenter
+        note_files = {}
+        for note_dir in sorted(d for d in augmenter.dataset_path.iterdir() if d.is_dir()):
+            audio_files = augmenter.note_audio_files(note_dir.name)
+            if audio_files:
+                note_files[note_dir.name] = audio_files
+                for path in audio_files:
+                    self.lengths[str(path)] = int(librosa.get_duration(path=path) * augmenter.sample_rate)
+
+        # Cost of adding one more variation of every file of a note
+        round_cost = {note: sum(self.expected_variation_cost(self.lengths[str(path)]) for path in files)
+                      for note, files in note_files.items()}
+        self.targets = {note: augmenter.augmentations_per_file(len(files))
+                        for note, files in note_files.items()}
+        self.variations = {note: 0 for note in note_files}
+
+        remaining = self.capacity
+        while True:
+            candidates = [note for note in note_files
+                          if self.variations[note] < self.targets[note] and round_cost[note] <= remaining]
+            if not candidates:
+                break
+            # Grow the note with the fewest samples so far, keeping classes balanced
+            note = min(candidates, key=lambda n: (len(note_files[n]) * (1 + self.variations[n]), round_cost[n]))
+            self.variations[note] += 1
+            remaining -= round_cost[note]
+
+        self.planned_cost = self.capacity - remaining
+        return dict(self.variations)
+
+    def variations_per_file(self, note_name):
+        return self.variations.get(note_name, 0)
+
+    def gates(self, note_name, source_name, var_idx):
+        """
+        Which transforms a variation applies: variation k of an original gets
+        a transform of probability p when k * p + offset crosses an integer,
+        with a fixed random offset per original and transform
+        """
+        gates = {}
+        for name, probability in TRANSFORM_PROBABILITIES.items():
+            key = [self.augmenter.seed, zlib.crc32(note_name.encode()),
+                   zlib.crc32(source_name.encode()), zlib.crc32(name.encode())]
+            offset = np.random.default_rng(key).random()
+            gates[name] = math.floor((var_idx + 1) * probability + offset) > math.floor(var_idx * probability + offset)
+        return gates
+
+    def record_scheduled(self, audio_file, gates):
+        """Add a variation this run will generate to the planned cost"""
+        num_samples = self.lengths[str(audio_file)]
+        for name in ['write'] + [name for name, applied in gates.items() if applied]:
+            entry = self._scheduled.setdefault(name, {'calls': 0, 'seconds': 0.0})
+            entry['calls'] += 1
+            entry['seconds'] += self.cost_model.predict(name, num_samples)
+
+    def format_plan(self):
+        lines = [f"   {'note':<8}{'variations/file':>16}{'target':>8}"]
+        for note, count in self.variations.items():
+            lines.append(f"   {note:<8}{count:>16}{self.targets[note]:>8}")
+        lines.append(f"   Predicted CPU time: {self.planned_cost:.1f} s of {self.capacity:.1f} s available "
+                     f"({self.budget_seconds:g} s {self.budget_mode} budget)")
+        return '\n'.join(lines)
+
+    def report(self, profiler, wall_seconds):
+        """Planned versus measured calls and seconds per stage for the run"""
+        actual = profiler.summary() if profiler is not None else {}
+        stages = {}
+        for name in ['write'] + list(TRANSFORM_PROBABILITIES):
+            planned = self._scheduled.get(name, {'calls': 0, 'seconds': 0.0})
+            measured = actual.get(name, {'calls': 0, 'total_s': 0.0})
+            stages[name] = {
+                'planned_calls': planned['calls'],
+                'actual_calls': measured['calls'],
+                'planned_s': planned['seconds'],
+                'actual_s': measured['total_s'],
+            }
+        planned_cpu = sum(stage['planned_s'] for stage in stages.values())
+        return {
+            'budget_seconds': self.budget_seconds,
+            'budget_mode': self.budget_mode,
+            'variations_per_file': dict(self.variations),
+            'stages': stages,
+            'planned_cpu_s': planned_cpu,
+            'actual_cpu_s': sum(stage['actual_s'] for stage in stages.values()),
+            'planned_wall_s': planned_cpu / max(1, self.augmenter.workers),
+            'actual_wall_s': wall_seconds,
+        }
+
+    @staticmethod
+    def format_report(report):
+        lines = [f"   {'stage':<14}{'calls plan':>12}{'actual':>8}{'s plan':>10}{'actual':>10}"]
+        for name, stage in report['stages'].items():
+            lines.append(f"   {name:<14}{stage['planned_calls']:>12}{stage['actual_calls']:>8}"
+                         f"{stage['planned_s']:>10.2f}{stage['actual_s']:>10.2f}")
+        lines.append(f"   CPU time: planned {report['planned_cpu_s']:.1f} s, actual {report['actual_cpu_s']:.1f} s")
+        lines.append(f"   Wall time: planned {report['planned_wall_s']:.1f} s, actual {report['actual_wall_s']:.1f} s")
+        return '\n'.join(lines)
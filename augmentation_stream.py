@@ -0,0 +1,211 @@
+"""
+On-the-fly Talking Drum Augmentation
+====================================
+Streams freshly augmented audio, or the 47 training features, straight from
+the original recordings instead of writing augmented WAVs to disk first.
+
+Each original is decoded once and kept in memory (and shipped once to every
+worker process). Every epoch draws new variation indices, so training sees
+as many distinct variations as it has epochs, without the disk footprint or
+the write -> read -> decode round-trip:
+
+    augmenter = TalkingDrumAugmentationSystem('talking_drum_dataset')
+    with AugmentationStream(augmenter, variations_per_file=20, features=True,
+                            workers=4) as stream:
+        for epoch in range(50):
+            for features, note in stream.epoch(epoch):
+                ...
+
+Variation ``k`` of epoch ``e`` uses the augmenter's per-variation RNG with
+index ``e * variations_per_file + k``, so epoch 0 reproduces exactly the
+variations ``dataset_augmentation.py`` writes to disk with the same seed.
+"""
+
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from dataset_augmentation import AUDIO_EXTENSIONS
+from feature_extraction import extract_features_batch
+
+try:
+    import torch
+    from torch.utils.data import IterableDataset
+except ImportError:  # torch is only needed for AugmentedTorchDataset
+    torch = None
+    IterableDataset = object
+
+
+def _render_batch(augmenter, originals, features, batch):
+    """Render a batch of (original index, variation index) tasks"""
+    clips = []
+    notes = []
+    for orig_idx, var_idx in batch:
+        note, source_name, audio = originals[orig_idx]
+        if var_idx is not None:
+            rng = augmenter.variation_rng(note, source_name, var_idx)
+            audio, _ = augmenter.create_augmented_variation(audio, var_idx, rng)
+        clips.append(audio)
+        notes.append(note)
+
+    if features:
+        clips = list(extract_features_batch(clips, sr=augmenter.sample_rate))
+    return list(zip(clips, notes))
+
+
+# Worker processes receive the augmenter and decoded originals once, at start-up
+_worker_state = None
+
+
+def _init_worker(augmenter, originals, features):
+    global _worker_state
+    _worker_state = (augmenter, originals, features)
+
+
+def _render_batch_task(batch):
+    return _render_batch(*_worker_state, batch)
+
+
+class AugmentationStream:
+    """
+    Generator of augmented clips or feature vectors built around a
+    ``TalkingDrumAugmentationSystem``
+    """
+
+    def __init__(self, augmenter, variations_per_file=20, features=False,
+                 include_originals=True, workers=0, batch_size=8, prefetch=8,
+                 shuffle=True, notes=None):
+        """
+        Args:
+            augmenter: TalkingDrumAugmentationSystem whose dataset_path holds the originals
+            variations_per_file: Fresh variations of each original per epoch
+            features: Yield 47-feature vectors instead of audio
+            include_originals: Also yield each unmodified original once per epoch
+            workers: Worker processes for rendering (0 renders in this process)
+            batch_size: Variations rendered per worker task
+            prefetch: Batches kept in flight ahead of the consumer
+            shuffle: Shuffle the order of each epoch (seeded from the augmenter seed)
+            notes: Restrict to these note folders (default: all)
+        """
+        self.augmenter = augmenter
+        self.variations_per_file = variations_per_file
+        self.features = features
+        self.include_originals = include_originals
+        self.workers = workers
+        self.batch_size = batch_size
+        self.prefetch = max(1, prefetch)
+        self.shuffle = shuffle
+        self.originals = self._load_originals(notes)
+        self.classes = sorted({note for note, _, _ in self.originals})
+        self._executor = None
+
+    def _load_originals(self, notes):
+        """Decode every original once: list of (note, file name, audio)"""
+        originals = []
+        note_dirs = sorted(d for d in self.augmenter.dataset_path.iterdir() if d.is_dir())
+        for note_dir in note_dirs:
+            if notes is not None and note_dir.name not in notes:
+                continue
+            for path in sorted(note_dir.iterdir()):
+                if path.suffix.lower() not in AUDIO_EXTENSIONS:
+                    continue
+                audio, _ = self.augmenter.load_audio_file(path)
+                if audio is not None and len(audio) > 0:
+                    originals.append((note_dir.name, path.name, audio))
+        return originals
+
+    def __len__(self):
+        per_file = self.variations_per_file + (1 if self.include_originals else 0)
+        return len(self.originals) * per_file
+
+    def epoch_tasks(self, epoch):
+        """(original index, variation index or None) pairs making up one epoch"""
+        tasks = []
+        for orig_idx in range(len(self.originals)):
+            if self.include_originals:
+                tasks.append((orig_idx, None))
+            start = epoch * self.variations_per_file
+            tasks.extend((orig_idx, var_idx)
+                         for var_idx in range(start, start + self.variations_per_file))
+
+        if self.shuffle:
+            order = np.random.default_rng([self.augmenter.seed, epoch]).permutation(len(tasks))
+            tasks = [tasks[i] for i in order]
+        return tasks
+
+    def epoch(self, epoch=0):
+        """Yield (audio or features, note) for every task of an epoch"""
+        tasks = self.epoch_tasks(epoch)
+        batches = [tasks[i:i + self.batch_size] for i in range(0, len(tasks), self.batch_size)]
+
+        if self.workers <= 0:
+            for batch in batches:
+                yield from _render_batch(self.augmenter, self.originals, self.features, batch)
+            return
+
+        # Keep a bounded window of batches in flight and yield them in order
+        executor = self._get_executor()
+        pending = deque()
+        batch_iter = iter(batches)
+        for batch in batch_iter:
+            pending.append(executor.submit(_render_batch_task, batch))
+            if len(pending) >= self.prefetch:
+                break
+        while pending:
+            results = pending.popleft().result()
+            next_batch = next(batch_iter, None)
+            if next_batch is not None:
+                pending.append(executor.submit(_render_batch_task, next_batch))
+            yield from results
+
+    def __iter__(self):
+        return self.epoch(0)
+
+    def _get_executor(self):
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers, initializer=_init_worker,
+                initargs=(self.augmenter, self.originals, self.features))
+        return self._executor
+
+    def close(self):
+        """Shut down the worker pool"""
+        if self._executor is not None:
+            self._executor.shutdown(cancel_futures=True)
+            self._executor = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class AugmentedTorchDataset(IterableDataset):
+    """
+    PyTorch IterableDataset over an AugmentationStream of feature vectors.
+    Each iteration is a new epoch of variations. The stream prefetches with its
+    own workers, so use it with ``DataLoader(num_workers=0)``.
+    """
+
+    def __init__(self, stream, scaler=None):
+        if torch is None:
+            raise ImportError("AugmentedTorchDataset requires PyTorch")
+        if not stream.features:
+            raise ValueError("AugmentedTorchDataset needs a stream created with features=True")
+        self.stream = stream
+        self.scaler = scaler
+        self.class_to_idx = {note: i for i, note in enumerate(stream.classes)}
+        self.epoch = 0
+
+    def __len__(self):
+        return len(self.stream)
+
+    def __iter__(self):
+        epoch = self.epoch
+        self.epoch += 1
+        for features, note in self.stream.epoch(epoch):
+            if self.scaler is not None:
+                features = self.scaler.transform(features.reshape(1, -1))[0]
+            yield torch.FloatTensor(features), self.class_to_idx[note]
@@ -49,7 +49,7 @@ gcloud services enable containerregistry.googleapis.com
 
 echo "🐳 Building Docker image..."
 # Copy model files to backend directory first
-cp -r ../model ./model/ || echo "⚠️  Model files not found, will create dummy files"
+cp -rL ../model ./model/ || echo "⚠️  Model files not found, will create dummy files"
 
 # Build and push image
 gcloud builds submit --tag $IMAGE_NAME .
@@ -0,0 +1,214 @@
+"""
+Persistent Job Queue
+====================
+Background processing for classification work too long or too large to hold
+an HTTP request open: long recordings and bulk submissions.
+
+Jobs and their uploaded audio are kept on disk, in an SQLite database and a
+spool folder under one job directory, so queued jobs survive a restart. A job
+that was running when the process stopped is queued again. A pool of worker
+threads claims queued jobs in submission order, one transaction per claim, and
+records progress as it goes. Finished jobs keep their result for a fixed time
+to live, then a cleanup thread deletes them.
+"""
+
+import json
+import os
+import shutil
+import sqlite3
+import threading
+import time
+import uuid
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    params TEXT NOT NULL,
+    files TEXT NOT NULL,
+    progress REAL NOT NULL DEFAULT 0,
+    message TEXT,
+    result TEXT,
+    error TEXT,
+    created REAL NOT NULL,
+    started REAL,
+    finished REAL,
+    expires REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_status_created ON jobs (status, created);
+"""
+
+FINISHED_STATUSES = ('done', 'failed')
+
+
+class JobQueue:
+    """SQLite-backed job queue with a worker thread pool and result expiry"""
+
+    def __init__(self, job_dir, handler, workers=2, ttl_seconds=3600, cleanup_interval=60):
+        """
+        Args:
+            job_dir: Folder for the database and the spooled uploads
+            handler: handler(params, files, progress) -> JSON-serializable result.
+                files is a list of {"name", "path"}; progress(fraction, message=None)
+                records how far the job has got
+            workers: Worker threads
+            ttl_seconds: How long a finished job's result is kept
+            cleanup_interval: Seconds between sweeps for expired jobs
+        """
+        self.job_dir = job_dir
+        self.db_path = os.path.join(job_dir, 'jobs.db')
+        self.spool_dir = os.path.join(job_dir, 'uploads')
+        self.handler = handler
+        self.workers = workers
+        self.ttl_seconds = ttl_seconds
+        self.cleanup_interval = cleanup_interval
+        self._local = threading.local()  # One SQLite connection per thread
+        self._wake = threading.Condition()
+        self._stop = threading.Event()
+        self._threads = []
+
+        os.makedirs(self.spool_dir, exist_ok=True)
+        with self._connect() as db:
+            db.execute('PRAGMA journal_mode=WAL')
+            db.executescript(SCHEMA)
+
+    def _connect(self):
+        db = getattr(self._local, 'db', None)
+        if db is None:
+            db = sqlite3.connect(self.db_path, timeout=30)
+            db.row_factory = sqlite3.Row
+            self._local.db = db
+        return db
+
+    def start(self):
+        """Requeue jobs interrupted by a restart and start the worker and cleanup threads"""
+        with self._connect() as db:
+            requeued = db.execute(
+                "UPDATE jobs SET status = 'queued', started = NULL, progress = 0, "
+                "message = 'Requeued after a restart' WHERE status = 'running'"
+            ).rowcount
+        if requeued:
+            print(f"🔁 Requeued {requeued} interrupted jobs")
+
+        self._stop.clear()
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._work, name=f"job-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        thread = threading.Thread(target=self._clean, name="job-cleanup", daemon=True)
+        thread.start()
+        self._threads.append(thread)
+
+    def stop(self):
+        """Stop taking new jobs; a job in progress is requeued on the next start"""
+        self._stop.set()
+        with self._wake:
+            self._wake.notify_all()
+
+    def submit(self, uploads, params):
+        """
+        Queue a job for a list of (filename, bytes) uploads
+
+        Returns:
+            The job ID
+        """
+        job_id = uuid.uuid4().hex
+        job_spool = os.path.join(self.spool_dir, job_id)
+        os.makedirs(job_spool)
+        files = []
+        for i, (name, data) in enumerate(uploads):
+            path = os.path.join(job_spool, f"{i:04d}{os.path.splitext(name)[1].lower()}")
+            with open(path, 'wb') as f:
+                f.write(data)
+            files.append({'name': name, 'path': path})
+
+        # The row goes in last, so a worker never sees a job whose audio is not on disk yet
+        with self._connect() as db:
+            db.execute("INSERT INTO jobs (id, status, params, files, created) VALUES (?, 'queued', ?, ?, ?)",
+                       (job_id, json.dumps(params), json.dumps(files), time.time()))
+        with self._wake:
+            self._wake.notify()
+        return job_id
+
+    def get(self, job_id):
+        """A job's status, progress and result, or None if unknown or expired"""
+        row = self._connect().execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None or (row['expires'] is not None and row['expires'] < time.time()):
+            return None
+        return {
+            'job_id': row['id'],
+            'status': row['status'],
+            'progress': row['progress'],
+            'message': row['message'],
+            'params': json.loads(row['params']),
+            'files': [f['name'] for f in json.loads(row['files'])],
+            'result': json.loads(row['result']) if row['result'] is not None else None,
+            'error': row['error'],
+            'created': row['created'],
+            'started': row['started'],
+            'finished': row['finished'],
+            'expires': row['expires'],
+        }
+
+    def delete(self, job_id):
+        """Remove a job and its audio; returns whether it existed"""
+        with self._connect() as db:
+            deleted = db.execute("DELETE FROM jobs WHERE id = ?", (job_id,)).rowcount
+        shutil.rmtree(os.path.join(self.spool_dir, job_id), ignore_errors=True)
+        return deleted > 0
+
+    def counts(self):
+        """Number of jobs in each status"""
+        rows = self._connect().execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        return {status: count for status, count in rows}
+
+    def _claim(self):
+        """Mark the oldest queued job running and return it, or None"""
+        db = self._connect()
+        db.execute('BEGIN IMMEDIATE')  # Take the write lock first, so two workers never claim one job
+        try:
+            row = db.execute("SELECT * FROM jobs WHERE status = 'queued' ORDER BY created LIMIT 1").fetchone()
+            if row is not None:
+                db.execute("UPDATE jobs SET status = 'running', started = ?, message = NULL WHERE id = ?",
+                           (time.time(), row['id']))
+            db.execute('COMMIT')
+        except Exception:
+            db.execute('ROLLBACK')
+            raise
+        return row
+
+    def _progress(self, job_id):
+        def report(fraction, message=None):
+            with self._connect() as db:
+                db.execute("UPDATE jobs SET progress = ?, message = ? WHERE id = ? AND status = 'running'",
+                           (float(min(max(fraction, 0.0), 1.0)), message, job_id))
+        return report
+
+    def _work(self):
+        while not self._stop.is_set():
+            job = self._claim()
+            if job is None:
+                with self._wake:
+                    self._wake.wait(timeout=1.0)
+                continue
+
+            try:
+                result = self.handler(json.loads(job['params']), json.loads(job['files']),
+                                      self._progress(job['id']))
+                status, result, error = 'done', json.dumps(result), None
+            except Exception as e:
+                status, result, error = 'failed', None, str(e) or type(e).__name__
+            now = time.time()
+            with self._connect() as db:
+                db.execute("UPDATE jobs SET status = ?, progress = CASE WHEN ? = 'done' THEN 1 ELSE progress END, "
+                           "result = ?, error = ?, finished = ?, expires = ? WHERE id = ?",
+                           (status, status, result, error, now, now + self.ttl_seconds, job['id']))
+            shutil.rmtree(os.path.join(self.spool_dir, job['id']), ignore_errors=True)
+
+    def _clean(self):
+        while not self._stop.wait(self.cleanup_interval):
+            with self._connect() as db:
+                expired = [row[0] for row in db.execute("SELECT id FROM jobs WHERE expires < ?", (time.time(),))]
+                db.execute("DELETE FROM jobs WHERE expires < ?", (time.time(),))
+            for job_id in expired:
+                shutil.rmtree(os.path.join(self.spool_dir, job_id), ignore_errors=True)
@@ -4,20 +4,39 @@ Yoruba Talking Drum Translator - FastAPI Backend
 RESTful API for talking drum audio classification
 """
 
-from fastapi import FastAPI, File, UploadFile, HTTPException
+from fastapi import FastAPI, File, UploadFile, HTTPException, Header, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
 import torch
-import torch.nn as nn
 import numpy as np
 import librosa
 import pickle
 import os
+import json
+import time
+import sys
+import asyncio
+import threading
 import tempfile
-from typing import Dict, List
+from typing import Dict, List, Optional
 from pydantic import BaseModel
 import uvicorn
 
+from job_queue import FINISHED_STATUSES, JobQueue
+
+try:
+    from pitch_classifier import load_pitch_classifier
+    from model_bundle import BUNDLE_FILE, bundle_file_for, load_bundle as read_model_bundle
+    from note_sequence import NoteSequenceDecoder
+    from talking_drum_models import ARCHITECTURES, CNNModel, TalkingDrumModel
+except ImportError:
+    # Running from backend/ in a source checkout; the modules live in the project root
+    sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from pitch_classifier import load_pitch_classifier
+    from model_bundle import BUNDLE_FILE, bundle_file_for, load_bundle as read_model_bundle
+    from note_sequence import NoteSequenceDecoder
+    from talking_drum_models import ARCHITECTURES, CNNModel, TalkingDrumModel
+
 # Initialize FastAPI app
 app = FastAPI(
     title="Yoruba Talking Drum Translator API",
@@ -34,98 +53,511 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Model Architecture (enhanced version to match saved model)
-class TalkingDrumModel(nn.Module):
-    """Enhanced Talking Drum Model with Cultural Context"""
-    def __init__(self, input_size=47, num_classes=7, d_model=128):
-        super(TalkingDrumModel, self).__init__()
-        self.input_size = input_size
-        self.d_model = d_model
-        
-        # Input projection
-        self.input_projection = nn.Linear(input_size, d_model)
-        
-        # Positional embedding
-        self.pos_embedding = nn.Parameter(torch.randn(1, d_model))
-        
-        # Transformer layers
-        self.transformer = nn.TransformerEncoder(
-            nn.TransformerEncoderLayer(
-                d_model=d_model,
-                nhead=8,
-                dim_feedforward=256,
-                dropout=0.1,
-                batch_first=True
-            ),
-            num_layers=6
-        )
-        
-        # Cultural attention
-        self.cultural_attention = nn.MultiheadAttention(d_model, 4, batch_first=True)
-        
-        # Layer norm
-        self.layer_norm = nn.LayerNorm(d_model)
-        
-        # Classifier
-        self.classifier = nn.Sequential(
-            nn.Linear(d_model, 64),
-            nn.ReLU(),
-            nn.Dropout(0.3),
-            nn.Linear(64, num_classes)
-        )
+# Global variables for model
+pitch_classifier = None
+NOTES = ['Do', 'Fa', 'La', 'Mi', 'Re', 'So', 'Ti']
+
+# Serving mode: 'single' serves best_model.pth; 'cascade' runs the small CNN first and
+# escalates to the transformer when the CNN's top probability is below the threshold.
+# The pair is loaded from each model version's folder and swapped together with it
+SERVING_MODE = os.getenv("SERVING_MODE", "single")
+CASCADE_THRESHOLD = float(os.getenv("CASCADE_THRESHOLD", "0.9"))
+CASCADE_FAST_MODEL = "cnn_model.pth"
+CASCADE_ACCURATE_MODEL = "transformer_model.pth"
+# Optional feature store (index.json + features matrix from featurize_dataset.py) of held-out
+# clips, evaluated at startup to report the cascade's accuracy and escalation rate
+CASCADE_EVAL_STORE = os.getenv("CASCADE_EVAL_STORE")
+CASCADE_EVAL_THRESHOLDS = [0.5, 0.6, 0.7, 0.8, 0.9, 0.95, 0.99]
+
+class ModelCascade:
+    """
+    Cheap model first; rows it is unsure of are escalated to the expensive model.
+    Each model scales the features with the scaler it was trained with.
+    """
+    def __init__(self, fast_model, fast_scaler, accurate_model, accurate_scaler, classes=NOTES,
+                 threshold=CASCADE_THRESHOLD):
+        self.fast_model = fast_model
+        self.fast_scaler = fast_scaler
+        self.accurate_model = accurate_model
+        self.accurate_scaler = accurate_scaler
+        self.classes = classes
+        self.threshold = threshold
+        self.evaluation = None
+        self.requests = 0
+        self.escalations = 0
+        self.fast_seconds = 0.0
+        self.accurate_seconds = 0.0
     
-    def forward(self, x):
-        # Project input
-        x = self.input_projection(x)  # [batch, d_model]
-        x = x.unsqueeze(1)  # [batch, 1, d_model]
-        
-        # Add positional embedding
-        x = x + self.pos_embedding.unsqueeze(0)
-        
-        # Transformer
-        x = self.transformer(x)
+    def predict_proba(self, features, threshold=None):
+        """
+        Class probabilities for a [batch, 47] unscaled feature matrix
         
-        # Cultural attention
-        attn_out, _ = self.cultural_attention(x, x, x)
-        x = x + attn_out
+        Returns:
+            (probabilities [batch, classes], escalated [batch] bool)
+        """
+        threshold = self.threshold if threshold is None else threshold
+        features = np.asarray(features)
         
-        # Layer norm
-        x = self.layer_norm(x)
+        start = time.perf_counter()
+        with torch.no_grad():
+            outputs = self.fast_model(torch.FloatTensor(self.fast_scaler.transform(features)))
+            probabilities = torch.softmax(outputs, dim=1).cpu().numpy()
+        self.fast_seconds += time.perf_counter() - start
         
-        # Classifier
-        x = x.squeeze(1)  # [batch, d_model]
-        x = self.classifier(x)
+        escalated = probabilities.max(axis=1) < threshold
+        if escalated.any():
+            start = time.perf_counter()
+            with torch.no_grad():
+                outputs = self.accurate_model(torch.FloatTensor(self.accurate_scaler.transform(features[escalated])))
+                probabilities[escalated] = torch.softmax(outputs, dim=1).cpu().numpy()
+            self.accurate_seconds += time.perf_counter() - start
         
-        return x
-
-# Fallback CNN Model
-class CNNModel(nn.Module):
-    """Simple CNN for compatibility"""
-    def __init__(self, input_size=47, num_classes=7):
-        super(CNNModel, self).__init__()
-        self.features = nn.Sequential(
-            nn.Linear(input_size, 256),
-            nn.ReLU(),
-            nn.Dropout(0.3),
-            nn.Linear(256, 128),
-            nn.ReLU(),
-            nn.Dropout(0.3),
-            nn.Linear(128, 64),
-            nn.ReLU(),
-            nn.Dropout(0.2),
+        self.requests += len(escalated)
+        self.escalations += int(escalated.sum())
+        return probabilities, escalated
+    
+    def stats(self):
+        return {
+            "threshold": self.threshold,
+            "requests": self.requests,
+            "escalations": self.escalations,
+            "escalation_rate": self.escalations / self.requests if self.requests else 0.0,
+            "fast_model_ms_per_request": 1000 * self.fast_seconds / max(self.requests, 1),
+            "accurate_model_ms_per_escalation": 1000 * self.accurate_seconds / max(self.escalations, 1),
+        }
+
+def evaluate_cascade(cascade, features, labels, thresholds=CASCADE_EVAL_THRESHOLDS):
+    """
+    Accuracy of each model alone and of the cascade at each threshold on a labelled
+    (unscaled) feature set, with the share of rows the cascade escalates
+    """
+    labels = np.asarray(labels)
+    with torch.no_grad():
+        fast = cascade.fast_model(torch.FloatTensor(cascade.fast_scaler.transform(features)))
+        fast = torch.softmax(fast, dim=1).cpu().numpy()
+        accurate = cascade.accurate_model(torch.FloatTensor(cascade.accurate_scaler.transform(features)))
+        accurate = torch.softmax(accurate, dim=1).cpu().numpy()
+    
+    results = {
+        "samples": int(len(labels)),
+        "fast_accuracy": float(np.mean(fast.argmax(axis=1) == labels)),
+        "accurate_accuracy": float(np.mean(accurate.argmax(axis=1) == labels)),
+        "thresholds": [],
+    }
+    for threshold in thresholds:
+        escalated = fast.max(axis=1) < threshold
+        predictions = np.where(escalated, accurate.argmax(axis=1), fast.argmax(axis=1))
+        results["thresholds"].append({
+            "threshold": threshold,
+            "escalation_rate": float(escalated.mean()),
+            "accuracy": float(np.mean(predictions == labels)),
+        })
+    return results
+
+def load_feature_set(store_path, classes=NOTES):
+    """Features and class labels of a feature store written by featurize_dataset.py"""
+    with open(os.path.join(store_path, "index.json")) as f:
+        index = json.load(f)
+    entries = index["entries"]
+    features = np.load(os.path.join(store_path, index.get("features_file", "features.npy")), mmap_mode="r")
+    rows = [i for i, entry in enumerate(entries) if entry["note"] in classes and np.isfinite(features[i]).all()]
+    return np.asarray(features[rows]), np.array([classes.index(entries[i]["note"]) for i in rows])
+
+def load_weights(model_class, path):
+    """Build an architecture and load a state dict into it, in eval mode"""
+    net = model_class(input_size=47, num_classes=7)
+    net.load_state_dict(torch.load(path, map_location='cpu'))
+    net.eval()
+    return net
+
+# Versioned artifact registry: one folder per version holding model_bundle.safetensors, or
+# best_model.pth, scaler.pkl and label_encoder.pkl. Versions are ordered by folder name, so use sortable names (e.g. 20261019-0930)
+MODEL_REGISTRY = os.getenv("MODEL_REGISTRY", "model_registry")
+# Seconds between registry scans for new versions; 0 disables the watcher
+MODEL_WATCH_INTERVAL = float(os.getenv("MODEL_WATCH_INTERVAL", "0"))
+# When set, /admin endpoints require it in the X-Admin-Token header
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
+ACTIVE_VERSION_FILE = "ACTIVE"
+PICKLED_ARTIFACT_FILES = ["best_model.pth", "scaler.pkl", "label_encoder.pkl"]
+# Files checked out or copied together get near-identical times; only a later write counts as newer
+STALE_BUNDLE_TOLERANCE_SECONDS = 2.0
+
+class ModelBundle:
+    """
+    A model with the scaler and classes it was trained with, served as one
+    version, together with the version's cascade pair in cascade mode
+    """
+    def __init__(self, version, model, scaler, classes=NOTES, cascade=None):
+        self.version = version
+        self.model = model
+        self.scaler = scaler
+        self.classes = classes
+        self.cascade = cascade
+        self.loaded_at = time.time()
+    
+    @property
+    def ready(self):
+        return self.model is not None and self.scaler is not None
+    
+    def warm_up(self, runs=3):
+        """Run a few predictions so the first real request does not pay for lazy initialization"""
+        models = [(self.model, self.scaler)]
+        if self.cascade is not None:
+            models += [(self.cascade.fast_model, self.cascade.fast_scaler),
+                       (self.cascade.accurate_model, self.cascade.accurate_scaler)]
+        with torch.no_grad():
+            for model, scaler in models:
+                features = torch.FloatTensor(scaler.transform(np.zeros((1, 47))))
+                for _ in range(runs):
+                    model(features)
+
+class ArrayScaler:
+    """StandardScaler's transform from its mean and scale arrays, without sklearn"""
+    def __init__(self, mean, scale):
+        self.mean = mean
+        self.scale = scale
+    
+    def transform(self, features):
+        return (np.asarray(features) - self.mean) / self.scale
+
+def load_bundle_model(path):
+    """
+    One zero-copy load of a bundle file; its header names the architecture to build
+
+    Returns:
+        (model, scaler, classes)
+    """
+    metadata, weights, mean, scale = read_model_bundle(path)
+    net = ARCHITECTURES[metadata['architecture']](**metadata['hyperparameters'])
+    net.load_state_dict(weights, assign=True)  # Keep the memory-mapped tensors, shared across workers
+    net.eval()
+    print(f"✅ {type(net).__name__} bundle loaded successfully from {path}")
+    return net, ArrayScaler(mean, scale), metadata['classes']
+
+def bundle_is_stale(path, artifact_paths):
+    """
+    Whether any artifact beside a bundle file was written after it, such as a
+    notebook export that did not rebuild the bundle; warns if so
+    """
+    bundle_time = os.path.getmtime(path)
+    newer = [os.path.basename(p) for p in artifact_paths
+             if os.path.exists(p) and os.path.getmtime(p) > bundle_time + STALE_BUNDLE_TOLERANCE_SECONDS]
+    if newer:
+        print(f"⚠️  {', '.join(newer)} newer than {path}; loading {'it' if len(newer) == 1 else 'them'} instead. "
+              f"Rebuild the bundle with: python model_bundle.py --model-dir {os.path.dirname(path)}")
+    return bool(newer)
+
+def load_bundle_file(version, path):
+    """A model version from a single bundle file"""
+    return ModelBundle(version, *load_bundle_model(path))
+
+def load_model_file(path):
+    """Load a state dict, trying the enhanced architecture first, then the CNN"""
+    try:
+        net = load_weights(TalkingDrumModel, path)
+        print(f"✅ Enhanced model loaded successfully from {path}")
+    except Exception:
+        net = load_weights(CNNModel, path)
+        print(f"✅ CNN model loaded successfully from {path}")
+    return net
+
+def load_bundle(version, model_dirs):
+    """
+    Load a model version from its folders; in cascade mode, together with the
+    cascade pair of the same folders, so that both are swapped as one
+    """
+    bundle = load_model_artifacts(version, model_dirs)
+    if SERVING_MODE == "cascade":
+        bundle.cascade = load_cascade(model_dirs)
+    return bundle
+
+def load_model_artifacts(version, model_dirs):
+    """
+    Load a bundle file from the first folder that has one, unless the pickled
+    artifacts beside it are newer; otherwise load the pickled model, scaler and
+    label encoder, each from the first folder that has it
+    """
+    for model_dir in model_dirs:
+        path = os.path.join(model_dir, BUNDLE_FILE)
+        if os.path.exists(path):
+            if not bundle_is_stale(path, [os.path.join(model_dir, f) for f in PICKLED_ARTIFACT_FILES]):
+                return load_bundle_file(version, path)
+            break
+    
+    model = scaler = label_encoder = None
+    
+    for model_dir in model_dirs:
+        path = os.path.join(model_dir, 'best_model.pth')
+        if os.path.exists(path):
+            try:
+                model = load_model_file(path)
+                break
+            except Exception as e:
+                print(f"❌ Error loading model from {path}: {str(e)}")
+    if model is None:
+        print("⚠️  Model file not found or incompatible")
+    
+    for model_dir in model_dirs:
+        path = os.path.join(model_dir, 'scaler.pkl')
+        if os.path.exists(path):
+            with open(path, 'rb') as f:
+                scaler = pickle.load(f)
+            print(f"✅ Scaler loaded successfully from {path}")
+            break
+    else:
+        print("⚠️  Scaler file not found")
+    
+    for model_dir in model_dirs:
+        path = os.path.join(model_dir, 'label_encoder.pkl')
+        if os.path.exists(path):
+            with open(path, 'rb') as f:
+                label_encoder = pickle.load(f)
+            print(f"✅ Label encoder loaded successfully from {path}")
+            break
+    else:
+        print("⚠️  Label encoder file not found")
+    
+    classes = [str(c) for c in label_encoder.classes_] if label_encoder is not None else NOTES
+    return ModelBundle(version, model, scaler, classes)
+
+def load_cascade_model(model_dir, model_file, model_class):
+    """
+    One cascade model and the scaler it was trained with: its <stem>.safetensors
+    bundle if present and not older than its weights, else its weights with the
+    folder's scaler.pkl. None if missing.
+    """
+    path = os.path.join(model_dir, bundle_file_for(model_file))
+    weights_path = os.path.join(model_dir, model_file)
+    if os.path.exists(path) and not bundle_is_stale(path, [weights_path]):
+        return load_bundle_model(path)
+    
+    scaler_path = os.path.join(model_dir, 'scaler.pkl')
+    if not (os.path.exists(weights_path) and os.path.exists(scaler_path)):
+        return None
+    with open(scaler_path, 'rb') as f:
+        scaler = pickle.load(f)
+    return load_weights(model_class, weights_path), scaler, NOTES
+
+def load_cascade(model_dirs):
+    """
+    The cascade pair from the first folder that has both models, evaluated on
+    CASCADE_EVAL_STORE if set; None (single-model serving) if no folder has both
+    """
+    for model_dir in model_dirs:
+        fast = load_cascade_model(model_dir, CASCADE_FAST_MODEL, CNNModel)
+        accurate = load_cascade_model(model_dir, CASCADE_ACCURATE_MODEL, TalkingDrumModel)
+        if fast is not None and accurate is not None:
+            break
+    else:
+        print(f"⚠️  Cascade needs {CASCADE_FAST_MODEL} and {CASCADE_ACCURATE_MODEL}; serving a single model")
+        return None
+    
+    (fast_model, fast_scaler, classes), (accurate_model, accurate_scaler, accurate_classes) = fast, accurate
+    if list(classes) != list(accurate_classes):
+        print(f"⚠️  Cascade models in {model_dir} have different classes; serving a single model")
+        return None
+    
+    cascade = ModelCascade(fast_model, fast_scaler, accurate_model, accurate_scaler, list(classes))
+    print(f"✅ Cascade loaded from {model_dir} (threshold {cascade.threshold})")
+    
+    if CASCADE_EVAL_STORE:
+        features, labels = load_feature_set(CASCADE_EVAL_STORE, cascade.classes)
+        cascade.evaluation = evaluate_cascade(cascade, features, labels)
+        print(f"📊 Cascade evaluation on {cascade.evaluation['samples']} held-out clips:")
+        for row in cascade.evaluation["thresholds"]:
+            print(f"   threshold {row['threshold']:.2f}: accuracy {row['accuracy']:.2%}, "
+                  f"escalated {row['escalation_rate']:.1%}")
+    return cascade
+
+class ModelRegistry:
+    """
+    Versioned bundles on disk. The active bundle is replaced by a single reference
+    swap, so requests already running finish on the bundle they started with, and
+    the previous bundle stays loaded for an instant rollback.
+    """
+    def __init__(self, root):
+        self.root = root
+        self.active = None
+        self.previous = None
+        self.newest_seen = None
+        self._lock = threading.Lock()  # One load or swap at a time
+    
+    def versions(self):
+        """Complete bundles in the registry, oldest first"""
+        if not os.path.isdir(self.root):
+            return []
+        return sorted(
+            name for name in os.listdir(self.root)
+            if not name.startswith('.') and (
+                os.path.exists(os.path.join(self.root, name, BUNDLE_FILE))
+                or all(os.path.exists(os.path.join(self.root, name, f)) for f in PICKLED_ARTIFACT_FILES)
+            )
         )
-        self.classifier = nn.Linear(64, num_classes)
+    
+    def saved_version(self):
+        """Version recorded as active by the last swap, so restarts serve the same one"""
+        try:
+            with open(os.path.join(self.root, ACTIVE_VERSION_FILE)) as f:
+                return f.read().strip()
+        except OSError:
+            return None
+    
+    def serve(self, bundle):
+        """Make a loaded bundle active, keeping the current one as the previous"""
+        self.previous, self.active = self.active, bundle
+        if os.path.isdir(os.path.join(self.root, bundle.version)):
+            tmp_path = os.path.join(self.root, f".{ACTIVE_VERSION_FILE}.tmp")
+            with open(tmp_path, 'w') as f:
+                f.write(bundle.version)
+            os.replace(tmp_path, os.path.join(self.root, ACTIVE_VERSION_FILE))
+    
+    def activate(self, version):
+        """Load and warm a version, then swap it in; the active bundle is untouched on failure"""
+        if version not in self.versions():
+            raise ValueError(f"Unknown model version: {version}")
+        with self._lock:
+            if self.active is not None and self.active.version == version:
+                return self.active
+            bundle = load_bundle(version, [os.path.join(self.root, version)])
+            if not bundle.ready:
+                raise RuntimeError(f"Model version {version} could not be loaded")
+            bundle.warm_up()
+            self.serve(bundle)
+            self.newest_seen = max(self.newest_seen or version, version)
+        print(f"🔄 Serving model version {version}")
+        return bundle
+    
+    def rollback(self):
+        """Swap the previous bundle back in; it is still loaded, so this is instant"""
+        with self._lock:
+            if self.previous is None:
+                raise ValueError("No previous model version to roll back to")
+            self.serve(self.previous)
+        print(f"⏪ Rolled back to model version {self.active.version}")
+        return self.active
+    
+    def watch(self, interval):
+        """Poll for versions newer than any seen before and activate them (rollbacks are not undone)"""
+        def run():
+            while True:
+                time.sleep(interval)
+                versions = self.versions()
+                if versions and (self.newest_seen is None or versions[-1] > self.newest_seen):
+                    try:
+                        self.activate(versions[-1])
+                    except Exception as e:
+                        print(f"❌ Error loading model version {versions[-1]}: {e}")
+                        self.newest_seen = versions[-1]  # Do not retry a broken bundle every scan
         
-    def forward(self, x):
-        x = self.features(x)
-        x = self.classifier(x)
-        return x
+        threading.Thread(target=run, name="model-registry-watcher", daemon=True).start()
+        print(f"👀 Watching {self.root} for new model versions every {interval:g} s")
+    
+    def status(self):
+        return {
+            "registry": self.root,
+            "versions": self.versions(),
+            "active": self.active.version if self.active else None,
+            "previous": self.previous.version if self.previous else None,
+            "active_since": self.active.loaded_at if self.active else None,
+        }
 
-# Global variables for model
-model = None
-scaler = None
-label_encoder = None
-NOTES = ['Do', 'Fa', 'La', 'Mi', 'Re', 'So', 'Ti']
+registry = ModelRegistry(MODEL_REGISTRY)
+
+# Background jobs for long recordings and bulk uploads; JOB_DIR must be persistent
+# storage for queued jobs to survive a restart
+JOB_DIR = os.getenv("JOB_DIR", "jobs")
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+JOB_TTL_SECONDS = float(os.getenv("JOB_TTL_SECONDS", "3600"))
+JOB_MODES = ["note", "sequence"]
+JOB_CHUNK_SECONDS = 10  # Sequence jobs report progress after every chunk of this length
+JOB_EVENT_INTERVAL = 0.5
+JOB_KEEPALIVE_SECONDS = 15
+job_queue = None
+
+# Raw PCM ingest (/predict-raw): little-endian sample formats, and how much audio is kept.
+# Only the first 5 s reach the features; the margin keeps the resampler's edge past them
+RAW_SAMPLE_FORMATS = {"float32": np.dtype("<f4"), "int16": np.dtype("<i2")}
+RAW_MAX_SECONDS = 5.1
+# Longer bodies are refused (413) before they are buffered; audio_duration still reports up to this
+RAW_MAX_UPLOAD_SECONDS = float(os.getenv("RAW_MAX_UPLOAD_SECONDS", "60"))
+
+def classify(features, bundle):
+    """
+    Class probabilities for one unscaled feature row, the classes they refer
+    to, and which model produced them: the bundle's cascade if it has one
+    """
+    if bundle.cascade is not None:
+        probabilities, escalated = bundle.cascade.predict_proba(features)
+        return probabilities[0], bundle.cascade.classes, "transformer" if escalated[0] else "cnn"
+    
+    with torch.no_grad():
+        outputs = bundle.model(torch.FloatTensor(bundle.scaler.transform(features)))
+        return torch.softmax(outputs, dim=1).cpu().numpy()[0], bundle.classes, "single"
+
+def predict_clip(audio, sr, bundle):
+    """Classify one decoded clip with a model bundle; the prediction fields of /predict"""
+    features = extract_features(audio, sr)
+    if features is None:
+        raise ValueError("Failed to extract features from audio")
+    
+    # Scale features and predict
+    features_array = np.array(features).reshape(1, -1)
+    confidence_scores, classes, served_by = classify(features_array, bundle)
+    predicted_class = int(np.argmax(confidence_scores))
+    predicted_note = classes[predicted_class]
+    
+    return {
+        "predicted_note": predicted_note,
+        "confidence": float(confidence_scores[predicted_class] * 100),
+        "all_confidences": {note: float(conf * 100) for note, conf in zip(classes, confidence_scores)},
+        "cultural_info": get_cultural_info(predicted_note),
+        "audio_duration": len(audio) / sr,
+        "sample_rate": sr,
+        "served_by": served_by,
+        "model_version": bundle.version
+    }
+
+def run_job(params, files, progress):
+    """
+    Job handler: classify every file of a job with the bundle active when it starts.
+    'note' gives one prediction per file; 'sequence' decodes each file into notes.
+    A file that fails is reported in its result rather than failing the job.
+    """
+    bundle = registry.active
+    if bundle is None or not bundle.ready:
+        raise RuntimeError("Model not loaded")
+    
+    results = []
+    for i, file in enumerate(files):
+        try:
+            audio, sr = librosa.load(file["path"], sr=22050)
+            if len(audio) == 0:
+                raise ValueError("Empty audio file")
+            
+            if params["mode"] == "sequence":
+                decoder = NoteSequenceDecoder(bundle.model, bundle.scaler,
+                                              min_note_seconds=params["min_note_seconds"])
+                segments = []
+                chunk = JOB_CHUNK_SECONDS * sr
+                for start in range(0, len(audio), chunk):
+                    segments += decoder.push(audio[start:start + chunk])
+                    done = min(start + chunk, len(audio)) / len(audio)
+                    progress((i + done) / len(files), f"Decoding {file['name']}")
+                segments += decoder.finish()
+                result = {
+                    "notes": [{"note": note, "start": start, "end": end} for note, start, end in segments],
+                    "audio_duration": len(audio) / sr,
+                    "sample_rate": sr,
+                    "model_version": bundle.version
+                }
+            else:
+                result = predict_clip(audio, sr, bundle)
+            results.append({"filename": file["name"], "success": True, **result})
+        except Exception as e:
+            results.append({"filename": file["name"], "success": False, "error": str(e) or type(e).__name__})
+        progress((i + 1) / len(files), f"{i + 1} of {len(files)} files done")
+    
+    return {"mode": params["mode"], "model_version": bundle.version, "results": results}
 
 # Pydantic models for API responses
 class PredictionResponse(BaseModel):
@@ -136,11 +568,42 @@ class PredictionResponse(BaseModel):
     cultural_info: Dict[str, str]
     audio_duration: float
     sample_rate: int
+    served_by: str = "single"
+    f0_hz: Optional[float] = None
+    model_version: Optional[str] = None
 
 class HealthResponse(BaseModel):
     status: str
     model_loaded: bool
     message: str
+    model_version: Optional[str] = None
+
+class ModelVersionsResponse(BaseModel):
+    registry: str
+    versions: List[str]
+    active: Optional[str] = None
+    previous: Optional[str] = None
+    active_since: Optional[float] = None
+
+class JobResponse(BaseModel):
+    job_id: str
+    status: str
+    progress: float
+    message: Optional[str] = None
+    params: dict
+    files: List[str]
+    result: Optional[dict] = None
+    error: Optional[str] = None
+    created: float
+    started: Optional[float] = None
+    finished: Optional[float] = None
+    expires: Optional[float] = None
+
+class CascadeMetricsResponse(BaseModel):
+    enabled: bool
+    live: Dict[str, float]
+    evaluation: Optional[dict] = None
+    model_version: Optional[str] = None
 
 class ModelInfoResponse(BaseModel):
     architecture: str
@@ -254,91 +717,63 @@ def get_cultural_info(note: str) -> Dict[str, str]:
 @app.on_event("startup")
 async def load_model():
     """Load model on startup"""
-    global model, scaler, label_encoder
+    global pitch_classifier, job_queue
     
     try:
-        # Load model - try enhanced model first, then fallback to CNN
-        model_paths = ['model/best_model.pth', '../model/best_model.pth']
-        model_loaded = False
-        
-        for path in model_paths:
-            if os.path.exists(path):
-                try:
-                    # Try enhanced model first
-                    model = TalkingDrumModel(input_size=47, num_classes=7)
-                    model.load_state_dict(torch.load(path, map_location='cpu'))
-                    model.eval()
-                    print(f"✅ Enhanced model loaded successfully from {path}")
-                    model_loaded = True
-                    break
-                except Exception as e:
-                    try:
-                        # Fallback to CNN model
-                        model = CNNModel(input_size=47, num_classes=7)
-                        model.load_state_dict(torch.load(path, map_location='cpu'))
-                        model.eval()
-                        print(f"✅ CNN model loaded successfully from {path}")
-                        model_loaded = True
-                        break
-                    except Exception as e2:
-                        print(f"❌ Error loading model from {path}: {str(e2)}")
-                        continue
-        
-        if not model_loaded:
-            print("⚠️  Model file not found or incompatible")
-            model = None
-        
-        # Load scaler
-        scaler_paths = ['model/scaler.pkl', '../model/scaler.pkl']
-        scaler_loaded = False
-        for path in scaler_paths:
-            if os.path.exists(path):
-                with open(path, 'rb') as f:
-                    scaler = pickle.load(f)
-                print(f"✅ Scaler loaded successfully from {path}")
-                scaler_loaded = True
+        # Serve the registry's saved version, else the newest that loads; without one, the model folder
+        versions = registry.versions()
+        saved = registry.saved_version()
+        for version in ([saved] if saved in versions else []) + versions[::-1]:
+            try:
+                registry.activate(version)
                 break
-        if not scaler_loaded:
-            print("⚠️  Scaler file not found")
-            scaler = None
+            except Exception as e:
+                print(f"❌ Error loading model version {version}: {e}")
+        registry.newest_seen = versions[-1] if versions else None
+        if registry.active is None:
+            registry.serve(load_bundle("model", ['model', '../model']))
         
-        # Load label encoder
-        encoder_paths = ['model/label_encoder.pkl', '../model/label_encoder.pkl']
-        encoder_loaded = False
-        for path in encoder_paths:
-            if os.path.exists(path):
-                with open(path, 'rb') as f:
-                    label_encoder = pickle.load(f)
-                print(f"✅ Label encoder loaded successfully from {path}")
-                encoder_loaded = True
-                break
-        if not encoder_loaded:
-            print("⚠️  Label encoder file not found")
-            label_encoder = None
+        # Model-free pitch classifier for /predict-fast; calibrated bands if exported, else the documented ranges
+        pitch_classifier = load_pitch_classifier()
+        print(f"✅ Pitch classifier ready ({'calibrated' if pitch_classifier.calibrated else 'documented'} bands)")
+        
+        if MODEL_WATCH_INTERVAL > 0:
+            registry.watch(MODEL_WATCH_INTERVAL)
             
     except Exception as e:
         print(f"❌ Error loading model: {e}")
-        model = None
-        scaler = None
-        label_encoder = None
+    
+    # Started even without a model, so queued jobs are kept; they fail until a model is served
+    job_queue = JobQueue(JOB_DIR, run_job, workers=JOB_WORKERS, ttl_seconds=JOB_TTL_SECONDS)
+    job_queue.start()
+    print(f"✅ Job queue ready in {JOB_DIR} ({JOB_WORKERS} workers)")
+
+@app.on_event("shutdown")
+async def stop_jobs():
+    """Stop claiming jobs; one cut off mid-run is requeued at the next startup"""
+    if job_queue is not None:
+        job_queue.stop()
 
 @app.get("/", response_model=HealthResponse)
 async def root():
     """Root endpoint - health check"""
     return {
         "status": "online",
-        "model_loaded": model is not None and scaler is not None,
-        "message": "Yoruba Talking Drum Translator API is running"
+        "model_loaded": registry.active is not None and registry.active.ready,
+        "message": "Yoruba Talking Drum Translator API is running",
+        "model_version": registry.active.version if registry.active else None
     }
 
 @app.get("/health", response_model=HealthResponse)
 async def health_check():
     """Health check endpoint"""
-    model_status = model is not None and scaler is not None
+    bundle = registry.active
+    model_status = bundle is not None and bundle.ready
     return {
         "status": "healthy" if model_status else "model_not_loaded",
         "model_loaded": model_status,
-        "message": "Model loaded and ready" if model_status else "Model not loaded. Please train and export model first."
+        "message": "Model loaded and ready" if model_status else "Model not loaded. Please train and export model first.",
+        "model_version": bundle.version if bundle else None
     }
 
 @app.get("/model-info", response_model=ModelInfoResponse)
@@ -361,8 +796,9 @@ async def predict_audio(file: UploadFile = File(...)):
     - **file**: Audio file (WAV, MP3, M4A, AAC)
     """
     
-    # Check if model is loaded
-    if model is None or scaler is None:
+    # Check if model is loaded; this request is served by this bundle even if a reload swaps it out
+    bundle = registry.active
+    if bundle is None or not bundle.ready:
         raise HTTPException(
             status_code=503,
             detail="Model not loaded. Please train and export model first."
@@ -386,61 +822,314 @@ async def predict_audio(file: UploadFile = File(...)):
         
         # Load audio
         audio, sr = librosa.load(tmp_path, sr=22050)
-        duration = len(audio) / sr
         
         if len(audio) == 0:
             raise HTTPException(status_code=400, detail="Empty audio file")
         
-        # Extract features
-        features = extract_features(audio, sr)
-        if features is None:
-            raise HTTPException(status_code=400, detail="Failed to extract features from audio")
-        
-        # Scale features
-        features_array = np.array(features).reshape(1, -1)
-        features_scaled = scaler.transform(features_array)
-        
-        # Convert to tensor and predict
-        features_tensor = torch.FloatTensor(features_scaled)
+        # Extract features and predict
+        prediction = predict_clip(audio, sr, bundle)
         
-        with torch.no_grad():
-            outputs = model(features_tensor)
-            probabilities = torch.softmax(outputs, dim=1)
-            confidence_scores = probabilities.cpu().numpy()[0]
-            predicted_class = torch.argmax(outputs, dim=1).cpu().numpy()[0]
+        # Clean up temp file
+        os.remove(tmp_path)
         
-        predicted_note = NOTES[predicted_class]
-        confidence = float(confidence_scores[predicted_class] * 100)
+        return {"success": True, **prediction}
         
-        # Create confidence dictionary
-        all_confidences = {
-            note: float(conf * 100) 
-            for note, conf in zip(NOTES, confidence_scores)
-        }
+    except Exception as e:
+        # Clean up temp file if it exists
+        if 'tmp_path' in locals() and os.path.exists(tmp_path):
+            os.remove(tmp_path)
         
-        # Get cultural info
-        cultural_info = get_cultural_info(predicted_note)
+        raise HTTPException(status_code=500, detail=f"Error processing audio: {str(e)}")
+
+@app.post("/predict-fast", response_model=PredictionResponse)
+async def predict_audio_fast(file: UploadFile = File(...)):
+    """
+    Predict the note from the pitch of the stroke alone, without the neural model
+    
+    Much faster than /predict and usable before a model is exported, but less
+    accurate; the confidence reflects how clearly the pitch falls in one band.
+    
+    - **file**: Audio file (WAV, MP3, M4A, AAC)
+    """
+    if pitch_classifier is None:
+        raise HTTPException(status_code=503, detail="Pitch classifier not loaded.")
+    
+    allowed_extensions = ['.wav', '.mp3', '.m4a', '.aac']
+    file_ext = os.path.splitext(file.filename)[1].lower()
+    if file_ext not in allowed_extensions:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Invalid file type. Allowed: {', '.join(allowed_extensions)}"
+        )
+    
+    try:
+        with tempfile.NamedTemporaryFile(delete=False, suffix=file_ext) as tmp_file:
+            tmp_file.write(await file.read())
+            tmp_path = tmp_file.name
         
-        # Clean up temp file
+        audio, sr = librosa.load(tmp_path, sr=22050)
         os.remove(tmp_path)
         
+        results = pitch_classifier.predict(audio, sr)
+        if results is None:
+            raise HTTPException(status_code=400, detail="No pitched sound found in audio")
+        
         return {
             "success": True,
-            "predicted_note": predicted_note,
-            "confidence": confidence,
-            "all_confidences": all_confidences,
-            "cultural_info": cultural_info,
-            "audio_duration": duration,
-            "sample_rate": sr
+            "predicted_note": results["note"],
+            "confidence": results["confidence"],
+            "all_confidences": results["all_confidences"],
+            "cultural_info": get_cultural_info(results["note"]),
+            "audio_duration": len(audio) / sr,
+            "sample_rate": sr,
+            "served_by": "pitch",
+            "f0_hz": results["f0"]
         }
-        
+    
+    except HTTPException:
+        raise
     except Exception as e:
-        # Clean up temp file if it exists
         if 'tmp_path' in locals() and os.path.exists(tmp_path):
             os.remove(tmp_path)
         
         raise HTTPException(status_code=500, detail=f"Error processing audio: {str(e)}")
 
+def decode_pcm(body, sample_format, sample_rate, channels):
+    """
+    Interleaved PCM bytes to 22050 Hz mono float32. The buffer is viewed, not
+    copied; the only copies are the int16 scaling, the channel mix and the resampling.
+    """
+    dtype = RAW_SAMPLE_FORMATS[sample_format]
+    frame_size = dtype.itemsize * channels
+    if len(body) == 0 or len(body) % frame_size:
+        raise ValueError(f"Body must be a whole number of {channels}-channel {sample_format} frames")
+    
+    samples = np.frombuffer(body, dtype=dtype).reshape(-1, channels)
+    duration = len(samples) / sample_rate
+    samples = samples[:int(sample_rate * RAW_MAX_SECONDS)]
+    
+    if sample_format == "int16":
+        audio = samples.mean(axis=1, dtype=np.float32) if channels > 1 else samples[:, 0].astype(np.float32)
+        audio *= np.float32(1 / 32768)
+    else:
+        audio = samples.mean(axis=1, dtype=np.float32) if channels > 1 else samples[:, 0]
+        if not np.isfinite(audio).all():
+            raise ValueError("Audio contains NaN or infinite samples")
+    
+    if sample_rate != 22050:
+        audio = librosa.resample(audio, orig_sr=sample_rate, target_sr=22050)
+    return audio, duration
+
+async def read_capped_body(request, max_bytes):
+    """
+    The request body, refusing it with 413 as soon as its declared or received
+    length passes max_bytes, so an oversized upload is never held in memory
+    """
+    too_large = HTTPException(status_code=413,
+                              detail=f"Body exceeds {RAW_MAX_UPLOAD_SECONDS:g} s of audio ({max_bytes} bytes)")
+    content_length = request.headers.get("content-length")
+    if content_length is not None and content_length.isdigit() and int(content_length) > max_bytes:
+        raise too_large
+    
+    body = bytearray()
+    async for chunk in request.stream():
+        body += chunk
+        if len(body) > max_bytes:
+            raise too_large
+    return bytes(body)
+
+@app.post("/predict-raw", response_model=PredictionResponse)
+async def predict_raw_audio(
+    request: Request,
+    sample_rate: Optional[int] = Query(None),
+    channels: Optional[int] = Query(None),
+    format: Optional[str] = Query(None),
+    x_sample_rate: Optional[int] = Header(None),
+    x_channels: Optional[int] = Header(None),
+    x_sample_format: Optional[str] = Header(None)
+):
+    """
+    Predict from raw PCM sent as the request body (application/octet-stream),
+    with no container to decode and no temporary file
+    
+    - **sample_rate** / X-Sample-Rate header: Sample rate in Hz (required)
+    - **channels** / X-Channels header: Interleaved channels, mixed to mono (default 1)
+    - **format** / X-Sample-Format header: 'float32' (default) or 'int16', little-endian
+    """
+    bundle = registry.active
+    if bundle is None or not bundle.ready:
+        raise HTTPException(
+            status_code=503,
+            detail="Model not loaded. Please train and export model first."
+        )
+    
+    content_type = request.headers.get("content-type", "application/octet-stream")
+    if content_type.split(";")[0].strip() != "application/octet-stream":
+        raise HTTPException(status_code=415, detail="Send the PCM samples as application/octet-stream")
+    
+    # Query parameters win over headers
+    sample_rate = sample_rate or x_sample_rate
+    channels = channels or x_channels or 1
+    sample_format = (format or x_sample_format or "float32").lower()
+    if sample_rate is None or not 1000 <= sample_rate <= 384000:
+        raise HTTPException(status_code=400, detail="Sample rate between 1000 and 384000 Hz is required")
+    if not 1 <= channels <= 32:
+        raise HTTPException(status_code=400, detail="Channels must be between 1 and 32")
+    if sample_format not in RAW_SAMPLE_FORMATS:
+        raise HTTPException(status_code=400,
+                            detail=f"Invalid sample format. Allowed: {', '.join(RAW_SAMPLE_FORMATS)}")
+    
+    max_bytes = int(RAW_MAX_UPLOAD_SECONDS * sample_rate) * channels * RAW_SAMPLE_FORMATS[sample_format].itemsize
+    body = await read_capped_body(request, max_bytes)
+    
+    # Resampling and inference are CPU-bound: keep them off the event loop
+    try:
+        audio, duration = await asyncio.to_thread(decode_pcm, body, sample_format, sample_rate, channels)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    try:
+        prediction = await asyncio.to_thread(predict_clip, audio, 22050, bundle)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error processing audio: {str(e)}")
+    
+    return {"success": True, **prediction, "audio_duration": duration}
+
+@app.get("/cascade-metrics", response_model=CascadeMetricsResponse)
+async def get_cascade_metrics():
+    """
+    Escalation rate and latency of the active version's cascade, and its held-out
+    evaluation if configured; counts start afresh with each version
+    """
+    bundle = registry.active
+    if bundle is None or bundle.cascade is None:
+        return {"enabled": False, "live": {}, "evaluation": None,
+                "model_version": bundle.version if bundle else None}
+    return {"enabled": True, "live": bundle.cascade.stats(), "evaluation": bundle.cascade.evaluation,
+            "model_version": bundle.version}
+
+def check_admin_token(token):
+    if ADMIN_TOKEN and token != ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+
+@app.get("/model/versions", response_model=ModelVersionsResponse)
+async def get_model_versions():
+    """Versions in the registry, and the active and previous ones"""
+    return registry.status()
+
+@app.post("/admin/reload", response_model=ModelVersionsResponse)
+async def reload_model(version: Optional[str] = None, x_admin_token: Optional[str] = Header(None)):
+    """
+    Load and warm a registry version (the newest by default) in a worker thread,
+    then swap it in. Requests keep being served by the active version meanwhile.
+    """
+    check_admin_token(x_admin_token)
+    if version is None:
+        versions = registry.versions()
+        if not versions:
+            raise HTTPException(status_code=404, detail=f"No model versions in {registry.root}")
+        version = versions[-1]
+    
+    try:
+        await asyncio.to_thread(registry.activate, version)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error loading model version {version}: {str(e)}")
+    return registry.status()
+
+@app.post("/admin/rollback", response_model=ModelVersionsResponse)
+async def rollback_model(x_admin_token: Optional[str] = Header(None)):
+    """Serve the previous version again"""
+    check_admin_token(x_admin_token)
+    try:
+        registry.rollback()
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return registry.status()
+
+def get_job_or_404(job_id):
+    if job_queue is None:
+        raise HTTPException(status_code=503, detail="Job queue not running.")
+    job = job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found or expired")
+    return job
+
+@app.post("/jobs", response_model=JobResponse, status_code=202)
+async def submit_job(files: List[UploadFile] = File(...), mode: str = "note", min_note_seconds: float = 0.5):
+    """
+    Queue long recordings or many clips for background classification
+    
+    - **files**: One or more audio files (WAV, MP3, M4A, AAC)
+    - **mode**: 'note' for one prediction per file, 'sequence' to decode each file into notes
+    - **min_note_seconds**: Shortest note in sequence mode
+    
+    Returns the job at once; poll GET /jobs/{job_id} or follow GET /jobs/{job_id}/events.
+    """
+    if job_queue is None:
+        raise HTTPException(status_code=503, detail="Job queue not running.")
+    if mode not in JOB_MODES:
+        raise HTTPException(status_code=400, detail=f"Invalid mode. Allowed: {', '.join(JOB_MODES)}")
+    
+    allowed_extensions = ['.wav', '.mp3', '.m4a', '.aac']
+    for file in files:
+        if os.path.splitext(file.filename)[1].lower() not in allowed_extensions:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Invalid file type for {file.filename}. Allowed: {', '.join(allowed_extensions)}"
+            )
+    
+    uploads = [(file.filename, await file.read()) for file in files]
+    job_id = await asyncio.to_thread(job_queue.submit, uploads,
+                                     {"mode": mode, "min_note_seconds": min_note_seconds})
+    return job_queue.get(job_id)
+
+@app.get("/jobs/{job_id}", response_model=JobResponse)
+async def get_job(job_id: str):
+    """Status, progress and, once done, the result of a job"""
+    return get_job_or_404(job_id)
+
+@app.get("/jobs/{job_id}/events")
+async def stream_job_events(job_id: str):
+    """
+    Server-sent events for a job: 'progress' whenever it changes, then one
+    'done' or 'failed' event carrying the whole job, after which the stream ends
+    """
+    get_job_or_404(job_id)
+    
+    async def events():
+        last = None
+        last_sent = time.time()
+        while True:
+            job = job_queue.get(job_id)
+            if job is None:
+                yield f"event: failed\ndata: {json.dumps({'job_id': job_id, 'error': 'Job deleted or expired'})}\n\n"
+                return
+            if job["status"] in FINISHED_STATUSES:
+                yield f"event: {job['status']}\ndata: {json.dumps(job)}\n\n"
+                return
+            
+            snapshot = (job["status"], job["progress"], job["message"])
+            if snapshot != last:
+                data = {key: job[key] for key in ("job_id", "status", "progress", "message")}
+                yield f"event: progress\ndata: {json.dumps(data)}\n\n"
+                last, last_sent = snapshot, time.time()
+            elif time.time() - last_sent > JOB_KEEPALIVE_SECONDS:
+                yield ": keep-alive\n\n"  # Keeps proxies from closing an idle stream
+                last_sent = time.time()
+            await asyncio.sleep(JOB_EVENT_INTERVAL)
+    
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.delete("/jobs/{job_id}")
+async def delete_job(job_id: str):
+    """Delete a job and its result before it expires"""
+    get_job_or_404(job_id)
+    job_queue.delete(job_id)
+    return {"success": True, "job_id": job_id}
+
 @app.get("/cultural-info/{note}")
 async def get_note_cultural_info(note: str):
     """Get cultural information for a specific note"""
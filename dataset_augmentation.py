@@ -14,26 +14,155 @@ import os
 import librosa
 import soundfile as sf
 import numpy as np
-from scipy.signal import butter, filtfilt, hilbert
+from scipy.signal import butter, hilbert, fftconvolve, sosfiltfilt, tf2sos
 from scipy.io import wavfile
-import random
 from pathlib import Path
 import shutil
 import argparse
+import hashlib
+import json
 import time
+import zlib
+from collections import OrderedDict
+from contextlib import nullcontext
+from functools import lru_cache
+from concurrent.futures import ProcessPoolExecutor
 from tqdm import tqdm
 
+from audio_shards import SHARD_CODECS, ShardWriter, encode_audio, shard_blob_sha256
+from decoded_cache import DecodedAudioCache, file_sha256
+from augmentation_profiler import PROFILE_FILE, TransformProfiler, benchmark_transforms, format_benchmark
+
+AUDIO_EXTENSIONS = ['.mp3', '.wav', '.m4a', '.aac']
+
+# Bump whenever a change to the transforms alters their output, so resumed
+# runs regenerate variations made by the old code
+AUGMENTATION_VERSION = '4'
+MANIFEST_FILE = 'manifest.jsonl'
+PARTITION_MANIFEST_GLOB = 'manifest.shard-*.jsonl'
+
+# 'phase_vocoder' keeps duration exactly; 'resample' is much cheaper and, for
+# the ±0.5 semitone range, changes duration by under 3% before the length fix
+PITCH_SHIFT_METHODS = ('phase_vocoder', 'resample')
+
+# Probability of each transform in a variation, in the order they are applied
+TRANSFORM_PROBABILITIES = {
+    'time_stretch': 0.8,
+    'volume': 0.85,
+    'freq_filter': 0.7,
+    'noise': 0.5,
+    'reverb': 0.4,
+    'pitch_shift': 0.2,
+    'compression': 0.3,
+}
+
+# 'files' writes one WAV per sample; 'shards' packs them into large shard files
+OUTPUT_FORMATS = ('files', 'shards')
+
+
+# EQ band -> biquad type, in the order their gains are drawn
+EQ_BAND_TYPES = {
+    'low_shelf': 'low_shelf',
+    'mid_boost': 'peaking',
+    'high_shelf': 'high_shelf',
+    'presence': 'peaking',
+}
+
+# 1/f approximation used for pink noise, as second-order sections
+PINK_NOISE_SOS = tf2sos([0.049922035, -0.095993537, 0.050612699, -0.004408786],
+                        [1, -2.494956002, 2.017265875, -0.522189400])
+
+
+@lru_cache(maxsize=64)
+def design_butter_sos(btype, freq, order, sample_rate):
+    """Butterworth design as second-order sections, cached by (type, frequency, order, sample rate)"""
+    nyquist = sample_rate / 2
+    if isinstance(freq, tuple):
+        wn = [f / nyquist for f in freq]
+    else:
+        wn = freq / nyquist
+    return butter(order, wn, btype=btype, output='sos')
+
+
+def eq_biquad_sos(kind, freq, gain_db, q, sample_rate):
+    """
+    One shelving or peaking EQ biquad (Audio EQ Cookbook) as an SOS row
+    [b0, b1, b2, 1, a1, a2]. Shelves use a slope of 1, ignoring q. An array
+    of gains gives one column per gain, shape [6, len(gain_db)].
+    """
+    A = 10 ** (gain_db / 40.0)
+    w0 = 2 * np.pi * freq / sample_rate
+    cos_w0 = np.cos(w0)
+    
+    if kind == 'peaking':
+        alpha = np.sin(w0) / (2 * q)
+        b = [1 + alpha * A, -2 * cos_w0, 1 - alpha * A]
+        a = [1 + alpha / A, -2 * cos_w0, 1 - alpha / A]
+    else:
+        two_sqrt_a_alpha = 2 * np.sqrt(A) * np.sin(w0) / np.sqrt(2)
+        sign = 1 if kind == 'low_shelf' else -1
+        b = [A * ((A + 1) - sign * (A - 1) * cos_w0 + two_sqrt_a_alpha),
+             sign * 2 * A * ((A - 1) - sign * (A + 1) * cos_w0),
+             A * ((A + 1) - sign * (A - 1) * cos_w0 - two_sqrt_a_alpha)]
+        a = [(A + 1) + sign * (A - 1) * cos_w0 + two_sqrt_a_alpha,
+             -sign * 2 * ((A - 1) + sign * (A + 1) * cos_w0),
+             (A + 1) + sign * (A - 1) * cos_w0 - two_sqrt_a_alpha]
+    
+    return np.stack(np.broadcast_arrays(*b, *a)) / a[0]
+
+
+def _json_params(params):
+    """Convert NumPy scalars in a parameter dict to plain JSON values"""
+    def convert(value):
+        if isinstance(value, list):
+            return [convert(v) for v in value]
+        return value.item() if isinstance(value, np.generic) else value
+    return {key: convert(value) for key, value in params.items()}
+
 class TalkingDrumAugmentationSystem:
     """
     Advanced audio augmentation system for talking drum dataset multiplication
     Preserves cultural and musical authenticity while creating training variations
     """
     
-    def __init__(self, dataset_path, output_path=None, target_samples_per_note=150):
+    def __init__(self, dataset_path, output_path=None, target_samples_per_note=150,
+                 seed=42, workers=1, pitch_shift_method='phase_vocoder',
+                 output_format='files', shard_codec='wav', shard_size_mb=256, decoded_cache=None,
+                 shard_index=0, num_shards=1):
         self.dataset_path = Path(dataset_path)
         self.output_path = Path(output_path) if output_path else self.dataset_path.parent / "augmented_talking_drum_dataset"
         self.target_samples_per_note = target_samples_per_note
         self.sample_rate = 22050  # Standard for audio processing
+        self.seed = seed  # Master seed; every variation derives its own RNG from it
+        self.workers = workers
+        # Machine shard: this run only produces the outputs partitioned to it
+        if not 0 <= shard_index < num_shards:
+            raise ValueError(f"shard_index must be in [0, {num_shards}), got {shard_index}")
+        self.shard_index = shard_index
+        self.num_shards = num_shards
+        if num_shards == 1:
+            self.manifest_path = self.output_path / MANIFEST_FILE
+        else:
+            self.manifest_path = self.output_path / f"manifest.shard-{shard_index:03d}-of-{num_shards:03d}.jsonl"
+        self.reverb_bank = []  # Optional pre-rendered room impulse responses
+        self.noise_bank = {}  # Optional pre-rendered noise buffers by type
+        self._audio_cache = OrderedDict()  # Recently decoded originals
+        self._stft_cache = OrderedDict()  # Phase vocoder analyses of recent sources
+        self.stft_cache_size = 8
+        if pitch_shift_method not in PITCH_SHIFT_METHODS:
+            raise ValueError(f"Unknown pitch shift method: {pitch_shift_method}")
+        self.pitch_shift_method = pitch_shift_method
+        self.profiler = None  # Optional TransformProfiler timing each transform and I/O
+        if output_format not in OUTPUT_FORMATS:
+            raise ValueError(f"Unknown output format: {output_format}")
+        self.output_format = output_format
+        self.shard_codec = shard_codec
+        self.shard_size_mb = shard_size_mb
+        # Optional DecodedAudioCache (or its folder) so originals are decoded only once
+        if decoded_cache is not None and not isinstance(decoded_cache, DecodedAudioCache):
+            decoded_cache = DecodedAudioCache(decoded_cache, self.sample_rate)
+        self.decoded_cache = decoded_cache
+        self.scheduler = None  # Optional BudgetScheduler fixing variation counts and transform gates
         
         # Enhanced augmentation parameters for 150 samples (more variations)
         self.augmentation_params = {
@@ -47,9 +176,9 @@ class TalkingDrumAugmentationSystem:
             },
             'frequency_filtering': {
                 'low_shelf': {'freq': 200, 'gain_range': (-4, 4)},  # Increased range
-                'mid_boost': {'freq': 800, 'gain_range': (-3, 3)},  # Increased range
+                'mid_boost': {'freq': 800, 'q': 0.7, 'gain_range': (-3, 3)},  # Increased range
                 'high_shelf': {'freq': 4000, 'gain_range': (-4, 4)},  # Increased range
-                'presence': {'freq': 2500, 'gain_range': (-2, 2)}  # Added presence band
+                'presence': {'freq': 2500, 'q': 1.0, 'gain_range': (-2, 2)}  # Added presence band
             },
             'noise_addition': {
                 'noise_level_range': (-45, -25),  # Wider noise range
@@ -69,9 +198,26 @@ class TalkingDrumAugmentationSystem:
             }
         }
     
+    @staticmethod
+    def _resolve_rng(rng):
+        """Fall back to the global NumPy random state when no generator is given"""
+        return np.random if rng is None else rng
+    
+    def variation_rng(self, note_name, source_name, var_idx):
+        """
+        Independent RNG for one variation, derived from the master seed and the
+        variation's identity so results do not depend on processing order
+        """
+        key = [self.seed, zlib.crc32(note_name.encode()), zlib.crc32(source_name.encode()), var_idx]
+        return np.random.default_rng(np.random.SeedSequence(key))
+    
     def load_audio_file(self, file_path):
         """Load audio file and normalize"""
         try:
+            if self.decoded_cache is not None:
+                # Decoded once per source file; later runs read the cached array
+                return self.decoded_cache.load(file_path), self.sample_rate
+            
             # Try loading with librosa first
             audio, sr = librosa.load(file_path, sr=self.sample_rate)
             return audio, sr
@@ -79,103 +225,198 @@ class TalkingDrumAugmentationSystem:
             print(f"⚠️  Error loading {file_path}: {e}")
             return None, None
     
+    def _load_cached_audio(self, file_path, max_entries=4):
+        """Load an original, reusing it across the variations generated from it"""
+        key = str(file_path)
+        if key in self._audio_cache:
+            self._audio_cache.move_to_end(key)
+            return self._audio_cache[key]
+        
+        with self._stage('load'):
+            audio, sr = self.load_audio_file(file_path)
+        self._audio_cache[key] = (audio, sr)
+        if len(self._audio_cache) > max_entries:
+            self._audio_cache.popitem(last=False)
+        return audio, sr
+    
+    @staticmethod
+    def _vocoder_analysis(audio):
+        """
+        Everything the phase vocoder reads from a clip's STFT: frame magnitudes,
+        the first frame's phase and the wrapped phase advance between frames
+        """
+        stft = librosa.stft(audio)
+        n_fft = 2 * (stft.shape[0] - 1)
+        phi_advance = (n_fft // 4) * librosa.fft_frequencies(sr=2 * np.pi, n_fft=n_fft)
+        
+        # Two silent frames at the end, as in librosa.phase_vocoder
+        stft = np.pad(stft, [(0, 0), (0, 2)])
+        angle = np.angle(stft).astype(np.float64)
+        dphase = np.diff(angle, axis=1) - phi_advance[:, None]
+        dphase -= 2.0 * np.pi * np.round(dphase / (2.0 * np.pi))
+        return {
+            'magnitude': np.abs(stft),
+            'phase_step': phi_advance[:, None] + dphase,
+            'initial_phase': angle[:, 0],
+            'num_frames': stft.shape[1] - 2,
+        }
+    
+    def _cached_vocoder_analysis(self, audio):
+        """
+        Phase vocoder analysis of a clip, cached by content so the ~20
+        variations stretched from the same original share one STFT
+        """
+        key = (hashlib.blake2b(audio.tobytes(), digest_size=16).hexdigest(), audio.dtype.str)
+        if key in self._stft_cache:
+            self._stft_cache.move_to_end(key)
+            return self._stft_cache[key]
+        
+        analysis = self._vocoder_analysis(audio)
+        self._stft_cache[key] = analysis
+        if len(self._stft_cache) > self.stft_cache_size:
+            self._stft_cache.popitem(last=False)
+        return analysis
+    
+    @staticmethod
+    def _phase_vocode(analysis, rate, length, dtype):
+        """
+        Resynthesize an analysed clip at a new rate. Same algorithm as
+        librosa.phase_vocoder, with the frame-by-frame phase accumulation done
+        as one cumulative sum.
+        """
+        steps = np.arange(0, analysis['num_frames'], rate, dtype=np.float64)
+        frames = steps.astype(int)
+        alpha = np.mod(steps, 1.0).astype(np.float32)
+        
+        magnitude = analysis['magnitude']
+        mag = (1.0 - alpha) * magnitude[:, frames] + alpha * magnitude[:, frames + 1]
+        
+        phase = np.empty(mag.shape)
+        phase[:, 0] = analysis['initial_phase']
+        np.cumsum(analysis['phase_step'][:, frames[:-1]], axis=1, out=phase[:, 1:])
+        phase[:, 1:] += analysis['initial_phase'][:, None]
+        
+        # Wrap to [-pi, pi] before the single-precision trig; the STFT is complex64 anyway
+        turns = phase * (0.5 / np.pi)
+        np.round(turns, out=turns)
+        turns *= 2.0 * np.pi
+        phase -= turns
+        phase = phase.astype(np.float32)
+        stretched = np.empty(mag.shape, dtype=np.complex64)
+        stretched.real = mag * np.cos(phase)
+        stretched.imag = mag * np.sin(phase)
+        return librosa.istft(stretched, dtype=dtype, length=length)
+    
+    def _stage(self, name):
+        """Profiler stage for a block (time, and allocation peak if traced), or nothing without a profiler"""
+        return self.profiler.stage(name) if self.profiler is not None else nullcontext()
+    
+    def _profiled(self, name, transform, audio, *args):
+        """Apply a transform, timing it and measuring its allocations if a profiler is attached"""
+        with self._stage(name):
+            return transform(audio, *args)
+    
     def apply_time_stretch(self, audio, stretch_factor):
         """Apply time stretching without changing pitch"""
-        return librosa.effects.time_stretch(audio, rate=stretch_factor)
+        return self._phase_vocode(self._cached_vocoder_analysis(audio), stretch_factor,
+                                  int(round(len(audio) / stretch_factor)), audio.dtype)
     
     def apply_volume_variation(self, audio, db_change):
         """Apply volume changes while preserving dynamics"""
         linear_gain = 10 ** (db_change / 20.0)
         return audio * linear_gain
     
-    def apply_frequency_filtering(self, audio, sr):
-        """Apply subtle EQ changes"""
-        filtered_audio = audio.copy()
+    def apply_frequency_filtering(self, audio, sr, rng=None, params_out=None):
+        """
+        Apply subtle EQ changes (drawn gains are stored in params_out if given)
+        
+        Every band with an audible gain contributes one biquad; the selected
+        shelf and peaking stages are stacked into a single second-order-section
+        cascade and applied in one zero-phase pass.
+        """
+        rng = self._resolve_rng(rng)
         
-        # Random EQ adjustments
+        # Random EQ adjustments, one gain per band in a fixed order
         params = self.augmentation_params['frequency_filtering']
+        gains = {band: rng.uniform(*params[band]['gain_range']) for band in EQ_BAND_TYPES}
         
-        # Low shelf filter
-        low_gain = np.random.uniform(*params['low_shelf']['gain_range'])
-        if abs(low_gain) > 0.5:
-            filtered_audio = self._apply_shelf_filter(filtered_audio, sr, 
-                                                    params['low_shelf']['freq'], 
-                                                    low_gain, 'low')
-        
-        # Mid frequency boost/cut
-        mid_gain = np.random.uniform(*params['mid_boost']['gain_range'])
-        if abs(mid_gain) > 0.5:
-            filtered_audio = self._apply_peaking_filter(filtered_audio, sr,
-                                                       params['mid_boost']['freq'],
-                                                       mid_gain, 1.0)
-        
-        # High shelf filter
-        high_gain = np.random.uniform(*params['high_shelf']['gain_range'])
-        if abs(high_gain) > 0.5:
-            filtered_audio = self._apply_shelf_filter(filtered_audio, sr,
-                                                     params['high_shelf']['freq'],
-                                                     high_gain, 'high')
-        
-        # Presence boost/cut
-        presence_gain = np.random.uniform(*params['presence']['gain_range'])
-        if abs(presence_gain) > 0.5:
-            filtered_audio = self._apply_peaking_filter(filtered_audio, sr,
-                                                       params['presence']['freq'],
-                                                       presence_gain, 2.0)
-        
-        return filtered_audio
-    
-    def _apply_shelf_filter(self, audio, sr, freq, gain_db, shelf_type):
-        """Apply shelving filter"""
-        # Simple implementation using butterworth filter
-        nyquist = sr / 2
-        normalized_freq = freq / nyquist
-        
-        if shelf_type == 'low':
-            b, a = butter(2, normalized_freq, btype='low')
-        else:  # high
-            b, a = butter(2, normalized_freq, btype='high')
-        
-        filtered = filtfilt(b, a, audio)
-        
-        # Apply gain
-        linear_gain = 10 ** (gain_db / 20.0)
-        return audio + (filtered - audio) * (linear_gain - 1)
-    
-    def _apply_peaking_filter(self, audio, sr, freq, gain_db, q_factor):
-        """Apply peaking filter for mid frequencies"""
-        # Simple bandpass implementation
-        nyquist = sr / 2
-        low_freq = freq / (q_factor * 2)
-        high_freq = freq * (q_factor * 2)
-        
-        low_norm = max(0.01, min(0.99, low_freq / nyquist))
-        high_norm = max(0.01, min(0.99, high_freq / nyquist))
-        
-        if low_norm < high_norm:
-            b, a = butter(2, [low_norm, high_norm], btype='band')
-            filtered = filtfilt(b, a, audio)
-            
-            linear_gain = 10 ** (gain_db / 20.0)
-            return audio + filtered * (linear_gain - 1)
+        # Forward-backward filtering squares the magnitude response, so each
+        # section is designed with half the target gain in dB
+        sections = [eq_biquad_sos(EQ_BAND_TYPES[band], params[band]['freq'], gain / 2,
+                                  params[band].get('q', 0.707), sr)
+                    for band, gain in gains.items() if abs(gain) > 0.5]
         
-        return audio
-    
-    def add_realistic_noise(self, audio, noise_level_db):
-        """Add realistic background noise with more variety"""
-        noise_type = np.random.choice(self.augmentation_params['noise_addition']['noise_types'])
+        if params_out is not None:
+            params_out.update({f'{band}_gain_db': gain for band, gain in gains.items()})
         
-        # Generate noise based on type
+        if not sections:
+            return audio.copy()
+        return sosfiltfilt(np.vstack(sections), audio)
+    
+    def _synthesize_noise(self, noise_type, length, rng):
+        """Generate noise based on type"""
         if noise_type == 'pink':
-            noise = self._generate_pink_noise(len(audio))
+            return self._generate_pink_noise(length, rng)
         elif noise_type == 'brown':
-            noise = self._generate_brown_noise(len(audio))
+            return self._generate_brown_noise(length, rng)
         elif noise_type == 'vinyl_noise':
-            noise = self._generate_vinyl_noise(len(audio))
+            return self._generate_vinyl_noise(length, rng)
         elif noise_type == 'tape_hiss':
-            noise = self._generate_tape_hiss(len(audio))
+            return self._generate_tape_hiss(length, rng)
         else:  # room_tone
-            noise = self._generate_room_tone(len(audio))
+            return self._generate_room_tone(length, rng)
+    
+    def render_noise_bank(self, seconds=30.0):
+        """Render a long buffer of every noise type, seeded from the master seed"""
+        rng = np.random.default_rng(np.random.SeedSequence([self.seed, zlib.crc32(b'noise_bank')]))
+        length = int(seconds * self.sample_rate)
+        return {
+            noise_type: self._synthesize_noise(noise_type, length, rng).astype(np.float32)
+            for noise_type in self.augmentation_params['noise_addition']['noise_types']
+        }
+    
+    def build_noise_bank(self, seconds=30.0):
+        """
+        Pre-render a long buffer of every noise type, seeded from the master
+        seed, for add_realistic_noise to slice from
+        """
+        self.noise_bank = self.render_noise_bank(seconds)
+        return self.noise_bank
+    
+    def save_noise_bank(self, path):
+        """Save the noise bank to a .npz file"""
+        np.savez(path, **self.noise_bank)
+    
+    def load_noise_bank(self, path):
+        """Load a noise bank saved with save_noise_bank"""
+        with np.load(path) as data:
+            self.noise_bank = {noise_type: data[noise_type] for noise_type in data.files}
+        return self.noise_bank
+    
+    def add_realistic_noise(self, audio, noise_level_db, rng=None, params_out=None):
+        """
+        Add realistic background noise with more variety
+        
+        If the noise bank holds a long enough buffer of the chosen type, the
+        noise is a random slice of it with random polarity; otherwise it is
+        synthesized for this clip. Any gain on the noise is normalized away by
+        the level scaling below.
+        """
+        rng = self._resolve_rng(rng)
+        noise_type = rng.choice(self.augmentation_params['noise_addition']['noise_types'])
+        params = {'noise_type': str(noise_type)}
+        
+        buffer = self.noise_bank.get(noise_type)
+        if buffer is not None and len(buffer) >= len(audio):
+            offset = int(rng.integers(len(buffer) - len(audio) + 1))
+            polarity = 1.0 if rng.random() < 0.5 else -1.0
+            noise = buffer[offset:offset + len(audio)] * polarity
+            params.update(bank_offset=offset, polarity=polarity)
+        else:
+            noise = self._synthesize_noise(noise_type, len(audio), rng)
+        
+        if params_out is not None:
+            params_out.update(params)
         
         # Scale noise to desired level
         signal_power = np.mean(audio ** 2)
@@ -186,30 +427,29 @@ class TalkingDrumAugmentationSystem:
         
         return audio + noise * scaling_factor
     
-    def _generate_pink_noise(self, length):
+    def _generate_pink_noise(self, length, rng=None):
         """Generate pink noise (1/f noise)"""
+        rng = self._resolve_rng(rng)
         # Simple pink noise approximation
-        white_noise = np.random.normal(0, 1, length)
+        white_noise = rng.normal(0, 1, length)
         # Apply 1/f filter approximation
-        b = [0.049922035, -0.095993537, 0.050612699, -0.004408786]
-        a = [1, -2.494956002, 2.017265875, -0.522189400]
         try:
-            pink_noise = filtfilt(b, a, white_noise)
+            pink_noise = sosfiltfilt(PINK_NOISE_SOS, white_noise)
             return pink_noise / np.std(pink_noise)
         except:
             return white_noise * 0.1
     
-    def _generate_brown_noise(self, length):
+    def _generate_brown_noise(self, length, rng=None):
         """Generate brown noise (1/f² noise)"""
-        white_noise = np.random.normal(0, 1, length)
+        white_noise = self._resolve_rng(rng).normal(0, 1, length)
         # Integrate white noise to get brown noise
         brown_noise = np.cumsum(white_noise)
         return brown_noise / np.std(brown_noise) * 0.1
     
-    def _generate_room_tone(self, length):
+    def _generate_room_tone(self, length, rng=None):
         """Generate subtle room tone noise"""
         # Very low level pink noise with some characteristic frequencies
-        base_noise = self._generate_pink_noise(length) * 0.05
+        base_noise = self._generate_pink_noise(length, rng) * 0.05
         
         # Add some subtle resonances (room modes)
         t = np.linspace(0, length / self.sample_rate, length, endpoint=False)
@@ -219,22 +459,20 @@ class TalkingDrumAugmentationSystem:
         
         return base_noise + room_resonances
     
-    def _generate_vinyl_noise(self, length):
+    def _generate_vinyl_noise(self, length, rng=None):
         """Generate vinyl record surface noise"""
         # High frequency crackling noise
-        white_noise = np.random.normal(0, 1, length) * 0.02
+        white_noise = self._resolve_rng(rng).normal(0, 1, length) * 0.02
         # Apply high-pass filtering to simulate surface noise
-        b, a = butter(2, 1000 / (self.sample_rate / 2), btype='high')
-        vinyl_noise = filtfilt(b, a, white_noise)
+        vinyl_noise = sosfiltfilt(design_butter_sos('highpass', 1000, 2, self.sample_rate), white_noise)
         return vinyl_noise
     
-    def _generate_tape_hiss(self, length):
+    def _generate_tape_hiss(self, length, rng=None):
         """Generate analog tape hiss"""
         # High frequency white noise
-        hiss = np.random.normal(0, 1, length) * 0.03
+        hiss = self._resolve_rng(rng).normal(0, 1, length) * 0.03
         # Filter to simulate tape hiss frequency response
-        b, a = butter(2, [2000 / (self.sample_rate / 2), 8000 / (self.sample_rate / 2)], btype='band')
-        tape_hiss = filtfilt(b, a, hiss)
+        tape_hiss = sosfiltfilt(design_butter_sos('bandpass', (2000, 8000), 2, self.sample_rate), hiss)
         return tape_hiss
     
     def apply_subtle_pitch_shift(self, audio, semitones):
@@ -242,10 +480,22 @@ class TalkingDrumAugmentationSystem:
         if abs(semitones) < 0.1:  # Skip if change is too small
             return audio
         
-        # Use librosa's pitch shifting with high quality
         try:
-            shifted = librosa.effects.pitch_shift(audio, sr=self.sample_rate, n_steps=semitones)
-            return shifted
+            if self.pitch_shift_method == 'resample':
+                # Tape-speed shift: play the clip back faster or slower
+                factor = 2.0 ** (semitones / 12.0)
+                shifted = librosa.resample(audio, orig_sr=self.sample_rate * factor,
+                                           target_sr=self.sample_rate)
+                return librosa.util.fix_length(shifted, size=len(audio))
+            
+            # Phase vocoder pitch shift (as librosa.effects.pitch_shift): stretch, then resample.
+            # The input has already been through the other transforms, so it is not cached.
+            rate = 2.0 ** (-semitones / 12.0)
+            stretched = self._phase_vocode(self._vocoder_analysis(audio), rate,
+                                           int(round(len(audio) / rate)), audio.dtype)
+            shifted = librosa.resample(stretched, orig_sr=self.sample_rate / rate,
+                                       target_sr=self.sample_rate)
+            return librosa.util.fix_length(shifted, size=len(audio))
         except:
             return audio  # Return original if pitch shift fails
     
@@ -269,76 +519,188 @@ class TalkingDrumAugmentationSystem:
         
         return compressed
     
-    def apply_subtle_reverb(self, audio):
-        """Apply subtle reverb simulation"""
-        # Simple reverb using multiple delayed copies with exponential decay
-        room_size = np.random.uniform(*self.augmentation_params['reverb']['room_size_range'])
-        decay_time = np.random.uniform(*self.augmentation_params['reverb']['decay_time_range'])
-        
-        # Create reverb impulse response
-        impulse_length = int(decay_time * self.sample_rate)
+    def _draw_reverb_params(self, rng):
+        """Draw room size, decay time and reflection delays for the reflection model"""
+        room_size = rng.uniform(*self.augmentation_params['reverb']['room_size_range'])
+        decay_time = rng.uniform(*self.augmentation_params['reverb']['decay_time_range'])
         
         # Multiple reflections with random delays
         num_reflections = 8
-        reverb_signal = np.zeros(len(audio) + impulse_length)
-        reverb_signal[:len(audio)] = audio
+        delays = [int(rng.uniform(0.01, decay_time) * self.sample_rate) for _ in range(num_reflections)]
+        return room_size, decay_time, delays
+    
+    def build_reverb_impulse_response(self, room_size, decay_time, delays):
+        """
+        Impulse response of the reflection model: the direct sound plus one
+        tap per reflection, each 0.7x quieter than the previous one
+        """
+        impulse_length = int(decay_time * self.sample_rate)
+        impulse_response = np.zeros(max(1, impulse_length))
+        impulse_response[0] = 1.0
         
-        for i in range(num_reflections):
-            delay = int(np.random.uniform(0.01, decay_time) * self.sample_rate)
+        for i, delay in enumerate(delays):
             amplitude = room_size * (0.7 ** i)  # Exponential decay
-            
             if delay < impulse_length and delay > 0:
-                delayed_audio = np.zeros(len(audio) + impulse_length)
-                delayed_audio[delay:delay+len(audio)] = audio * amplitude
-                reverb_signal += delayed_audio
+                impulse_response[delay] += amplitude
         
-        return reverb_signal[:len(audio)]  # Trim to original length
+        return impulse_response
     
-    def create_augmented_variation(self, audio, variation_id):
-        """Create a single augmented variation with random parameters"""
+    def apply_impulse_response(self, audio, impulse_response, max_sparse_taps=64):
+        """
+        Convolve with an impulse response, trimmed to the original length
+        
+        Sparse responses (like the 8-reflection model) are applied as shifted
+        adds into a single output buffer; dense ones, such as recorded rooms,
+        use one FFT convolution.
+        """
+        # Taps beyond the end of the clip cannot reach the trimmed output
+        impulse_response = impulse_response[:len(audio)]
+        taps = np.flatnonzero(impulse_response)
+        
+        if len(taps) > max_sparse_taps:
+            return fftconvolve(audio, impulse_response)[:len(audio)]
+        
+        output = np.zeros(len(audio))
+        for delay in taps:
+            output[delay:] += impulse_response[delay] * audio[:len(audio) - delay]
+        return output
+    
+    def build_reverb_bank(self, size):
+        """
+        Pre-render a bank of room impulse responses, drawn from the same
+        parameter ranges and seeded from the master seed
+        """
+        rng = np.random.default_rng(np.random.SeedSequence([self.seed, zlib.crc32(b'reverb_bank')]))
+        self.reverb_bank = []
+        for _ in range(size):
+            room_size, decay_time, delays = self._draw_reverb_params(rng)
+            self.reverb_bank.append({
+                'room_size': float(room_size),
+                'decay_time': float(decay_time),
+                'delays': delays,
+                'impulse_response': self.build_reverb_impulse_response(room_size, decay_time, delays),
+            })
+        return self.reverb_bank
+    
+    def save_reverb_bank(self, path):
+        """Save the reverb bank to a .npz file"""
+        arrays = {}
+        for i, entry in enumerate(self.reverb_bank):
+            arrays[f'ir_{i}'] = entry['impulse_response']
+            arrays[f'params_{i}'] = np.array([entry['room_size'], entry['decay_time']] + entry['delays'])
+        np.savez_compressed(path, **arrays)
+    
+    def load_reverb_bank(self, path):
+        """Load a reverb bank saved with save_reverb_bank"""
+        with np.load(path) as data:
+            size = len([key for key in data.files if key.startswith('ir_')])
+            self.reverb_bank = []
+            for i in range(size):
+                params = data[f'params_{i}']
+                self.reverb_bank.append({
+                    'room_size': float(params[0]),
+                    'decay_time': float(params[1]),
+                    'delays': [int(d) for d in params[2:]],
+                    'impulse_response': data[f'ir_{i}'],
+                })
+        return self.reverb_bank
+    
+    def apply_subtle_reverb(self, audio, rng=None, params_out=None):
+        """
+        Apply subtle reverb simulation
+        
+        Uses a random impulse response from the reverb bank if one has been
+        built or loaded, otherwise draws and renders a fresh one.
+        """
+        rng = self._resolve_rng(rng)
+        
+        if self.reverb_bank:
+            bank_index = int(rng.integers(len(self.reverb_bank)))
+            entry = self.reverb_bank[bank_index]
+            params = {'bank_index': bank_index, 'room_size': entry['room_size'],
+                      'decay_time': entry['decay_time'], 'delays': entry['delays']}
+            impulse_response = entry['impulse_response']
+        else:
+            room_size, decay_time, delays = self._draw_reverb_params(rng)
+            params = {'room_size': room_size, 'decay_time': decay_time, 'delays': delays}
+            impulse_response = self.build_reverb_impulse_response(room_size, decay_time, delays)
+        
+        if params_out is not None:
+            params_out.update(params)
+        
+        return self.apply_impulse_response(audio, impulse_response)
+    
+    def create_augmented_variation(self, audio, variation_id, rng=None, transforms=None, gates=None):
+        """
+        Create a single augmented variation with random parameters
+        
+        If a list is passed as ``transforms``, one dict per applied transform
+        is appended to it with the exact parameters that were drawn. ``gates``
+        ({transform: bool}) fixes which transforms are applied instead of
+        drawing them; the draws are still made, so parameters are unchanged.
+        """
+        rng = self._resolve_rng(rng)
         augmented = audio.copy()
         applied_augmentations = []
+        record = transforms.append if transforms is not None else (lambda entry: None)
+        
+        def apply(name):
+            draw = rng.random()
+            return gates[name] if gates is not None else draw < TRANSFORM_PROBABILITIES[name]
         
         # Time stretching (80% probability for more variations)
-        if np.random.random() < 0.8:
-            stretch_factor = np.random.uniform(*self.augmentation_params['time_stretch']['rate_range'])
-            augmented = self.apply_time_stretch(augmented, stretch_factor)
+        if apply('time_stretch'):
+            stretch_factor = rng.uniform(*self.augmentation_params['time_stretch']['rate_range'])
+            augmented = self._profiled('time_stretch', self.apply_time_stretch, augmented, stretch_factor)
             applied_augmentations.append(f"time_stretch_{stretch_factor:.3f}")
+            record({'name': 'time_stretch', 'rate': float(stretch_factor)})
         
         # Volume variation (85% probability)
-        if np.random.random() < 0.85:
-            db_change = np.random.uniform(*self.augmentation_params['volume_variation']['db_range'])
-            augmented = self.apply_volume_variation(augmented, db_change)
+        if apply('volume'):
+            db_change = rng.uniform(*self.augmentation_params['volume_variation']['db_range'])
+            augmented = self._profiled('volume', self.apply_volume_variation, augmented, db_change)
             applied_augmentations.append(f"volume_{db_change:.1f}dB")
+            record({'name': 'volume', 'db_change': float(db_change)})
         
         # Frequency filtering (70% probability)
-        if np.random.random() < 0.7:
-            augmented = self.apply_frequency_filtering(augmented, self.sample_rate)
+        if apply('freq_filter'):
+            eq_params = {}
+            augmented = self._profiled('freq_filter', self.apply_frequency_filtering, augmented,
+                                       self.sample_rate, rng, eq_params)
             applied_augmentations.append("freq_filter")
+            record({'name': 'freq_filter', **_json_params(eq_params)})
         
         # Noise addition (50% probability)
-        if np.random.random() < 0.5:
-            noise_level = np.random.uniform(*self.augmentation_params['noise_addition']['noise_level_range'])
-            augmented = self.add_realistic_noise(augmented, noise_level)
+        if apply('noise'):
+            noise_level = rng.uniform(*self.augmentation_params['noise_addition']['noise_level_range'])
+            noise_params = {}
+            augmented = self._profiled('noise', self.add_realistic_noise, augmented,
+                                       noise_level, rng, noise_params)
             applied_augmentations.append(f"noise_{noise_level:.1f}dB")
+            record({'name': 'noise', 'level_db': float(noise_level), **noise_params})
         
         # Reverb (40% probability)
-        if np.random.random() < 0.4:
-            augmented = self.apply_subtle_reverb(augmented)
+        if apply('reverb'):
+            reverb_params = {}
+            augmented = self._profiled('reverb', self.apply_subtle_reverb, augmented, rng, reverb_params)
             applied_augmentations.append("reverb")
+            record({'name': 'reverb', **_json_params(reverb_params)})
         
         # Subtle pitch shift (20% probability - very careful with this)
-        if np.random.random() < 0.2:
-            pitch_shift = np.random.uniform(*self.augmentation_params['pitch_shift']['semitone_range'])
-            augmented = self.apply_subtle_pitch_shift(augmented, pitch_shift)
+        if apply('pitch_shift'):
+            pitch_shift = rng.uniform(*self.augmentation_params['pitch_shift']['semitone_range'])
+            augmented = self._profiled('pitch_shift', self.apply_subtle_pitch_shift, augmented, pitch_shift)
             applied_augmentations.append(f"pitch_shift_{pitch_shift:.2f}")
+            record({'name': 'pitch_shift', 'semitones': float(pitch_shift)})
         
         # Dynamic compression (30% probability)
-        if np.random.random() < 0.3:
-            ratio = np.random.uniform(*self.augmentation_params['compression']['ratio_range'])
-            threshold = np.random.uniform(*self.augmentation_params['compression']['threshold_range'])
-            augmented = self.apply_dynamic_compression(augmented, ratio, threshold)
+        if apply('compression'):
+            ratio = rng.uniform(*self.augmentation_params['compression']['ratio_range'])
+            threshold = rng.uniform(*self.augmentation_params['compression']['threshold_range'])
+            augmented = self._profiled('compression', self.apply_dynamic_compression, augmented,
+                                       ratio, threshold)
             applied_augmentations.append(f"compress_{ratio:.1f}:{threshold:.0f}")
+            record({'name': 'compression', 'ratio': float(ratio), 'threshold_db': float(threshold)})
         
         # Normalize to prevent clipping
         max_val = np.max(np.abs(augmented))
@@ -347,8 +709,169 @@ class TalkingDrumAugmentationSystem:
         
         return augmented, applied_augmentations
     
-    def process_note_folder(self, note_name, verbose=True):
-        """Process all files in a specific note folder"""
+    def config_fingerprint(self):
+        """Hash of everything besides the source audio that determines a variation"""
+        config = {
+            'version': AUGMENTATION_VERSION,
+            'seed': self.seed,
+            'sample_rate': self.sample_rate,
+            'augmentation_params': self.augmentation_params,
+        }
+        if self.reverb_bank:
+            config['reverb_bank'] = [(e['room_size'], e['decay_time'], e['delays']) for e in self.reverb_bank]
+        if self.noise_bank:
+            config['noise_bank'] = {noise_type: hashlib.sha256(buffer.tobytes()).hexdigest()
+                                    for noise_type, buffer in sorted(self.noise_bank.items())}
+        if self.pitch_shift_method != 'phase_vocoder':
+            config['pitch_shift_method'] = self.pitch_shift_method
+        return hashlib.sha256(json.dumps(config, sort_keys=True).encode()).hexdigest()[:16]
+    
+    def load_manifest(self):
+        """Latest manifest record for each output file, keyed by relative output path"""
+        return self._read_manifest(self.manifest_path)
+    
+    @staticmethod
+    def _read_manifest(manifest_path):
+        records = {}
+        if not manifest_path.exists():
+            return records
+        with open(manifest_path) as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # Partially written line from an interrupted run
+                records[record['output']] = record
+        return records
+    
+    def _is_complete(self, record, output_file, source_sha, config=None):
+        """Whether an output on disk matches its manifest record and current settings"""
+        if (record is None
+                or record['source_sha256'] != source_sha
+                or record.get('config') != config):
+            return False
+        if self.output_format == 'shards':
+            return ('shard' in record
+                    and shard_blob_sha256(self.output_path / record['shard'], record['offset'],
+                                          record['length']) == record['sha256'])
+        return ('shard' not in record
+                and output_file.exists()
+                and file_sha256(output_file) == record['sha256'])
+    
+    def open_shard_writer(self):
+        # Machine shards write to their own shard files so their outputs can be merged by copying
+        prefix = 'shard' if self.num_shards == 1 else f"shard-{self.shard_index:03d}-of-{self.num_shards:03d}"
+        return ShardWriter(self.output_path, codec=self.shard_codec, shard_size_mb=self.shard_size_mb,
+                           prefix=prefix)
+    
+    def in_partition(self, note_name, source_name, var_idx=None):
+        """
+        Whether an output belongs to this machine shard (var_idx None for the
+        copied original). Hashing the output's identity keeps the assignment
+        fixed when notes or files are added, with no coordination between machines.
+        """
+        if self.num_shards == 1:
+            return True
+        key = f"{note_name}/{source_name}/{'original' if var_idx is None else var_idx}"
+        return zlib.crc32(key.encode()) % self.num_shards == self.shard_index
+    
+    def note_audio_files(self, note_name):
+        """Originals of a note, sorted so file indices are stable across machines and runs"""
+        audio_files = []
+        for ext in ['*.mp3', '*.wav', '*.m4a', '*.aac']:
+            audio_files.extend((self.dataset_path / note_name).glob(ext))
+        return sorted(audio_files)
+    
+    def augmentations_per_file(self, num_files):
+        """How many variations to generate from each original of a note"""
+        return max(1, (self.target_samples_per_note - num_files) // num_files)
+    
+    def scheduled_variations_per_file(self, note_name, num_files):
+        """Variations per original of a note, as planned by the scheduler if one is set"""
+        if self.scheduler is not None:
+            return self.scheduler.variations_per_file(note_name)
+        return self.augmentations_per_file(num_files)
+    
+    def variation_gates(self, note_name, source_name, var_idx, config):
+        """
+        Scheduled transform gates of a variation and the config its output is
+        recorded under; outputs of a different schedule then count as stale
+        """
+        if self.scheduler is None:
+            return None, config
+        gates = self.scheduler.gates(note_name, source_name, var_idx)
+        code = ''.join('1' if gates[name] else '0' for name in TRANSFORM_PROBABILITIES)
+        return gates, f"{config}:{code}"
+    
+    def write_output(self, audio, output_path):
+        """
+        Encode a variation for the output format: in shard mode to bytes for
+        the shard writer, otherwise to a WAV file at output_path
+
+        Returns:
+            (SHA-256 of the encoded file, encoded bytes in shard mode or None)
+        """
+        if self.output_format == 'shards':
+            data = encode_audio(audio, self.sample_rate, self.shard_codec)
+            return hashlib.sha256(data).hexdigest(), data
+        
+        # Write under a temporary name so an interrupted run never leaves a truncated WAV
+        tmp_path = Path(output_path).with_suffix('.tmp')
+        sf.write(tmp_path, audio, self.sample_rate, format='WAV')
+        sha = file_sha256(tmp_path)
+        os.replace(tmp_path, output_path)
+        return sha, None
+    
+    @staticmethod
+    def variation_output_name(audio_file, file_idx, var_idx):
+        base_name = audio_file.stem.replace(' ', '_')
+        return f"{base_name}_aug_{file_idx:02d}_{var_idx:03d}.wav"
+    
+    def generate_variation(self, note_name, audio_file, file_idx, var_idx, output_folder,
+                           source_sha=None, config=None, gates=None):
+        """
+        Generate one augmented variation of an original file, save it and return its manifest record
+        
+        In shard output mode nothing is written here: the encoded clip is
+        returned under the record's 'data' key for the caller to append to a shard.
+        """
+        audio, sr = self._load_cached_audio(audio_file)
+        if audio is None:
+            return None
+        
+        rng = self.variation_rng(note_name, audio_file.name, var_idx)
+        transforms = []
+        augmented_audio, applied_augs = self.create_augmented_variation(audio, var_idx, rng, transforms, gates)
+        
+        output_path = Path(output_folder) / self.variation_output_name(audio_file, file_idx, var_idx)
+        with self._stage('write'):
+            sha, data = self.write_output(augmented_audio, output_path)
+        
+        record = {
+            'output': output_path.relative_to(self.output_path).as_posix(),
+            'kind': 'augmented',
+            'note': note_name,
+            'source': audio_file.relative_to(self.dataset_path).as_posix(),
+            'source_sha256': source_sha,
+            'seed': self.seed,
+            'variation': var_idx,
+            'config': config,
+            'transforms': transforms,
+            'sha256': sha,
+        }
+        if self.output_format == 'shards':
+            record['data'] = data
+        return record
+    
+    def process_note_folder(self, note_name, verbose=True, executor=None, shard_writer=None):
+        """
+        Process all files in a specific note folder
+        
+        Outputs already listed in the manifest with a matching source, settings
+        and content hash are kept, so an interrupted run resumes where it stopped.
+        In shard output mode, samples go to ``shard_writer`` (or a writer
+        opened for this call) instead of the note's folder.
+        """
         note_folder = self.dataset_path / note_name
         output_folder = self.output_path / note_name
         
@@ -357,12 +880,11 @@ class TalkingDrumAugmentationSystem:
             return 0
         
         # Create output directory
-        output_folder.mkdir(parents=True, exist_ok=True)
+        if self.output_format == 'files':
+            output_folder.mkdir(parents=True, exist_ok=True)
         
         # Get all audio files in the folder
-        audio_files = []
-        for ext in ['*.mp3', '*.wav', '*.m4a', '*.aac']:
-            audio_files.extend(note_folder.glob(ext))
+        audio_files = self.note_audio_files(note_name)
         
         if not audio_files:
             print(f"⚠️  No audio files found in {note_name} folder")
@@ -372,52 +894,208 @@ class TalkingDrumAugmentationSystem:
             print(f"\n🎵 Processing {note_name} folder:")
             print(f"   Found {len(audio_files)} original files")
         
-        # Copy original files first
-        for original_file in audio_files:
-            original_output = output_folder / f"original_{original_file.name.replace(' ', '_')}"
-            shutil.copy2(original_file, original_output)
+        manifest = self.load_manifest()
+        config = self.config_fingerprint()
+        source_hashes = {audio_file: file_sha256(audio_file) for audio_file in audio_files}
         
-        # Calculate how many augmentations needed per file
-        augmentations_per_file = max(1, (self.target_samples_per_note - len(audio_files)) // len(audio_files))
+        if self.output_format == 'shards' and shard_writer is None:
+            writer_context = self.open_shard_writer()
+        else:
+            writer_context = nullcontext(shard_writer)
         
-        if verbose:
-            print(f"   Creating {augmentations_per_file} variations per original file")
-            print(f"   Target: {self.target_samples_per_note} total samples")
+        self.output_path.mkdir(parents=True, exist_ok=True)
+        with open(self.manifest_path, 'a') as manifest_file, writer_context as shard_writer:
+            # Copy original files first, unless an identical copy is already in place
+            owned_originals = 0
+            for original_file in audio_files:
+                if not self.in_partition(note_name, original_file.name):
+                    continue
+                owned_originals += 1
+                original_output = output_folder / f"original_{original_file.name.replace(' ', '_')}"
+                rel_output = original_output.relative_to(self.output_path).as_posix()
+                source_sha = source_hashes[original_file]
+                if self._is_complete(manifest.get(rel_output), original_output, source_sha):
+                    continue
+                record = {
+                    'output': rel_output,
+                    'kind': 'original',
+                    'note': note_name,
+                    'source': original_file.relative_to(self.dataset_path).as_posix(),
+                    'source_sha256': source_sha,
+                    'sha256': source_sha,
+                }
+                with self._stage('copy_original'):
+                    if self.output_format == 'shards':
+                        # Shards hold decoded audio, so originals are stored at the working sample rate
+                        audio, _ = self._load_cached_audio(original_file)
+                        if audio is None:
+                            continue
+                        data = encode_audio(audio, self.sample_rate, self.shard_codec)
+                        record['sha256'] = hashlib.sha256(data).hexdigest()
+                        self._write_to_shard(shard_writer, record, data)
+                    else:
+                        shutil.copy2(original_file, original_output)
+                self._append_manifest(manifest_file, record)
+            
+            # Calculate how many augmentations needed per file
+            augmentations_per_file = self.scheduled_variations_per_file(note_name, len(audio_files))
+            
+            # One task per (file, variation) still missing or stale; each derives
+            # its own RNG, so output is identical however tasks are spread across workers
+            tasks = []
+            owned_variations = 0
+            for file_idx, audio_file in enumerate(audio_files):
+                for var_idx in range(augmentations_per_file):
+                    if not self.in_partition(note_name, audio_file.name, var_idx):
+                        continue
+                    owned_variations += 1
+                    output_name = self.variation_output_name(audio_file, file_idx, var_idx)
+                    rel_output = f"{note_name}/{output_name}"
+                    gates, variation_config = self.variation_gates(note_name, audio_file.name, var_idx, config)
+                    if self._is_complete(manifest.get(rel_output), output_folder / output_name,
+                                         source_hashes[audio_file], variation_config):
+                        continue
+                    if self.scheduler is not None:
+                        self.scheduler.record_scheduled(audio_file, gates)
+                    tasks.append((note_name, audio_file, file_idx, var_idx, output_folder,
+                                  source_hashes[audio_file], variation_config, gates))
+            
+            total_created = owned_originals + owned_variations - len(tasks)
+            
+            if verbose:
+                print(f"   Creating {augmentations_per_file} variations per original file")
+                print(f"   Target: {self.target_samples_per_note} total samples")
+                if self.num_shards > 1:
+                    print(f"   🧩 Shard {self.shard_index}/{self.num_shards}: {owned_originals} originals, "
+                          f"{owned_variations} variations")
+                if total_created > owned_originals:
+                    print(f"   ♻️  {total_created - owned_originals} variations already complete, "
+                          f"{len(tasks)} to generate")
+            
+            pbar_desc = f"   Augmenting {note_name}"
+            if executor is None and self.workers > 1 and tasks:
+                with self._create_executor() as own_executor:
+                    total_created += self._collect_variations(tasks, own_executor, pbar_desc,
+                                                              manifest_file, verbose, shard_writer)
+            else:
+                total_created += self._collect_variations(tasks, executor, pbar_desc,
+                                                          manifest_file, verbose, shard_writer)
         
-        # Process each original file with progress bar
-        total_created = len(audio_files)  # Start with originals
+        if verbose:
+            print(f"   ✅ Created {total_created} total samples for {note_name}")
         
-        for file_idx, audio_file in enumerate(audio_files):
-            if verbose:
-                print(f"   📊 Processing: {audio_file.name}")
+        return total_created
+    
+    @staticmethod
+    def _append_manifest(manifest_file, record):
+        manifest_file.write(json.dumps(record) + '\n')
+        manifest_file.flush()
+    
+    @staticmethod
+    def _write_to_shard(shard_writer, record, data):
+        """Append an encoded sample to a shard, adding its location to the record"""
+        record.update(shard_writer.append(record['output'], data, record))
+    
+    def _collect_variations(self, tasks, executor, desc, manifest_file, verbose, shard_writer=None):
+        """Run variation tasks and record each finished output in the manifest as it arrives"""
+        created = 0
+        for task, record in zip(tasks, self._run_variation_tasks(tasks, executor, desc)):
+            if record is None:
+                continue
+            if 'data' in record:
+                self._write_to_shard(shard_writer, record, record.pop('data'))
+            self._append_manifest(manifest_file, record)
+            created += 1
             
-            # Load audio
-            audio, sr = self.load_audio_file(audio_file)
-            if audio is None:
+            # Log applied augmentations for first variation
+            if task[3] == 0 and verbose:
+                names = ', '.join(t['name'] for t in record['transforms']) or 'none'
+                print(f"   📊 {task[1].name} example augmentations: {names}")
+        return created
+    
+    def _create_executor(self):
+        """Process pool whose workers each hold a copy of this augmenter"""
+        return ProcessPoolExecutor(max_workers=self.workers,
+                                   initializer=_init_worker, initargs=(self,))
+    
+    def _run_variation_tasks(self, tasks, executor, desc):
+        """Yield variation results in task order, serially or from a process pool"""
+        if executor is None:
+            results = (self.generate_variation(*task) for task in tasks)
+        else:
+            # Contiguous chunks keep each worker on one original, hitting its audio cache
+            chunksize = max(1, len(tasks) // (self.workers * 4))
+            results = self._merge_worker_profiles(
+                executor.map(_generate_variation_task, tasks, chunksize=chunksize))
+        yield from tqdm(results, total=len(tasks), desc=desc, leave=False)
+    
+    def _merge_worker_profiles(self, results):
+        """Unpack worker results, adding the measurements sent with each to this profiler"""
+        for record, stats in results:
+            if stats and self.profiler is not None:
+                self.profiler.merge(stats)
+            yield record
+    
+    def merge_manifests(self, verbose=True):
+        """
+        Combine the manifests of every machine shard in the output folder into
+        one manifest.jsonl, and check that every output the dataset calls for
+        is present and matches its record, using only local files
+        
+        Returns:
+            Dict with the number of complete outputs and lists of missing and
+            invalid (stale or corrupted) ones
+        """
+        records = self._read_manifest(self.output_path / MANIFEST_FILE)
+        for manifest_path in sorted(self.output_path.glob(PARTITION_MANIFEST_GLOB)):
+            records.update(self._read_manifest(manifest_path))
+        config = self.config_fingerprint()
+        
+        merged = []
+        missing = []
+        invalid = []
+        note_folders = sorted(d.name for d in self.dataset_path.iterdir() if d.is_dir())
+        for note_name in tqdm(note_folders, desc="Verifying notes", unit="note", disable=not verbose):
+            audio_files = self.note_audio_files(note_name)
+            if not audio_files:
                 continue
+            output_folder = self.output_path / note_name
+            
+            expected = []
+            for file_idx, original_file in enumerate(audio_files):
+                source_sha = file_sha256(original_file)
+                original_output = output_folder / f"original_{original_file.name.replace(' ', '_')}"
+                expected.append((original_output, source_sha, None))
+                for var_idx in range(self.scheduled_variations_per_file(note_name, len(audio_files))):
+                    output_name = self.variation_output_name(original_file, file_idx, var_idx)
+                    _, variation_config = self.variation_gates(note_name, original_file.name, var_idx, config)
+                    expected.append((output_folder / output_name, source_sha, variation_config))
             
-            # Create augmented variations with progress bar
-            pbar_desc = f"   Augmenting {audio_file.stem}"
-            for var_idx in tqdm(range(augmentations_per_file), desc=pbar_desc, leave=False):
-                augmented_audio, applied_augs = self.create_augmented_variation(audio, var_idx)
-                
-                # Generate output filename
-                base_name = audio_file.stem.replace(' ', '_')
-                output_name = f"{base_name}_aug_{file_idx:02d}_{var_idx:03d}.wav"
-                output_path = output_folder / output_name
-                
-                # Save augmented audio
-                sf.write(output_path, augmented_audio, self.sample_rate)
-                total_created += 1
-                
-                # Log applied augmentations for first variation
-                if var_idx == 0 and verbose:
-                    print(f"      Example augmentations: {', '.join(applied_augs)}")
+            for output_file, source_sha, output_config in expected:
+                rel_output = output_file.relative_to(self.output_path).as_posix()
+                record = records.get(rel_output)
+                if record is None:
+                    missing.append(rel_output)
+                elif not self._is_complete(record, output_file, source_sha, output_config):
+                    invalid.append(rel_output)
+                else:
+                    merged.append(record)
+        
+        tmp_path = self.output_path / (MANIFEST_FILE + '.tmp')
+        with open(tmp_path, 'w') as f:
+            for record in merged:
+                f.write(json.dumps(record) + '\n')
+        os.replace(tmp_path, self.output_path / MANIFEST_FILE)
         
         if verbose:
-            print(f"   ✅ Created {total_created} total samples for {note_name}")
+            print(f"📋 Merged {len(merged)} complete outputs into {self.output_path / MANIFEST_FILE}")
+            for label, outputs in (('missing', missing), ('stale or corrupted', invalid)):
+                if outputs:
+                    print(f"⚠️  {len(outputs)} outputs {label}, e.g.:")
+                    for rel_output in outputs[:5]:
+                        print(f"     {rel_output}")
         
-        return total_created
+        return {'complete': len(merged), 'missing': missing, 'invalid': invalid}
     
     def augment_full_dataset(self, verbose=True):
         """Process the entire dataset"""
@@ -433,23 +1111,34 @@ class TalkingDrumAugmentationSystem:
             print(f"📁 Found {len(note_folders)} note folders: {', '.join(note_folders)}")
             print(f"🎯 Target samples per note: {self.target_samples_per_note}")
             print(f"📤 Output directory: {self.output_path}")
+            print(f"⚙️  Workers: {self.workers}, seed: {self.seed}")
         
         total_samples_created = 0
         processing_summary = {}
         
-        # Process each note folder with overall progress
-        for note in tqdm(note_folders, desc="Processing notes", unit="note"):
-            samples_created = self.process_note_folder(note, verbose=verbose)
-            if samples_created:
-                processing_summary[note] = samples_created
-                total_samples_created += samples_created
+        # A single pool, and in shard mode a single shard writer, is shared by every note folder
+        executor = self._create_executor() if self.workers > 1 else None
+        shard_writer = self.open_shard_writer() if self.output_format == 'shards' else None
+        try:
+            # Process each note folder with overall progress
+            for note in tqdm(note_folders, desc="Processing notes", unit="note"):
+                samples_created = self.process_note_folder(note, verbose=verbose, executor=executor,
+                                                           shard_writer=shard_writer)
+                if samples_created:
+                    processing_summary[note] = samples_created
+                    total_samples_created += samples_created
+        finally:
+            if executor is not None:
+                executor.shutdown()
+            if shard_writer is not None:
+                shard_writer.close()
         
         if verbose:
             print(f"\n📊 AUGMENTATION SUMMARY:")
             print("=" * 40)
             for note, count in processing_summary.items():
                 original_files = len([f for f in (self.dataset_path / note).glob('*') 
-                                    if f.suffix.lower() in ['.mp3', '.wav', '.m4a', '.aac']])
+                                    if f.suffix.lower() in AUDIO_EXTENSIONS])
                 augmented_files = count - original_files
                 print(f"   {note}: {original_files} original → {count} total ({augmented_files} augmented)")
             
@@ -459,6 +1148,21 @@ class TalkingDrumAugmentationSystem:
         return processing_summary
 
 
+# Process pool workers each hold one augmenter, set up once by the initializer
+_worker_augmenter = None
+
+
+def _init_worker(augmenter):
+    global _worker_augmenter
+    _worker_augmenter = augmenter
+
+
+def _generate_variation_task(task):
+    record = _worker_augmenter.generate_variation(*task)
+    profiler = _worker_augmenter.profiler
+    return record, profiler.drain() if profiler is not None else None
+
+
 def main():
     """Main function to run the augmentation from command line"""
     parser = argparse.ArgumentParser(description='Talking Drum Dataset Augmentation System')
@@ -480,30 +1184,165 @@ def main():
     parser.add_argument('--quiet', '-q', action='store_true',
                        help='Run in quiet mode with minimal output')
     
+    parser.add_argument('--workers', '-w', type=int, default=1,
+                       help='Worker processes for generating variations (default: 1)')
+    
+    parser.add_argument('--seed', '-s', type=int, default=42,
+                       help='Master random seed; output is identical for any worker count (default: 42)')
+    
+    parser.add_argument('--reverb-bank', type=int, default=0,
+                       help='Pre-render this many room impulse responses and pick from them '
+                            'instead of rendering one per variation (default: 0, off)')
+    
+    parser.add_argument('--reverb-bank-file', type=str, default=None,
+                       help='.npz reverb bank to load; saved there after building if it does not exist')
+    
+    parser.add_argument('--noise-bank', type=float, default=0,
+                       help='Pre-render this many seconds of each noise type and slice variations '
+                            'from it instead of synthesizing noise per variation (default: 0, off)')
+    
+    parser.add_argument('--noise-bank-file', type=str, default=None,
+                       help='.npz noise bank to load; saved there after building if it does not exist')
+    
+    parser.add_argument('--pitch-shift-method', choices=PITCH_SHIFT_METHODS, default='phase_vocoder',
+                       help='Pitch shift implementation; resample is much faster (default: phase_vocoder)')
+    
+    parser.add_argument('--output-format', choices=OUTPUT_FORMATS, default='files',
+                       help='One WAV per sample, or large shard files with an index (default: files)')
+    
+    parser.add_argument('--shard-codec', choices=SHARD_CODECS, default='wav',
+                       help='Encoding of samples in shards; flac is lossless and about half the size '
+                            '(default: wav)')
+    
+    parser.add_argument('--shard-size', type=float, default=256,
+                       help='Start a new shard after this many MB (default: 256)')
+    
+    parser.add_argument('--decoded-cache', type=str, default=None,
+                       help='Folder caching originals decoded to 22050 Hz float32, so later runs '
+                            'skip MP3/M4A/AAC decoding (default: off)')
+    
+    parser.add_argument('--shard-index', type=int, default=0,
+                       help='Index of the machine shard this run produces (default: 0)')
+    
+    parser.add_argument('--num-shards', type=int, default=1,
+                       help='Split the work across this many machines; each writes its own manifest '
+                            '(default: 1)')
+    
+    parser.add_argument('--merge', action='store_true',
+                       help='Merge the machine shard manifests in the output folder into one and '
+                            'verify every output is present, instead of augmenting')
+    
+    parser.add_argument('--profile', action='store_true',
+                       help=f'Time each transform and I/O stage; prints a table and saves {PROFILE_FILE} '
+                            'in the output folder')
+    
+    parser.add_argument('--benchmark', action='store_true',
+                       help='Benchmark each transform on synthetic clips instead of augmenting')
+    
+    parser.add_argument('--benchmark-repeats', type=int, default=5,
+                       help='Runs of each transform per clip length in --benchmark (default: 5)')
+    
+    parser.add_argument('--budget', type=float, default=None,
+                       help='Time budget in seconds; plans variation counts and transforms to fit it '
+                            'using a measured cost model (default: off)')
+    
+    parser.add_argument('--budget-mode', choices=('wall', 'cpu'), default='wall',
+                       help='Budget elapsed time across all workers and machine shards, or CPU time '
+                            'summed over them (default: wall)')
+    
+    parser.add_argument('--cost-model', type=str, default=None,
+                       help='JSON cost model to plan --budget with; measured and saved here if missing')
+    
     args = parser.parse_args()
     
     # Initialize augmentation system
     augmenter = TalkingDrumAugmentationSystem(
         dataset_path=args.input,
         output_path=args.output,
-        target_samples_per_note=args.target
+        target_samples_per_note=args.target,
+        seed=args.seed,
+        workers=args.workers,
+        pitch_shift_method=args.pitch_shift_method,
+        output_format=args.output_format,
+        shard_codec=args.shard_codec,
+        shard_size_mb=args.shard_size,
+        decoded_cache=args.decoded_cache,
+        shard_index=args.shard_index,
+        num_shards=args.num_shards
     )
     
+    if args.reverb_bank_file and os.path.exists(args.reverb_bank_file):
+        augmenter.load_reverb_bank(args.reverb_bank_file)
+    elif args.reverb_bank > 0:
+        augmenter.build_reverb_bank(args.reverb_bank)
+        if args.reverb_bank_file:
+            augmenter.save_reverb_bank(args.reverb_bank_file)
+    
+    if args.noise_bank_file and os.path.exists(args.noise_bank_file):
+        augmenter.load_noise_bank(args.noise_bank_file)
+    elif args.noise_bank > 0:
+        augmenter.build_noise_bank(args.noise_bank)
+        if args.noise_bank_file:
+            augmenter.save_noise_bank(args.noise_bank_file)
+    
+    if args.benchmark:
+        print("⏱️  Benchmarking transforms on synthetic clips...")
+        results = benchmark_transforms(augmenter, repeats=args.benchmark_repeats)
+        print(format_benchmark(results))
+        return
+    
+    if args.profile:
+        augmenter.profiler = TransformProfiler()
+    
     # Check if input dataset exists
     if not os.path.exists(args.input):
         print(f"❌ Error: Dataset not found at {args.input}")
         print(f"   Please ensure the talking_drum_dataset folder exists")
         return
     
+    verbose = not args.quiet
+    
+    if args.budget is not None:
+        # Imported here: the scheduler module builds on this one
+        from augmentation_scheduler import BUDGET_REPORT_FILE, BudgetScheduler, CostModel
+        
+        if args.cost_model and os.path.exists(args.cost_model):
+            cost_model = CostModel.load(args.cost_model)
+        else:
+            if verbose:
+                print("⏱️  Measuring transform costs for the budget...")
+            cost_model = CostModel.measure(augmenter)
+            if args.cost_model:
+                cost_model.save(args.cost_model)
+        augmenter.scheduler = BudgetScheduler(augmenter, cost_model, args.budget, args.budget_mode)
+        augmenter.scheduler.plan()
+        # Measured per-transform cost is compared against the plan at the end. The cost model
+        # was measured untraced, so time alone; memory tracing (--profile) inflates the actuals
+        if augmenter.profiler is None:
+            augmenter.profiler = TransformProfiler(trace_memory=False)
+        if verbose:
+            print("🗓️  Budget plan:")
+            print(augmenter.scheduler.format_plan())
+            if augmenter.profiler.trace_memory:
+                print("⚠️  --profile traces memory, which slows the run: actual times will exceed the plan")
+    
     # Start processing
     start_time = time.time()
-    verbose = not args.quiet
+    
+    if args.merge:
+        summary = augmenter.merge_manifests(verbose=verbose)
+        if summary['missing'] or summary['invalid']:
+            raise SystemExit(1)
+        if verbose:
+            print(f"✅ All {summary['complete']} outputs present and verified")
+        return
     
     if verbose:
         print("🚀 Starting Talking Drum Dataset Augmentation")
         print(f"📁 Input: {args.input}")
         print(f"📤 Output: {args.output}")
         print(f"🎯 Target: {args.target} samples per note")
+        print(f"⚙️  Workers: {args.workers}, seed: {args.seed}")
         print("-" * 50)
     
     if args.note:
@@ -523,6 +1362,24 @@ def main():
             print(f"⏱️  Total time: {elapsed_time:.1f} seconds")
             print(f"📊 Processed {len(results)} note folders")
             print(f"🎯 Dataset ready for AI training!")
+    
+    if augmenter.scheduler is not None:
+        report = augmenter.scheduler.report(augmenter.profiler, time.time() - start_time)
+        report_path = augmenter.output_path / BUDGET_REPORT_FILE
+        with open(report_path, 'w') as f:
+            json.dump(report, f, indent=2)
+        if verbose:
+            print(f"\n🗓️  Planned vs actual cost:")
+            print(augmenter.scheduler.format_report(report))
+            print(f"   Saved to {report_path}")
+    
+    if augmenter.profiler is not None:
+        profile_path = augmenter.output_path / PROFILE_FILE
+        augmenter.profiler.save(profile_path)
+        if verbose:
+            print(f"\n⏱️  Time per stage (summed over workers):")
+            print(augmenter.profiler.format_table())
+            print(f"   Saved to {profile_path}")
 
 
 if __name__ == "__main__":
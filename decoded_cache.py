@@ -0,0 +1,78 @@
+"""
+Decoded Audio Cache
+===================
+Persistent cache of original recordings decoded to float32 mono at a fixed
+sample rate, so MP3/M4A/AAC files are decoded and resampled once instead of
+on every augmentation, featurization or training run.
+
+Each source is stored as ``<sha256>_<sr>.npy`` in the cache folder, keyed by
+the file's content hash, and opened memory-mapped:
+
+    cache = DecodedAudioCache('decoded_cache')
+    audio = cache.load('talking_drum_dataset/Do/Do_amp.mp3')  # decodes once
+
+A changed file gets a new hash and is decoded again. Entries are written
+under a temporary name and renamed into place, so concurrent workers can
+share one cache folder.
+"""
+
+import hashlib
+import os
+from pathlib import Path
+
+import numpy as np
+import librosa
+
+from feature_extraction import SAMPLE_RATE
+
+
+def file_sha256(path, block_size=1 << 20):
+    """SHA-256 of a file's contents"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class DecodedAudioCache:
+    """Content-addressed store of decoded originals"""
+
+    def __init__(self, cache_dir, sr=SAMPLE_RATE):
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.sr = sr
+        self._hashes = {}  # (path, size, mtime) -> sha256, so a file is hashed once per process
+
+    def source_sha256(self, path):
+        stat = os.stat(path)
+        key = (str(path), stat.st_size, stat.st_mtime_ns)
+        if key not in self._hashes:
+            self._hashes[key] = file_sha256(path)
+        return self._hashes[key]
+
+    def entry_path(self, sha):
+        return self.cache_dir / f"{sha}_{self.sr}.npy"
+
+    def load(self, path, sha=None):
+        """
+        Decoded audio for a source file, decoding and caching it on a miss
+
+        Returns:
+            Read-only float32 array (memory-mapped on a hit)
+        """
+        sha = sha or self.source_sha256(path)
+        entry = self.entry_path(sha)
+        try:
+            return np.load(entry, mmap_mode='r')
+        except (OSError, ValueError):
+            pass  # Missing or unreadable entry; decode below
+
+        audio, _ = librosa.load(path, sr=self.sr)
+        if audio.size == 0:
+            return audio  # Empty arrays cannot be memory-mapped; nothing worth caching
+        tmp_path = entry.with_name(f"{entry.stem}.{os.getpid()}.tmp")
+        with open(tmp_path, 'wb') as f:
+            np.save(f, audio.astype(np.float32))
+        os.replace(tmp_path, entry)
+        return np.load(entry, mmap_mode='r')
@@ -12,32 +12,11 @@ import pickle
 import os
 from sklearn.preprocessing import StandardScaler, LabelEncoder
 
+from model_bundle import BUNDLE_FILE, convert_artifacts
+
 # Create model directory
 os.makedirs('model', exist_ok=True)
 
-# Model Architecture (must match training)
-class CNNModel(nn.Module):
-    """Convolutional Neural Network for audio classification"""
-    def __init__(self, input_size=47, num_classes=7):
-        super(CNNModel, self).__init__()
-        self.features = nn.Sequential(
-            nn.Linear(input_size, 256),
-            nn.ReLU(),
-            nn.Dropout(0.3),
-            nn.Linear(256, 128),
-            nn.ReLU(),
-            nn.Dropout(0.3),
-            nn.Linear(128, 64),
-            nn.ReLU(),
-            nn.Dropout(0.2),
-        )
-        self.classifier = nn.Linear(64, num_classes)
-        
-    def forward(self, x):
-        x = self.features(x)
-        x = self.classifier(x)
-        return x
-
 def export_model(model, scaler, label_encoder):
     """
     Export the trained model, scaler, and label encoder
@@ -75,12 +54,17 @@ def export_model(model, scaler, label_encoder):
             pickle.dump(model_info, f)
         print("✅ Model info saved to model/model_info.pkl")
         
+        # Rebuild the bundle, which the backend prefers, so it does not serve the previous weights
+        convert_artifacts('model')
+        print(f"✅ Bundle saved to model/{BUNDLE_FILE}")
+        
         print("\n🎉 All model files exported successfully!")
         print("📁 Files saved in 'model/' directory:")
         print("   - best_model.pth (model weights)")
         print("   - scaler.pkl (feature scaler)")
         print("   - label_encoder.pkl (label encoder)")
         print("   - model_info.pkl (model metadata)")
+        print(f"   - {BUNDLE_FILE} (all of the above in one file, for the backend)")
         
         return True
         
@@ -0,0 +1,208 @@
+"""
+Talking Drum Feature Extraction
+===============================
+The 47-feature extractor used for training, plus a batched variant that
+featurizes many clips at once with vectorized array operations.
+
+Every clip is padded or trimmed to 5 seconds at 22050 Hz before featurization,
+so a batch of clips is a dense [N, 110250] array. ``extract_features_batch``
+computes a single STFT per chunk of clips and derives all spectral, MFCC,
+chroma and onset features from it, matching ``extract_features`` row by row.
+"""
+
+import numpy as np
+import librosa
+
+# Bump whenever a change here alters feature values, so cached features are recomputed
+FEATURE_EXTRACTOR_VERSION = '1'
+
+SAMPLE_RATE = 22050
+CLIP_SECONDS = 5
+N_FFT = 2048
+HOP_LENGTH = 512
+N_MFCC = 13
+N_CHROMA = 12
+
+FEATURE_NAMES = (
+    ['rms', 'zcr',
+     'spectral_centroid_mean', 'spectral_centroid_std',
+     'spectral_rolloff_mean', 'spectral_rolloff_std',
+     'spectral_bandwidth_mean', 'spectral_bandwidth_std']
+    + [f'mfcc_{i}_{stat}' for i in range(N_MFCC) for stat in ('mean', 'std')]
+    + [f'chroma_{i}_mean' for i in range(N_CHROMA)]
+    + ['onset_rate']
+)
+NUM_FEATURES = len(FEATURE_NAMES)  # 47
+
+
+def pad_or_trim(audio, sr=SAMPLE_RATE):
+    """Pad or trim audio to the fixed 5 second clip length"""
+    max_len = int(sr * CLIP_SECONDS)
+    if len(audio) > max_len:
+        return audio[:max_len]
+    return np.pad(audio, (0, max_len - len(audio)))
+
+
+# Feature extraction (same as training)
+def extract_features(audio, sr=SAMPLE_RATE):
+    """Extract 47 audio features from audio signal"""
+    features = {}
+
+    try:
+        # Ensure audio is not empty
+        if len(audio) == 0:
+            return None
+
+        # Pad or trim audio to consistent length
+        audio = pad_or_trim(audio, sr)
+
+        # Time domain features
+        features['rms'] = np.sqrt(np.mean(audio**2))
+        features['zcr'] = np.mean(librosa.feature.zero_crossing_rate(audio)[0])
+
+        # Spectral features
+        spectral_centroids = librosa.feature.spectral_centroid(y=audio, sr=sr)[0]
+        features['spectral_centroid_mean'] = np.mean(spectral_centroids)
+        features['spectral_centroid_std'] = np.std(spectral_centroids)
+
+        spectral_rolloff = librosa.feature.spectral_rolloff(y=audio, sr=sr)[0]
+        features['spectral_rolloff_mean'] = np.mean(spectral_rolloff)
+        features['spectral_rolloff_std'] = np.std(spectral_rolloff)
+
+        spectral_bandwidth = librosa.feature.spectral_bandwidth(y=audio, sr=sr)[0]
+        features['spectral_bandwidth_mean'] = np.mean(spectral_bandwidth)
+        features['spectral_bandwidth_std'] = np.std(spectral_bandwidth)
+
+        # MFCCs (most important for audio classification)
+        mfccs = librosa.feature.mfcc(y=audio, sr=sr, n_mfcc=N_MFCC)
+        for i in range(N_MFCC):
+            features[f'mfcc_{i}_mean'] = np.mean(mfccs[i])
+            features[f'mfcc_{i}_std'] = np.std(mfccs[i])
+
+        # Chroma features
+        chroma = librosa.feature.chroma_stft(y=audio, sr=sr)
+        for i in range(N_CHROMA):
+            features[f'chroma_{i}_mean'] = np.mean(chroma[i])
+
+        # Temporal features
+        onset_frames = librosa.onset.onset_detect(y=audio, sr=sr)
+        features['onset_rate'] = len(onset_frames) / (len(audio) / sr)
+
+        return list(features.values())
+
+    except Exception as e:
+        print(f"Error extracting features: {e}")
+        return None
+
+
+def _power_to_db_rows(S, amin=1e-10, top_db=80.0):
+    """power_to_db with the top_db floor applied per clip instead of per batch"""
+    log_spec = 10.0 * np.log10(np.maximum(amin, S))
+    floor = log_spec.max(axis=(-2, -1), keepdims=True) - top_db
+    return np.maximum(log_spec, floor)
+
+
+def _estimate_tuning_rows(power, sr):
+    """Per-clip chroma tuning estimate (librosa pools tuning across channels)"""
+    pitches, mags = librosa.piptrack(S=power, sr=sr, n_fft=N_FFT)
+    tunings = np.zeros(len(power))
+    for i in range(len(power)):
+        pitch_mask = pitches[i] > 0
+        threshold = np.median(mags[i][pitch_mask]) if pitch_mask.any() else 0.0
+        tunings[i] = librosa.pitch_tuning(
+            pitches[i][(mags[i] >= threshold) & pitch_mask],
+            bins_per_octave=N_CHROMA,
+        )
+    return tunings
+
+
+def chroma_rows(power, sr):
+    """
+    chroma_stft over a batch of power spectrograms [..., freq, frames], with
+    one filter bank per distinct tuning; each frame is peak-normalized, as chroma_stft does
+    """
+    tunings = _estimate_tuning_rows(power, sr)
+    chroma = np.empty(power.shape[:1] + (N_CHROMA,) + power.shape[2:], dtype=power.dtype)
+    for tuning in np.unique(tunings):
+        rows = tunings == tuning
+        chromafb = librosa.filters.chroma(sr=sr, n_fft=N_FFT, tuning=tuning, n_chroma=N_CHROMA)
+        raw_chroma = np.einsum('cf,...ft->...ct', chromafb, power[rows], optimize=True)
+        chroma[rows] = librosa.util.normalize(raw_chroma, norm=np.inf, axis=-2)
+    return chroma
+
+
+def _extract_chunk(batch, sr):
+    """Featurize a dense [n, max_len] chunk of padded clips"""
+    n = len(batch)
+    out = np.empty((n, NUM_FEATURES), dtype=np.float64)
+
+    # Time domain features
+    out[:, 0] = np.sqrt(np.mean(batch**2, axis=-1))
+    out[:, 1] = np.mean(librosa.feature.zero_crossing_rate(batch)[:, 0], axis=-1)
+
+    # One STFT shared by every spectral feature
+    magnitude = np.abs(librosa.stft(batch, n_fft=N_FFT, hop_length=HOP_LENGTH))
+    power = magnitude**2
+
+    # Spectral features
+    centroid = librosa.feature.spectral_centroid(S=magnitude, sr=sr, n_fft=N_FFT)[:, 0]
+    rolloff = librosa.feature.spectral_rolloff(S=magnitude, sr=sr, n_fft=N_FFT)[:, 0]
+    bandwidth = librosa.feature.spectral_bandwidth(S=magnitude, sr=sr, n_fft=N_FFT)[:, 0]
+    for col, values in zip((2, 4, 6), (centroid, rolloff, bandwidth)):
+        out[:, col] = np.mean(values, axis=-1)
+        out[:, col + 1] = np.std(values, axis=-1)
+
+    # MFCCs and onsets share the mel spectrogram in dB
+    mel_db = _power_to_db_rows(librosa.feature.melspectrogram(S=power, sr=sr, n_fft=N_FFT))
+    mfccs = librosa.feature.mfcc(S=mel_db, n_mfcc=N_MFCC)
+    out[:, 8:8 + 2 * N_MFCC:2] = np.mean(mfccs, axis=-1)
+    out[:, 9:9 + 2 * N_MFCC:2] = np.std(mfccs, axis=-1)
+
+    # Chroma features
+    chroma = chroma_rows(power, sr)
+    out[:, 34:34 + N_CHROMA] = np.mean(chroma, axis=-1)
+
+    # Temporal features
+    onset_env = librosa.onset.onset_strength(S=mel_db, sr=sr, hop_length=HOP_LENGTH)
+    onsets = librosa.onset.onset_detect(onset_envelope=onset_env, sr=sr,
+                                        hop_length=HOP_LENGTH, sparse=False)
+    out[:, 46] = onsets.sum(axis=-1) / (batch.shape[-1] / sr)
+
+    return out
+
+
+def extract_features_batch(audios, sr=SAMPLE_RATE, chunk_size=32):
+    """
+    Extract the 47 features for many clips at once
+
+    Args:
+        audios: Dense [N, samples] array or a list of 1-D signals of any length
+        sr: Sample rate of the clips
+        chunk_size: Clips featurized per vectorized pass; bounds peak memory
+            (roughly 10 MB per clip for the STFT and derived spectrograms)
+
+    Returns:
+        [N, 47] float64 matrix in ``FEATURE_NAMES`` order, matching
+        ``extract_features`` row by row. Rows for empty clips are NaN.
+    """
+    if chunk_size < 1:
+        raise ValueError(f"chunk_size must be positive, got {chunk_size}")
+
+    max_len = int(sr * CLIP_SECONDS)
+    dtype = np.result_type(np.float32, *[np.asarray(a).dtype for a in audios])
+    features = np.full((len(audios), NUM_FEATURES), np.nan)
+
+    for start in range(0, len(audios), chunk_size):
+        chunk = audios[start:start + chunk_size]
+        rows = [i for i, audio in enumerate(chunk) if len(audio) > 0]
+        if not rows:
+            continue
+
+        batch = np.zeros((len(rows), max_len), dtype=dtype)
+        for j, i in enumerate(rows):
+            clip = np.asarray(chunk[i])[:max_len]
+            batch[j, :len(clip)] = clip
+
+        features[start + np.asarray(rows)] = _extract_chunk(batch, sr)
+
+    return features
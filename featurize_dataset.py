@@ -0,0 +1,265 @@
+#!/usr/bin/env python3
+"""
+Talking Drum Dataset Featurizer
+===============================
+Extracts the 47 training features for every clip in a dataset laid out as
+``<dataset>/<note>/<file>`` (the layout read and written by
+``TalkingDrumAugmentationSystem``) using a process pool.
+
+Features are stored in a memory-mapped matrix next to a JSON index:
+
+    <output>/features-<generation>.npy   [num_files, 47] float64, open with mmap_mode='r'
+    <output>/index.json                  one entry per row: path, note, sha256,
+                                         and the name of its features file
+
+Each run writes a features file under a new name and then replaces index.json,
+so the index only ever names a matrix that was completely written with it.
+
+Rows are keyed by file content hash and ``FEATURE_EXTRACTOR_VERSION``, so
+later runs only featurize files that are new or have changed.
+"""
+
+import argparse
+import json
+import os
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+import numpy as np
+import librosa
+from tqdm import tqdm
+
+from decoded_cache import DecodedAudioCache, file_sha256
+from feature_extraction import (
+    FEATURE_EXTRACTOR_VERSION, FEATURE_NAMES, NUM_FEATURES, SAMPLE_RATE,
+    extract_features_batch,
+)
+
+AUDIO_EXTENSIONS = ['.mp3', '.wav', '.m4a', '.aac']
+FEATURES_FILE = 'features.npy'  # Stores written before the index named its features file
+INDEX_FILE = 'index.json'
+
+
+def list_dataset_files(dataset_path):
+    """Return sorted (note, path) pairs for every audio file in the dataset"""
+    dataset_path = Path(dataset_path)
+    files = []
+    for note_dir in sorted(d for d in dataset_path.iterdir() if d.is_dir()):
+        for path in sorted(note_dir.iterdir()):
+            if path.is_file() and path.suffix.lower() in AUDIO_EXTENSIONS:
+                files.append((note_dir.name, path))
+    return files
+
+
+def _featurize_files(files, sr, chunk_size, cache_dir=None):
+    """Worker: decode a group of (sha256, path) files and featurize them in one batch"""
+    cache = DecodedAudioCache(cache_dir, sr) if cache_dir is not None else None
+    audios = []
+    for sha, path in files:
+        try:
+            if cache is not None:
+                audio = cache.load(path, sha)
+            else:
+                audio, _ = librosa.load(path, sr=sr)
+        except Exception as e:
+            print(f"⚠️  Error loading {path}: {e}")
+            audio = np.zeros(0, dtype=np.float32)
+        audios.append(audio)
+    return extract_features_batch(audios, sr=sr, chunk_size=chunk_size)
+
+
+def features_path_for(store_path, index):
+    """Path of the features matrix that ``index`` was written with"""
+    return Path(store_path) / index.get('features_file', FEATURES_FILE)
+
+
+def load_feature_store(store_path):
+    """
+    Open a feature store written by ``featurize_dataset``
+
+    Returns:
+        (features, index) where features is a read-only memory-mapped
+        [N, 47] array and index is the parsed index.json
+    """
+    store_path = Path(store_path)
+    with open(store_path / INDEX_FILE) as f:
+        index = json.load(f)
+    features = np.load(features_path_for(store_path, index), mmap_mode='r')
+    if features.shape[0] != len(index['entries']):
+        raise ValueError(f"{store_path} has {features.shape[0]} feature rows "
+                         f"but {len(index['entries'])} index entries")
+    return features, index
+
+
+def _load_reusable_rows(store_path, sr):
+    """Map sha256 -> row of an existing store, if it was built compatibly"""
+    try:
+        features, index = load_feature_store(store_path)
+    except (OSError, ValueError):
+        return None, {}
+
+    if (index.get('extractor_version') != FEATURE_EXTRACTOR_VERSION
+            or index.get('sample_rate') != sr
+            or features.shape[1:] != (NUM_FEATURES,)):
+        return None, {}
+
+    return features, {entry['sha256']: row for row, entry in enumerate(index['entries'])}
+
+
+def featurize_dataset(dataset_path, store_path, workers=None, files_per_task=16,
+                      chunk_size=16, sr=SAMPLE_RATE, verbose=True, decoded_cache=None):
+    """
+    Featurize a dataset into a memory-mapped feature store, reusing rows
+    from a previous run whose file hash and extractor version still match.
+    With ``decoded_cache`` (a folder), files are decoded through a
+    DecodedAudioCache shared with the augmenter.
+
+    Returns:
+        Dict with counts of reused, computed and failed files
+    """
+    dataset_path = Path(dataset_path)
+    store_path = Path(store_path)
+    store_path.mkdir(parents=True, exist_ok=True)
+
+    files = list_dataset_files(dataset_path)
+    hashes = [file_sha256(path) for _, path in files]
+    old_features, old_rows = _load_reusable_rows(store_path, sr)
+
+    # Identical content featurizes identically, so each new hash is computed once
+    pending = {}
+    for (_, path), sha in zip(files, hashes):
+        if sha not in old_rows and sha not in pending:
+            pending[sha] = path
+
+    if verbose:
+        print(f"📁 Found {len(files)} audio files in {dataset_path}")
+        print(f"♻️  Reusing {len(files) - len(pending)} cached rows, "
+              f"featurizing {len(pending)} new or changed files")
+
+    computed = {}
+    if pending:
+        items = list(pending.items())
+        tasks = [items[i:i + files_per_task] for i in range(0, len(items), files_per_task)]
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = {
+                executor.submit(_featurize_files, [(sha, str(p)) for sha, p in task], sr, chunk_size,
+                                decoded_cache): task
+                for task in tasks
+            }
+            for future in tqdm(as_completed(futures), total=len(futures),
+                               desc="Featurizing", unit="task", disable=not verbose):
+                task = futures[future]
+                for (sha, _), row in zip(task, future.result()):
+                    computed[sha] = row
+
+    # Write the new store beside the old one, then swap it in
+    entries = []
+    rows = []
+    failed = 0
+    for (note, path), sha in zip(files, hashes):
+        if sha in old_rows:
+            row = old_features[old_rows[sha]]
+        else:
+            row = computed[sha]
+        if np.isnan(row).any():
+            failed += 1
+            continue
+        rows.append(row)
+        entries.append({
+            'path': str(path.relative_to(dataset_path)),
+            'note': note,
+            'sha256': sha,
+        })
+
+    features_file = f"features-{uuid.uuid4().hex[:12]}.npy"
+    tmp_features = store_path / (features_file + '.tmp')
+    matrix = np.lib.format.open_memmap(tmp_features, mode='w+', dtype=np.float64,
+                                       shape=(len(rows), NUM_FEATURES))
+    for i, row in enumerate(rows):
+        matrix[i] = row
+    matrix.flush()
+    del matrix, rows, old_features
+
+    index = {
+        'extractor_version': FEATURE_EXTRACTOR_VERSION,
+        'sample_rate': sr,
+        'feature_names': FEATURE_NAMES,
+        'dataset_path': str(dataset_path),
+        'features_file': features_file,
+        'entries': entries,
+    }
+    tmp_index = store_path / (INDEX_FILE + '.tmp')
+    with open(tmp_index, 'w') as f:
+        json.dump(index, f, indent=1)
+
+    # Replacing the index is the commit: until then it still names the old, intact matrix
+    os.replace(tmp_features, store_path / features_file)
+    os.replace(tmp_index, store_path / INDEX_FILE)
+    for old in store_path.glob('features*.npy'):
+        if old.name != features_file:
+            old.unlink()  # Readers that still have it memory-mapped keep their mapping
+
+    summary = {
+        'total': len(entries),
+        'reused': len(files) - len(pending),
+        'computed': len(pending),
+        'failed': failed,
+    }
+    if verbose:
+        print(f"✅ Feature store written to {store_path} ({len(entries)} rows)")
+        if failed:
+            print(f"⚠️  {failed} files could not be featurized and were left out")
+    return summary
+
+
+def main():
+    """Main function to run the featurizer from command line"""
+    parser = argparse.ArgumentParser(description='Talking Drum Dataset Featurizer')
+
+    parser.add_argument('--input', '-i', type=str,
+                       default='/home/user/Documents/yomi_talking_drum/augmented_talking_drum_dataset',
+                       help='Path to dataset folder (one subfolder per note)')
+
+    parser.add_argument('--output', '-o', type=str,
+                       default='/home/user/Documents/yomi_talking_drum/feature_store',
+                       help='Path to feature store folder')
+
+    parser.add_argument('--workers', '-w', type=int, default=None,
+                       help='Worker processes (default: number of CPUs)')
+
+    parser.add_argument('--files-per-task', type=int, default=16,
+                       help='Files decoded and featurized per worker task (default: 16)')
+
+    parser.add_argument('--chunk-size', type=int, default=16,
+                       help='Clips per vectorized feature pass (default: 16)')
+
+    parser.add_argument('--decoded-cache', type=str, default=None,
+                       help='Folder caching originals decoded to float32, shared with '
+                            'dataset_augmentation.py --decoded-cache (default: off)')
+
+    parser.add_argument('--quiet', '-q', action='store_true',
+                       help='Run in quiet mode with minimal output')
+
+    args = parser.parse_args()
+
+    if not os.path.exists(args.input):
+        print(f"❌ Error: Dataset not found at {args.input}")
+        return
+
+    start_time = time.time()
+    summary = featurize_dataset(args.input, args.output, workers=args.workers,
+                                files_per_task=args.files_per_task,
+                                chunk_size=args.chunk_size, verbose=not args.quiet,
+                                decoded_cache=args.decoded_cache)
+
+    if not args.quiet:
+        elapsed_time = time.time() - start_time
+        print(f"⏱️  Total time: {elapsed_time:.1f} seconds")
+        print(f"📊 {summary['computed']} featurized, {summary['reused']} reused, "
+              f"{summary['failed']} failed")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+"""
+Talking Drum Model Bundle
+=========================
+A single, pickle-free file holding everything the backend needs to serve a
+model: the weights, the scaler's mean and scale, the class list, and a header
+naming the architecture and its constructor arguments.
+
+The file uses the safetensors layout, so it can also be read with the
+``safetensors`` library, but only numpy and torch are needed here:
+
+    8 bytes     little-endian length of the JSON header
+    header      {name: {dtype, shape, data_offsets}, "__metadata__": {"bundle": <JSON>}}
+    data        raw little-endian tensors, back to back
+
+Loading memory-maps the data copy-on-write and wraps each tensor around its
+slice of the mapping, so nothing is copied or unpickled. Inference never
+writes to the weights, so every worker process that loads the same file
+shares the same physical pages.
+
+    python model_bundle.py --model-dir model   # convert best_model.pth + scaler.pkl + label_encoder.pkl
+"""
+
+import argparse
+import json
+import os
+import struct
+
+import numpy as np
+import torch
+
+BUNDLE_FILE = 'model_bundle.safetensors'
+BUNDLE_FORMAT_VERSION = 1
+
+SCALER_MEAN = 'scaler.mean'
+SCALER_SCALE = 'scaler.scale'
+WEIGHT_PREFIX = 'model.'
+
+DTYPES = {
+    'F32': np.float32,
+    'F64': np.float64,
+    'I64': np.int64,
+}
+DTYPE_NAMES = {np.dtype(dtype): name for name, dtype in DTYPES.items()}
+
+
+def bundle_file_for(model_file):
+    """Bundle file of a weights file: model_bundle.safetensors for best_model.pth, <stem>.safetensors otherwise"""
+    return BUNDLE_FILE if model_file == 'best_model.pth' else f"{os.path.splitext(model_file)[0]}.safetensors"
+
+
+def save_bundle(path, state_dict, architecture, hyperparameters, scaler_mean, scaler_scale, classes, info=None):
+    """
+    Write a bundle to ``path`` (under a temporary name, then renamed into place)
+
+    Args:
+        state_dict: Model weights
+        architecture: Architecture name ('cnn' or 'transformer')
+        hyperparameters: Constructor arguments of the architecture
+        scaler_mean, scaler_scale: StandardScaler parameters
+        classes: Class names in output order
+        info: Optional extra metadata (training metrics and the like)
+    """
+    arrays = {WEIGHT_PREFIX + name: tensor.detach().cpu().numpy() for name, tensor in state_dict.items()}
+    arrays[SCALER_MEAN] = np.asarray(scaler_mean, dtype=np.float64)
+    arrays[SCALER_SCALE] = np.asarray(scaler_scale, dtype=np.float64)
+
+    header = {}
+    offset = 0
+    for name, array in arrays.items():
+        header[name] = {
+            'dtype': DTYPE_NAMES[array.dtype],
+            'shape': list(array.shape),
+            'data_offsets': [offset, offset + array.nbytes],
+        }
+        offset += array.nbytes
+    header['__metadata__'] = {'bundle': json.dumps({
+        'format_version': BUNDLE_FORMAT_VERSION,
+        'architecture': architecture,
+        'hyperparameters': hyperparameters,
+        'classes': list(classes),
+        'info': info or {},
+    })}
+
+    header_bytes = json.dumps(header, separators=(',', ':')).encode()
+    header_bytes += b' ' * (-len(header_bytes) % 8)  # Keep the data 8-byte aligned
+
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(struct.pack('<Q', len(header_bytes)))
+        f.write(header_bytes)
+        for array in arrays.values():
+            f.write(np.ascontiguousarray(array).astype(array.dtype.newbyteorder('<'), copy=False).tobytes())
+    os.replace(tmp_path, path)
+
+
+def load_bundle(path):
+    """
+    Open a bundle without copying its data
+
+    Returns:
+        (metadata dict, weights {name: tensor}, scaler mean, scaler scale),
+        where the tensors and arrays are views of a copy-on-write memory map
+    """
+    with open(path, 'rb') as f:
+        header_length = struct.unpack('<Q', f.read(8))[0]
+        header = json.loads(f.read(header_length))
+    metadata = json.loads(header.pop('__metadata__')['bundle'])
+    if metadata['format_version'] > BUNDLE_FORMAT_VERSION:
+        raise ValueError(f"{path} has bundle format {metadata['format_version']}; "
+                         f"this code reads up to {BUNDLE_FORMAT_VERSION}")
+
+    data = np.memmap(path, dtype=np.uint8, mode='c', offset=8 + header_length)
+    arrays = {}
+    for name, entry in header.items():
+        start, end = entry['data_offsets']
+        arrays[name] = data[start:end].view(DTYPES[entry['dtype']]).reshape(entry['shape'])
+
+    weights = {name[len(WEIGHT_PREFIX):]: torch.from_numpy(array)
+               for name, array in arrays.items() if name.startswith(WEIGHT_PREFIX)}
+    return metadata, weights, arrays[SCALER_MEAN], arrays[SCALER_SCALE]
+
+
+def convert_artifacts(model_dir, model_file='best_model.pth'):
+    """
+    Write the bundle for existing pickled artifacts in ``model_dir``. The
+    architecture is detected here, once, by which one the weights load into.
+    """
+    import pickle
+    from talking_drum_models import ARCHITECTURES
+
+    state_dict = torch.load(os.path.join(model_dir, model_file), map_location='cpu')
+    with open(os.path.join(model_dir, 'scaler.pkl'), 'rb') as f:
+        scaler = pickle.load(f)
+    with open(os.path.join(model_dir, 'label_encoder.pkl'), 'rb') as f:
+        classes = [str(c) for c in pickle.load(f).classes_]
+
+    hyperparameters = {'input_size': int(scaler.mean_.shape[0]), 'num_classes': len(classes)}
+    for architecture, model_class in ARCHITECTURES.items():
+        try:
+            model_class(**hyperparameters).load_state_dict(state_dict)
+            break
+        except RuntimeError:
+            continue
+    else:
+        raise ValueError(f"{model_file} does not match any known architecture")
+
+    info = {}
+    info_path = os.path.join(model_dir, 'model_info.json')
+    if model_file == 'best_model.pth' and os.path.exists(info_path):
+        with open(info_path) as f:
+            info = json.load(f)
+
+    path = os.path.join(model_dir, bundle_file_for(model_file))
+    save_bundle(path, state_dict, architecture, hyperparameters, scaler.mean_, scaler.scale_, classes, info)
+    return path, architecture
+
+
+def main():
+    """Main function to convert pickled artifacts from command line"""
+    parser = argparse.ArgumentParser(description='Talking Drum Model Bundle converter')
+
+    parser.add_argument('--model-dir', type=str, default='model',
+                       help='Folder with the weights, scaler.pkl and label_encoder.pkl (default: model)')
+
+    parser.add_argument('--model-file', type=str, default='best_model.pth',
+                       help='Weights file to convert (default: best_model.pth)')
+
+    args = parser.parse_args()
+
+    path, architecture = convert_artifacts(args.model_dir, args.model_file)
+    print(f"✅ Bundle written to {path} ({architecture})")
+
+
+if __name__ == "__main__":
+    main()
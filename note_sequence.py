@@ -0,0 +1,407 @@
+"""
+Note Sequence Decoding
+======================
+Turns continuous talking drum playing into a sequence of notes, instead of
+one label per clip.
+
+The audio is analysed once on the STFT frame grid of the training features
+(2048-sample frames every 512 samples). Short sliding windows, 1 s every
+0.25 s by default, take their 47 features from the frames they cover. Each
+window is treated as a training clip padded with silence to 5 seconds, and
+the silent padding is accounted for analytically, so overlapping windows
+never transform a frame twice. All windows that are ready go through the
+model as one batch. A Viterbi decoder over the seven notes then smooths the
+window posteriors into notes that last at least a minimum duration.
+
+Audio can be pushed in chunks as it arrives. A label is emitted as soon as
+every surviving Viterbi path agrees on it:
+
+    decoder = NoteSequenceDecoder(model, scaler, min_note_seconds=0.5)
+    for chunk in chunks:                        # 22050 Hz mono
+        for note, start, end in decoder.push(chunk):
+            ...
+    remaining = decoder.finish()
+
+Work is linear in the audio length. Each second of audio costs a fixed number
+of frames, each frame appears in a fixed number of windows, and each window
+costs one Viterbi step over a fixed number of states.
+"""
+
+import numpy as np
+import librosa
+import scipy.fft
+import torch
+
+from feature_extraction import (CLIP_SECONDS, HOP_LENGTH, N_CHROMA, N_FFT, N_MFCC, NUM_FEATURES,
+                                SAMPLE_RATE, chroma_rows)
+
+NOTES = ['Do', 'Fa', 'La', 'Mi', 'Re', 'So', 'Ti']
+
+# Frames of a padded 5 second training clip (librosa centers its frames)
+CLIP_FRAMES = 1 + SAMPLE_RATE * CLIP_SECONDS // HOP_LENGTH
+N_MELS = 128
+TOP_DB = 80.0
+MIN_DB = -100.0  # power_to_db of silence (amin = 1e-10)
+
+# Frame offset of onset_strength's envelope (lag 1 plus its centering shift)
+ONSET_SHIFT = 1 + N_FFT // (2 * HOP_LENGTH)
+
+# Windows featurized per vectorized pass; bounds peak memory (about 0.5 MB per window)
+WINDOW_CHUNK = 64
+
+# Floor on window posteriors so one confident window cannot veto a path outright
+MIN_POSTERIOR = 1e-6
+
+
+class WindowFeaturizer:
+    """
+    Incremental 47-feature extraction for sliding windows over a stream,
+    sharing every STFT frame that lies inside more than one window
+    """
+
+    def __init__(self, sr=SAMPLE_RATE, window_seconds=1.0, hop_seconds=0.25):
+        if sr != SAMPLE_RATE:
+            raise ValueError(f"Features are defined at {SAMPLE_RATE} Hz, got {sr}")
+        self.sr = sr
+        # Windows start and end on the frame grid
+        self.window_frames = int(round(window_seconds * sr / HOP_LENGTH))
+        self.hop_frames = max(1, int(round(hop_seconds * sr / HOP_LENGTH)))
+        if not 3 <= self.window_frames <= CLIP_FRAMES - 2:
+            raise ValueError(f"window_seconds must be between 0.07 s and the {CLIP_SECONDS} s clip length")
+
+        self._mel_basis = librosa.filters.mel(sr=sr, n_fft=N_FFT, n_mels=N_MELS)
+        self._dct = scipy.fft.dct(np.eye(N_MELS), type=2, norm='ortho', axis=0)[:N_MFCC]
+
+        self._pending = np.zeros(N_FFT // 2, dtype=np.float32)  # Stream frames are centered like librosa's
+        self._samples = np.zeros(0, dtype=np.float32)
+        self._sample_offset = 0  # Stream index of the first kept sample
+        self._frames = {}  # Per-frame arrays of the stream, time on the last axis
+        self._frame_offset = 0  # Stream index of the first kept frame
+        self.total_samples = 0
+        self.next_window = 0
+        self._window_limit = None  # Windows in the stream, once it has ended
+
+    @property
+    def window_samples(self):
+        return self.window_frames * HOP_LENGTH
+
+    @property
+    def hop_samples(self):
+        return self.hop_frames * HOP_LENGTH
+
+    def push(self, audio):
+        """Analyse new samples; returns the [windows, 47] features of windows now complete"""
+        audio = np.asarray(audio, dtype=np.float32)
+        self.total_samples += len(audio)
+        self._samples = np.concatenate([self._samples, audio])
+
+        buffer = np.concatenate([self._pending, audio])
+        if len(buffer) >= N_FFT:
+            num_frames = 1 + (len(buffer) - N_FFT) // HOP_LENGTH
+            self._analyse(buffer[:(num_frames - 1) * HOP_LENGTH + N_FFT])
+            buffer = buffer[num_frames * HOP_LENGTH:]
+        self._pending = buffer
+        return self._ready_windows()
+
+    def _frame_quantities(self, segment):
+        """Per-frame values the spectral features are built from, for frames of ``segment``"""
+        magnitude = np.abs(librosa.stft(segment, n_fft=N_FFT, hop_length=HOP_LENGTH, center=False))
+        power = magnitude ** 2
+        return {
+            'power': power,
+            'centroid': librosa.feature.spectral_centroid(S=magnitude, sr=self.sr, n_fft=N_FFT)[..., 0, :],
+            'rolloff': librosa.feature.spectral_rolloff(S=magnitude, sr=self.sr, n_fft=N_FFT)[..., 0, :],
+            'bandwidth': librosa.feature.spectral_bandwidth(S=magnitude, sr=self.sr, n_fft=N_FFT)[..., 0, :],
+            'mel_db': 10.0 * np.log10(np.maximum(1e-10, np.einsum('mf,...ft->...mt', self._mel_basis, power))),
+        }
+
+    def _analyse(self, segment):
+        for name, values in self._frame_quantities(segment).items():
+            stored = self._frames.get(name)
+            self._frames[name] = values if stored is None else np.concatenate([stored, values], axis=-1)
+
+    def complete_windows(self):
+        """Stream index one past the last window whose samples and shared frames are all in"""
+        stored = self._frames.get('power')
+        frames_in = self._frame_offset + (0 if stored is None else stored.shape[-1])
+        samples_in = (self._sample_offset + len(self._samples)) // HOP_LENGTH
+        last_start = min(samples_in - self.window_frames, frames_in - (self.window_frames - 1))
+        return max(0, last_start // self.hop_frames + 1)
+
+    def _ready_windows(self):
+        end = self.complete_windows()
+        if self._window_limit is not None:
+            end = min(end, self._window_limit)
+        if end <= self.next_window:
+            return np.empty((0, NUM_FEATURES))
+        starts = np.arange(self.next_window, end) * self.hop_frames
+        features = np.concatenate([self._window_features(starts[i:i + WINDOW_CHUNK])
+                                   for i in range(0, len(starts), WINDOW_CHUNK)])
+
+        # Samples and frames before the next window are no longer needed
+        self.next_window = end
+        next_frame = self.next_window * self.hop_frames
+        drop = next_frame - self._frame_offset
+        self._frames = {name: values[..., drop:] for name, values in self._frames.items()}
+        self._frame_offset = next_frame
+        self._samples = self._samples[next_frame * HOP_LENGTH - self._sample_offset:]
+        self._sample_offset = next_frame * HOP_LENGTH
+        return features
+
+    def _window_features(self, starts):
+        """Features of windows starting at the given stream frames, as clips padded with silence"""
+        n, w = len(starts), self.window_frames
+        audio = self._samples[(starts * HOP_LENGTH - self._sample_offset)[:, None] + np.arange(w * HOP_LENGTH)]
+        out = np.empty((n, NUM_FEATURES))
+
+        # The clip as librosa frames it: centered, zeros outside the window
+        clip = np.zeros((n, N_FFT // 2 + (w + 1) * HOP_LENGTH + N_FFT // 2), dtype=np.float32)
+        clip[:, N_FFT // 2:N_FFT // 2 + w * HOP_LENGTH] = audio
+
+        # Frames overlapping the window's edges (0, 1 and w - 1 .. w + 1) see that padding
+        # and are transformed per window; interior frames are the stream's own
+        edge_frames = np.array([0, 1, w - 1, w, w + 1])
+        edges = self._frame_quantities(clip[:, edge_frames[:, None] * HOP_LENGTH + np.arange(N_FFT)])
+        interior = (starts - self._frame_offset)[:, None] + np.arange(2, w - 1)
+
+        def clip_frames(name):
+            """[window, ..., frame] values of every frame that is not pure padding, in clip order"""
+            edge_values = np.moveaxis(edges[name][..., 0], 1, -1)  # One frame per edge segment
+            shared = np.moveaxis(self._frames[name][..., interior], -2, 0)
+            return np.concatenate([edge_values[..., :2], shared, edge_values[..., 2:]], axis=-1)
+
+        num_frames = w + 2  # Frames 0 .. w + 1 touch the window; the rest of the clip is silent
+        padding = CLIP_FRAMES - num_frames
+
+        def clip_stats(values):
+            """Mean and std over the clip, for features that are 0 on silent frames"""
+            mean = values.sum(axis=-1) / CLIP_FRAMES
+            var = (values ** 2).sum(axis=-1) / CLIP_FRAMES - mean ** 2
+            return mean, np.sqrt(np.maximum(var, 0.0))
+
+        # Time domain features (librosa pads zero-crossing frames by repeating the first sample)
+        out[:, 0] = np.sqrt(np.sum(audio.astype(np.float64) ** 2, axis=1) / (self.sr * CLIP_SECONDS))
+        zcr_clip = clip.copy()
+        zcr_clip[:, :N_FFT // 2] = audio[:, :1]
+        zcr = librosa.feature.zero_crossing_rate(zcr_clip, frame_length=N_FFT, hop_length=HOP_LENGTH,
+                                                 center=False)[:, 0]
+        out[:, 1] = zcr.sum(axis=-1) / CLIP_FRAMES
+
+        # Spectral features
+        for col, name in zip((2, 4, 6), ('centroid', 'rolloff', 'bandwidth')):
+            out[:, col], out[:, col + 1] = clip_stats(clip_frames(name))
+
+        # MFCCs: each clip's dB floor sits 80 dB below its own peak
+        mel_db = clip_frames('mel_db')  # [window, mel, frame]
+        floor = np.maximum(mel_db.max(axis=(1, 2)), MIN_DB) - TOP_DB
+        mel_db = np.maximum(mel_db, floor[:, None, None])
+        mfccs = np.einsum('cm,nmf->ncf', self._dct, mel_db, optimize=True)
+        silent = np.maximum(MIN_DB, floor)[:, None] * self._dct.sum(axis=1)  # MFCCs of a padding frame
+        mean = (mfccs.sum(axis=-1) + padding * silent) / CLIP_FRAMES
+        var = ((mfccs ** 2).sum(axis=-1) + padding * silent ** 2) / CLIP_FRAMES - mean ** 2
+        out[:, 8:8 + 2 * N_MFCC:2] = mean
+        out[:, 9:9 + 2 * N_MFCC:2] = np.sqrt(np.maximum(var, 0.0))
+
+        # Chroma features
+        out[:, 34:34 + N_CHROMA] = chroma_rows(clip_frames('power'), self.sr).sum(axis=-1) / CLIP_FRAMES
+
+        # Temporal features: onset_strength's envelope, zero over the silent padding
+        onset_env = np.zeros((n, CLIP_FRAMES))
+        rises = np.maximum(0.0, np.diff(mel_db, axis=-1)).mean(axis=1)
+        onset_env[:, ONSET_SHIFT:ONSET_SHIFT + num_frames - 1] = rises[:, :CLIP_FRAMES - ONSET_SHIFT]
+        onsets = librosa.onset.onset_detect(onset_envelope=onset_env, sr=self.sr,
+                                            hop_length=HOP_LENGTH, sparse=False)
+        out[:, 46] = onsets.sum(axis=-1) / CLIP_SECONDS
+
+        return out
+
+    def finish(self):
+        """End the stream: pad it with silence and return the features of its remaining windows"""
+        # Enough windows to cover every sample, and at least one
+        total_samples = self.total_samples
+        self._window_limit = 1 + max(0, -(-(total_samples - self.window_samples) // self.hop_samples))
+        end_sample = (self._window_limit - 1) * self.hop_samples + self.window_samples
+        features = self.push(np.zeros(end_sample - total_samples + N_FFT // 2, dtype=np.float32))
+        self.total_samples = total_samples
+        return features
+
+
+class IncrementalViterbi:
+    """
+    Viterbi decoding of note posteriors, one step per window, with a minimum
+    note duration. Steps are emitted as soon as all surviving paths agree on
+    them, or after ``max_lag`` steps along the best path at that point.
+    """
+
+    def __init__(self, num_notes=len(NOTES), min_duration=1, switch_prob=0.05, max_lag=64):
+        """
+        Args:
+            num_notes: Number of note classes
+            min_duration: Minimum steps a note lasts once entered
+            switch_prob: Probability of moving to another note once the
+                minimum duration is reached, per step
+            max_lag: Most steps held back waiting for paths to agree
+        """
+        self.num_notes = num_notes
+        self.min_duration = max(1, int(min_duration))
+        self.max_lag = max(1, max_lag)
+
+        # Each note is a chain of min_duration states; only the last may repeat or switch
+        d = self.min_duration
+        num_states = num_notes * d
+        with np.errstate(divide='ignore'):
+            log_transition = np.full((num_states, num_states), -np.inf)
+            for note in range(num_notes):
+                for k in range(d - 1):
+                    log_transition[note * d + k, note * d + k + 1] = 0.0
+                last = note * d + d - 1
+                log_transition[last, last] = np.log(1.0 - switch_prob)
+                for other in range(num_notes):
+                    if other != note:
+                        log_transition[last, other * d] = np.log(switch_prob / (num_notes - 1))
+        self._log_transition = log_transition
+        self._log_start = np.full(num_states, -np.inf)
+        self._log_start[::d] = -np.log(num_notes)
+
+        self._delta = None
+        self._backpointers = []  # Per held-back step: best predecessor of each state
+
+    def _note(self, state):
+        return int(state) // self.min_duration
+
+    def step(self, log_posteriors):
+        """Add [steps, notes] log posteriors; returns the note indices now final"""
+        final = []
+        for log_posterior in np.atleast_2d(log_posteriors):
+            emission = np.repeat(log_posterior, self.min_duration)
+            if self._delta is None:
+                delta = self._log_start + emission
+                backpointer = np.zeros(len(delta), dtype=int)
+            else:
+                scores = self._delta[:, None] + self._log_transition
+                backpointer = np.argmax(scores, axis=0)
+                delta = scores[backpointer, np.arange(len(backpointer))] + emission
+            self._delta = delta - delta.max()
+            self._backpointers.append(backpointer)
+            final.extend(self._commit_converged())
+        return final
+
+    def _commit(self, last, state):
+        """Emit held-back steps up to ``last``, given the state at ``last``"""
+        states = [state]
+        for i in range(last, 0, -1):
+            states.append(self._backpointers[i][states[-1]])
+        del self._backpointers[:last + 1]
+        return [self._note(s) for s in reversed(states)]
+
+    def _commit_converged(self):
+        states = np.arange(len(self._delta))
+        i = len(self._backpointers) - 1
+        while i > 0 and not (states == states[0]).all():
+            states = self._backpointers[i][states]
+            i -= 1
+        if (states == states[0]).all():
+            return self._commit(i, states[0])
+        if len(self._backpointers) <= self.max_lag:
+            return []
+
+        # Force out the oldest step along the best path, and prune paths that disagree
+        best = np.argmax(self._delta)
+        ancestors = np.arange(len(self._delta))
+        for i in range(len(self._backpointers) - 1, 0, -1):
+            ancestors = self._backpointers[i][ancestors]
+        self._delta[ancestors != ancestors[best]] = -np.inf
+        return self._commit(0, ancestors[best])
+
+    def flush(self):
+        """Emit every held-back step along the best path and reset"""
+        if self._delta is None or not self._backpointers:
+            return []
+        final = self._commit(len(self._backpointers) - 1, np.argmax(self._delta))
+        self._delta = None
+        return final
+
+
+def window_posteriors(features, model, scaler):
+    """Softmax note posteriors for a [windows, 47] feature matrix, in one batch"""
+    if len(features) == 0:
+        return np.empty((0, len(NOTES)))
+    features_tensor = torch.FloatTensor(scaler.transform(features))
+    with torch.no_grad():
+        return torch.softmax(model(features_tensor), dim=1).cpu().numpy()
+
+
+class NoteSequenceDecoder:
+    """Streaming note sequence decoding: window features, batched model, Viterbi"""
+
+    def __init__(self, model, scaler, window_seconds=1.0, hop_seconds=0.25,
+                 min_note_seconds=0.5, switch_prob=0.05, max_lag_seconds=16.0):
+        """
+        Args:
+            model: Trained note classifier (in eval mode)
+            scaler: Fitted feature scaler
+            window_seconds: Length of each analysis window
+            hop_seconds: Step between windows; the time resolution of the output
+            min_note_seconds: Shortest note the decoder will emit
+            switch_prob: Prior probability of a note change per window
+            max_lag_seconds: Longest a label waits for the Viterbi paths to agree
+        """
+        self.model = model
+        self.scaler = scaler
+        self.featurizer = WindowFeaturizer(SAMPLE_RATE, window_seconds, hop_seconds)
+        hop = self.featurizer.hop_samples / SAMPLE_RATE
+        self.viterbi = IncrementalViterbi(len(NOTES), min_duration=round(min_note_seconds / hop),
+                                          switch_prob=switch_prob, max_lag=round(max_lag_seconds / hop))
+        self.total_samples = 0
+        self._labels_emitted = 0
+        self._open_segment = None  # [note, start, end] still being extended
+
+    def _decode(self, features):
+        posteriors = window_posteriors(features, self.model, self.scaler)
+        return self.viterbi.step(np.log(np.maximum(posteriors, MIN_POSTERIOR)))
+
+    def _slot_start(self, window):
+        """Start time of the span a window's label covers: its hop around the window center"""
+        if window == 0:
+            return 0.0
+        featurizer = self.featurizer
+        return (window * featurizer.hop_samples + (featurizer.window_samples - featurizer.hop_samples) / 2) / SAMPLE_RATE
+
+    def _segments(self, labels, final=False):
+        """Merge per-window labels into (note, start, end) segments; returns the closed ones"""
+        closed = []
+        for label in labels:
+            window = self._labels_emitted
+            self._labels_emitted += 1
+            note, start, end = NOTES[label], self._slot_start(window), self._slot_start(window + 1)
+            if self._open_segment is not None and self._open_segment[0] == note:
+                self._open_segment[2] = end
+                continue
+            if self._open_segment is not None:
+                closed.append(tuple(self._open_segment))
+            self._open_segment = [note, start, end]
+        if final and self._open_segment is not None:
+            self._open_segment[2] = self.total_samples / SAMPLE_RATE
+            closed.append(tuple(self._open_segment))
+            self._open_segment = None
+        return closed
+
+    def push(self, audio):
+        """Add 22050 Hz mono samples; returns notes that have ended, as (note, start s, end s)"""
+        self.total_samples += len(audio)
+        return self._segments(self._decode(self.featurizer.push(audio)))
+
+    def finish(self):
+        """Decode the rest of the stream; returns the remaining notes"""
+        if self.total_samples == 0:
+            return []
+        labels = self._decode(self.featurizer.finish()) + self.viterbi.flush()
+        return self._segments(labels, final=True)
+
+
+def decode_note_sequence(audio, sr, model, scaler, **kwargs):
+    """Decode a whole recording into (note, start s, end s) segments"""
+    if sr != SAMPLE_RATE:
+        audio = librosa.resample(audio, orig_sr=sr, target_sr=SAMPLE_RATE)
+    decoder = NoteSequenceDecoder(model, scaler, **kwargs)
+    return decoder.push(audio) + decoder.finish()
@@ -0,0 +1,365 @@
+#!/usr/bin/env python3
+"""
+Talking Drum Pitch Classifier
+=============================
+A fast, model-free note classifier for low-power devices and live feedback.
+It estimates the fundamental frequency of the stroke with the YIN pitch
+tracker and maps it to the nearest note band. MFCC, chroma and the neural
+model are skipped entirely.
+
+Only the onset region is analysed: the loudest frame of the clip, where the
+stroke lands, and the ``ONSET_SECONDS`` after it, before the drum's pitch
+glides and decays. Each note is a Gaussian over log-frequency. By default the
+bands are the fundamental ranges documented in ``get_cultural_info`` (Do
+85-120 Hz up to Ti 220-300 Hz). Calibrating from a training set replaces them
+with each note's measured median and spread:
+
+    python pitch_classifier.py --input augmented_talking_drum_dataset --output model/pitch_bands.json
+    python pitch_classifier.py --input talking_drum_dataset --output model/pitch_bands.json --benchmark
+
+The confidence is the band posterior of the chosen note, scaled by how steady
+the pitch is across the onset frames and by how far the f0 lies outside the
+band, so noisy or unpitched clips report a low confidence instead of a
+confident guess.
+"""
+
+import argparse
+import json
+import os
+import time
+from pathlib import Path
+
+import numpy as np
+import librosa
+
+SAMPLE_RATE = 22050
+NOTES = ['Do', 'Fa', 'La', 'Mi', 'Re', 'So', 'Ti']
+
+# Fundamental ranges from get_cultural_info, used until the bands are calibrated
+DOCUMENTED_RANGES = {
+    'Do': (85, 120),
+    'Re': (95, 140),
+    'Mi': (110, 160),
+    'Fa': (130, 180),
+    'So': (150, 220),
+    'La': (180, 250),
+    'Ti': (220, 300),
+}
+PITCH_BANDS_FILE = 'pitch_bands.json'
+
+F0_MIN = 60.0
+F0_MAX = 400.0
+FRAME_LENGTH = 1024  # 46 ms at 22050 Hz, over two periods of F0_MIN
+HOP_LENGTH = 256
+ONSET_SECONDS = 0.25
+SILENCE_RMS = 1e-4
+STEADY_OCTAVES = 1 / 12  # Frames within a semitone of the median count as steady
+MIN_SIGMA_OCTAVES = 1 / 24  # Calibrated bands are never narrower than a quarter tone either side
+
+
+def estimate_f0(audio, sr=SAMPLE_RATE):
+    """
+    Fundamental frequency of a stroke, from the onset region of a clip
+
+    Returns:
+        (f0 in Hz, steadiness in [0, 1]), or (None, 0.0) for a silent clip
+    """
+    audio = np.asarray(audio, dtype=np.float32)
+    if len(audio) < FRAME_LENGTH:
+        audio = np.pad(audio, (0, FRAME_LENGTH - len(audio)))
+
+    rms = librosa.feature.rms(y=audio, frame_length=FRAME_LENGTH, hop_length=HOP_LENGTH, center=False)[0]
+    peak = int(np.argmax(rms))
+    if rms[peak] < SILENCE_RMS:
+        return None, 0.0
+
+    start = peak * HOP_LENGTH
+    region = audio[start:start + int(ONSET_SECONDS * sr) + FRAME_LENGTH]
+    rms = rms[peak:peak + 1 + (len(region) - FRAME_LENGTH) // HOP_LENGTH]
+
+    f0 = librosa.yin(region, fmin=F0_MIN, fmax=F0_MAX, sr=sr,
+                     frame_length=FRAME_LENGTH, hop_length=HOP_LENGTH, center=False)
+    log_f0 = np.log2(f0)
+    weights = rms
+
+    # Energy-weighted median, so the decaying tail does not outvote the stroke
+    order = np.argsort(log_f0)
+    cumulative = np.cumsum(weights[order])
+    median = log_f0[order][np.searchsorted(cumulative, cumulative[-1] / 2)]
+    steady = weights[np.abs(log_f0 - median) <= STEADY_OCTAVES].sum() / weights.sum()
+    return float(2 ** median), float(steady)
+
+
+class PitchClassifier:
+    """Maps a clip's fundamental frequency to the nearest note band"""
+
+    def __init__(self, bands, calibrated=False):
+        """
+        Args:
+            bands: note -> (center in Hz, spread in octaves)
+            calibrated: Whether the bands were measured from training data
+        """
+        self.bands = bands
+        self.calibrated = calibrated
+        self._notes = list(bands)
+        self._centers = np.log2([bands[note][0] for note in self._notes])
+        self._sigmas = np.array([bands[note][1] for note in self._notes])
+
+    @classmethod
+    def from_ranges(cls, ranges=DOCUMENTED_RANGES):
+        """Bands from (low, high) Hz ranges, taken as two spreads either side of the center"""
+        return cls({note: (float(np.sqrt(low * high)), float(np.log2(high / low) / 4))
+                    for note, (low, high) in ranges.items()})
+
+    @classmethod
+    def calibrate(cls, f0s, labels):
+        """Bands from the median and spread of the measured f0 of each note's clips"""
+        f0s = np.asarray(f0s, dtype=float)
+        labels = np.asarray(labels)
+        fallback = cls.from_ranges().bands
+        bands = {}
+        for note in NOTES:
+            log_f0 = np.log2(f0s[(labels == note) & np.isfinite(f0s)])
+            if len(log_f0) == 0:
+                bands[note] = fallback[note]
+                continue
+            median = np.median(log_f0)
+            spread = 1.4826 * np.median(np.abs(log_f0 - median))  # MAD, robust to octave errors
+            bands[note] = (float(2 ** median), float(max(spread, MIN_SIGMA_OCTAVES)))
+        return cls(bands, calibrated=True)
+
+    def save(self, path):
+        with open(path, 'w') as f:
+            json.dump({'calibrated': self.calibrated,
+                       'bands': {note: list(band) for note, band in self.bands.items()}}, f, indent=2)
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as f:
+            data = json.load(f)
+        return cls({note: tuple(band) for note, band in data['bands'].items()},
+                   calibrated=data.get('calibrated', True))
+
+    def probabilities(self, f0):
+        """Posterior of each note for a fundamental frequency, with equal priors"""
+        z = (np.log2(f0) - self._centers) / self._sigmas
+        log_likelihood = -0.5 * z ** 2 - np.log(self._sigmas)
+        posterior = np.exp(log_likelihood - log_likelihood.max())
+        return posterior / posterior.sum()
+
+    def in_band(self, note, f0):
+        """1 within two spreads of a note's center, falling off quickly outside it"""
+        i = self._notes.index(note)
+        z = (np.log2(f0) - self._centers[i]) / self._sigmas[i]
+        return float(np.exp(-0.5 * max(z ** 2 - 4, 0.0)))
+
+    def predict(self, audio, sr=SAMPLE_RATE):
+        """
+        Classify a clip by its pitch
+
+        Returns:
+            Dict with note, confidence and all_confidences (percentages, in the
+            NOTES order used by the neural models), f0 and steadiness, or None
+            for a silent clip
+        """
+        f0, steady = estimate_f0(audio, sr)
+        if f0 is None:
+            return None
+        posterior = dict(zip(self._notes, self.probabilities(f0)))
+        note = max(posterior, key=posterior.get)
+        return {
+            'note': note,
+            'confidence': posterior[note] * steady * self.in_band(note, f0) * 100,
+            'all_confidences': {name: posterior.get(name, 0.0) * 100 for name in NOTES},
+            'f0': f0,
+            'steadiness': steady,
+        }
+
+
+def load_pitch_classifier(model_dirs=('model', '../model')):
+    """Calibrated bands from the first model folder that has them, else the documented ranges"""
+    for model_dir in model_dirs:
+        path = os.path.join(model_dir, PITCH_BANDS_FILE)
+        if os.path.exists(path):
+            return PitchClassifier.load(path)
+    return PitchClassifier.from_ranges()
+
+
+def _estimate_files(paths, sr, cache_dir=None):
+    """Worker: decode a group of files and estimate the f0 of each (NaN if silent)"""
+    from decoded_cache import DecodedAudioCache
+
+    cache = DecodedAudioCache(cache_dir, sr) if cache_dir is not None else None
+    f0s = []
+    for path in paths:
+        try:
+            audio = cache.load(path) if cache is not None else librosa.load(path, sr=sr)[0]
+            f0, _ = estimate_f0(audio, sr)
+        except Exception as e:
+            print(f"⚠️  Error loading {path}: {e}")
+            f0 = None
+        f0s.append(np.nan if f0 is None else f0)
+    return f0s
+
+
+def calibrate_from_dataset(dataset_path, workers=None, files_per_task=16, sr=SAMPLE_RATE,
+                           decoded_cache=None, verbose=True):
+    """Measure the f0 of every clip in a ``<dataset>/<note>/<file>`` folder and fit the bands"""
+    # Imported here so serving the classifier needs nothing beyond numpy and librosa
+    from concurrent.futures import ProcessPoolExecutor
+    from featurize_dataset import list_dataset_files
+    from tqdm import tqdm
+
+    files = list_dataset_files(dataset_path)
+    paths = [str(path) for _, path in files]
+    tasks = [paths[i:i + files_per_task] for i in range(0, len(paths), files_per_task)]
+    f0s = []
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(_estimate_files, task, sr, decoded_cache) for task in tasks]
+        for future in tqdm(futures, desc="Estimating f0", unit="task", disable=not verbose):
+            f0s.extend(future.result())
+
+    labels = [note for note, _ in files]
+    classifier = PitchClassifier.calibrate(f0s, labels)
+    if verbose:
+        print(f"📁 Measured {np.isfinite(f0s).sum()} of {len(files)} clips in {dataset_path}")
+        print(format_bands(classifier))
+    return classifier
+
+
+def format_bands(classifier):
+    lines = [f"   {'note':<8}{'center Hz':>10}{'low Hz':>9}{'high Hz':>9}"]
+    for note, (center, sigma) in classifier.bands.items():
+        lines.append(f"   {note:<8}{center:>10.1f}{center * 2 ** (-2 * sigma):>9.1f}{center * 2 ** (2 * sigma):>9.1f}")
+    return '\n'.join(lines)
+
+
+def benchmark_against_neural(files, classifier, model, scaler, sr=SAMPLE_RATE):
+    """
+    Latency and agreement of the pitch classifier against the feature + neural
+    path, on labelled (note, path) files. Decoding is not timed; both paths
+    start from the decoded clip.
+    """
+    import torch
+    from feature_extraction import extract_features
+
+    def neural_predict(audio):
+        features = scaler.transform(np.asarray(extract_features(audio, sr)).reshape(1, -1))
+        with torch.no_grad():
+            return NOTES[int(model(torch.FloatTensor(features)).argmax(dim=1)[0])]
+
+    clips = [(note, librosa.load(path, sr=sr)[0]) for note, path in files]
+    # Warm up both paths (YIN's first call compiles its kernels) so timings are steady state
+    classifier.predict(clips[0][1], sr)
+    neural_predict(clips[0][1])
+
+    pitch_ms, neural_ms = [], []
+    rows = []
+    for note, audio in clips:
+
+        start = time.perf_counter()
+        fast = classifier.predict(audio, sr)
+        pitch_ms.append(1000 * (time.perf_counter() - start))
+
+        start = time.perf_counter()
+        neural = neural_predict(audio)
+        neural_ms.append(1000 * (time.perf_counter() - start))
+
+        rows.append((note, fast['note'] if fast else None, fast['confidence'] if fast else 0.0, neural))
+
+    labels = np.array([row[0] for row in rows])
+    pitch = np.array([row[1] for row in rows])
+    confidence = np.array([row[2] for row in rows])
+    neural = np.array([row[3] for row in rows])
+    confident = confidence >= 50
+    return {
+        'clips': len(rows),
+        'pitch_ms_mean': float(np.mean(pitch_ms)),
+        'pitch_ms_p95': float(np.percentile(pitch_ms, 95)),
+        'neural_ms_mean': float(np.mean(neural_ms)),
+        'neural_ms_p95': float(np.percentile(neural_ms, 95)),
+        'speedup': float(np.mean(neural_ms) / np.mean(pitch_ms)),
+        'agreement': float(np.mean(pitch == neural)),
+        'pitch_accuracy': float(np.mean(pitch == labels)),
+        'neural_accuracy': float(np.mean(neural == labels)),
+        'confident_share': float(confident.mean()),
+        'confident_agreement': float(np.mean(pitch[confident] == neural[confident])) if confident.any() else 0.0,
+    }
+
+
+def format_benchmark(results):
+    return '\n'.join([
+        f"   {'path':<8}{'mean ms':>10}{'p95 ms':>10}{'accuracy':>10}",
+        f"   {'pitch':<8}{results['pitch_ms_mean']:>10.2f}{results['pitch_ms_p95']:>10.2f}{results['pitch_accuracy']:>10.1%}",
+        f"   {'neural':<8}{results['neural_ms_mean']:>10.2f}{results['neural_ms_p95']:>10.2f}{results['neural_accuracy']:>10.1%}",
+        f"   Pitch path is {results['speedup']:.1f}x faster and agrees with the neural path on "
+        f"{results['agreement']:.1%} of {results['clips']} clips",
+        f"   Confidence >= 50%: {results['confident_share']:.1%} of clips, agreeing on "
+        f"{results['confident_agreement']:.1%} of them",
+    ])
+
+
+def main():
+    """Main function to run calibration and benchmarking from command line"""
+    parser = argparse.ArgumentParser(description='Talking Drum Pitch Classifier')
+
+    parser.add_argument('--input', '-i', type=str,
+                       default='/home/user/Documents/yomi_talking_drum/augmented_talking_drum_dataset',
+                       help='Path to dataset folder (one subfolder per note)')
+
+    parser.add_argument('--output', '-o', type=str, default=os.path.join('model', PITCH_BANDS_FILE),
+                       help=f'Calibrated bands file (default: model/{PITCH_BANDS_FILE})')
+
+    parser.add_argument('--workers', '-w', type=int, default=None,
+                       help='Worker processes for calibration (default: number of CPUs)')
+
+    parser.add_argument('--decoded-cache', type=str, default=None,
+                       help='Folder caching originals decoded to float32, shared with '
+                            'dataset_augmentation.py --decoded-cache (default: off)')
+
+    parser.add_argument('--benchmark', action='store_true',
+                       help='Compare latency and agreement with the neural model on the dataset, '
+                            'using the bands in --output (calibrating first if missing)')
+
+    parser.add_argument('--model-dir', type=str, default='model',
+                       help='Folder with best_model.pth and scaler.pkl for --benchmark (default: model)')
+
+    parser.add_argument('--quiet', '-q', action='store_true',
+                       help='Run in quiet mode with minimal output')
+
+    args = parser.parse_args()
+
+    if not os.path.exists(args.input):
+        print(f"❌ Error: Dataset not found at {args.input}")
+        return
+
+    if args.benchmark and os.path.exists(args.output):
+        classifier = PitchClassifier.load(args.output)
+    else:
+        start_time = time.time()
+        classifier = calibrate_from_dataset(args.input, workers=args.workers,
+                                            decoded_cache=args.decoded_cache, verbose=not args.quiet)
+        Path(args.output).parent.mkdir(parents=True, exist_ok=True)
+        classifier.save(args.output)
+        if not args.quiet:
+            print(f"✅ Bands saved to {args.output} ({time.time() - start_time:.1f} seconds)")
+
+    if args.benchmark:
+        import pickle
+        import torch
+        from talking_drum_models import CNNModel
+        from featurize_dataset import list_dataset_files
+
+        model = CNNModel(input_size=47, num_classes=7)
+        model.load_state_dict(torch.load(os.path.join(args.model_dir, 'best_model.pth'), map_location='cpu'))
+        model.eval()
+        with open(os.path.join(args.model_dir, 'scaler.pkl'), 'rb') as f:
+            scaler = pickle.load(f)
+
+        results = benchmark_against_neural(list_dataset_files(args.input), classifier, model, scaler)
+        print("⏱️  Pitch classifier vs neural model:")
+        print(format_benchmark(results))
+
+
+if __name__ == "__main__":
+    main()
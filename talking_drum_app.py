@@ -21,11 +21,15 @@ import matplotlib.pyplot as plt
 import seaborn as sns
 from sklearn.preprocessing import StandardScaler
 import pickle
+import hashlib
 import os
 import tempfile
 from datetime import datetime
 import io
 
+from note_sequence import decode_note_sequence
+from pitch_classifier import load_pitch_classifier
+
 # Page configuration
 st.set_page_config(
     page_title="Yoruba Talking Drum Translator",
@@ -34,6 +38,15 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
+# Upload results cached per content hash; least recently used entries are evicted past these
+AUDIO_CACHE_ENTRIES = 8  # Decoded clips are the largest entries
+FEATURE_CACHE_ENTRIES = 64
+PREDICTION_CACHE_ENTRIES = 64
+ENVELOPE_CACHE_ENTRIES = 64
+
+# Min/max envelope points per waveform plot, about the plot's width in pixels
+WAVEFORM_POINTS = 1000
+
 # Custom CSS
 st.markdown("""
 <style>
@@ -179,13 +192,56 @@ def load_model_and_scaler():
         st.error(f"Error loading model: {e}")
         return None, None
 
-def predict_note(audio, sr, model, scaler):
-    """Predict the tonic solfa note from audio"""
+@st.cache_resource
+def load_fast_classifier():
+    """Model-free pitch classifier for fast mode (calibrated bands if exported)"""
+    return load_pitch_classifier(('model',))
+
+def audio_digest(data):
+    """Content hash identifying an uploaded or recorded clip across reruns"""
+    return hashlib.sha256(data).hexdigest()
+
+@st.cache_data(max_entries=AUDIO_CACHE_ENTRIES, show_spinner=False)
+def decode_audio(digest, suffix, _data):
+    """Decode audio bytes to 22050 Hz mono (cached by content hash)"""
+    with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as tmp_file:
+        tmp_file.write(_data)
+        tmp_path = tmp_file.name
+    try:
+        return librosa.load(tmp_path, sr=22050)
+    finally:
+        # Clean up temp file
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+@st.cache_data(max_entries=FEATURE_CACHE_ENTRIES, show_spinner=False)
+def cached_features(digest, _audio, sr):
+    """Feature vector of a decoded clip (cached by content hash)"""
+    return extract_features(_audio, sr)
+
+@st.cache_data(max_entries=PREDICTION_CACHE_ENTRIES, show_spinner=False)
+def cached_prediction(digest, _audio, sr, _model, _scaler):
+    """Prediction results for a decoded clip (cached by content hash)"""
+    results, _ = predict_note(_audio, sr, _model, _scaler, digest=digest)
+    return results
+
+@st.cache_data(max_entries=PREDICTION_CACHE_ENTRIES, show_spinner=False)
+def cached_pitch_prediction(digest, _audio, sr, _classifier):
+    """Fast-mode prediction from the pitch of the stroke (cached by content hash)"""
+    return _classifier.predict(_audio, sr)
+
+@st.cache_data(max_entries=PREDICTION_CACHE_ENTRIES, show_spinner=False)
+def cached_note_sequence(digest, _audio, sr, _model, _scaler, min_note_seconds):
+    """Note sequence of a recording of continuous playing (cached by content hash)"""
+    return decode_note_sequence(_audio, sr, _model, _scaler, min_note_seconds=min_note_seconds)
+
+def predict_note(audio, sr, model, scaler, digest=None):
+    """Predict the tonic solfa note from audio (features cached if its digest is given)"""
     # Class labels
     NOTES = ['Do', 'Fa', 'La', 'Mi', 'Re', 'So', 'Ti']
     
     # Extract features
-    features = extract_features(audio, sr)
+    features = extract_features(audio, sr) if digest is None else cached_features(digest, audio, sr)
     if features is None:
         return None, None
     
@@ -215,11 +271,25 @@ def predict_note(audio, sr, model, scaler):
     
     return results, audio
 
-def plot_waveform(audio, sr):
-    """Plot audio waveform"""
+def waveform_envelope(audio, sr, points=WAVEFORM_POINTS):
+    """Per-bin time, minimum and maximum of a waveform decimated to ``points`` bins"""
+    points = max(1, min(points, len(audio)))
+    edges = np.linspace(0, len(audio), points + 1).astype(int)
+    lower = np.minimum.reduceat(audio, edges[:-1])
+    upper = np.maximum.reduceat(audio, edges[:-1])
+    time = (edges[:-1] + edges[1:]) / (2 * sr)
+    return time, lower, upper
+
+@st.cache_data(max_entries=ENVELOPE_CACHE_ENTRIES, show_spinner=False)
+def cached_envelope(digest, _audio, sr):
+    """Waveform envelope of a decoded clip (cached by content hash)"""
+    return waveform_envelope(_audio, sr)
+
+def plot_waveform(audio, sr, digest=None):
+    """Plot audio waveform as its min/max envelope, so cost does not grow with clip length"""
     fig, ax = plt.subplots(figsize=(10, 3))
-    time = np.linspace(0, len(audio) / sr, len(audio))
-    ax.plot(time, audio, color='#FF6B35', alpha=0.7)
+    time, lower, upper = waveform_envelope(audio, sr) if digest is None else cached_envelope(digest, audio, sr)
+    ax.fill_between(time, lower, upper, color='#FF6B35', alpha=0.7, linewidth=0.5)
     ax.set_xlabel('Time (seconds)', fontsize=12)
     ax.set_ylabel('Amplitude', fontsize=12)
     ax.set_title('Audio Waveform', fontsize=14, fontweight='bold')
@@ -252,6 +322,11 @@ def plot_confidence_bars(confidences):
     plt.tight_layout()
     return fig
 
+def show_figure(fig):
+    """Render a figure and release it, so figures do not accumulate in the long-lived server"""
+    st.pyplot(fig)
+    plt.close(fig)
+
 def get_cultural_info(note):
     """Get cultural information about the note"""
     info = {
@@ -333,6 +408,11 @@ def main():
         st.metric("Accuracy", "100%", delta="Perfect")
         st.metric("Classes", "7 notes")
         st.metric("Features", "47 audio features")
+        
+        st.markdown("---")
+        fast_mode = st.checkbox("⚡ Fast pitch mode", value=False,
+                                help="Classify by the drum's pitch alone, skipping the neural model. "
+                                     "Much faster, slightly less accurate.")
     
     # Main content
     tab1, tab2, tab3 = st.tabs(["📁 Upload Audio", "🎙️ Real-Time Recording", "📚 About the Dataset"])
@@ -345,14 +425,11 @@ def main():
         uploaded_file = st.file_uploader("Choose an audio file", type=['wav', 'mp3', 'm4a', 'aac'])
         
         if uploaded_file is not None:
-            # Save uploaded file temporarily
-            with tempfile.NamedTemporaryFile(delete=False, suffix=os.path.splitext(uploaded_file.name)[1]) as tmp_file:
-                tmp_file.write(uploaded_file.read())
-                tmp_path = tmp_file.name
-            
             try:
-                # Load audio
-                audio, sr = librosa.load(tmp_path, sr=22050)
+                # Load audio; reruns with the same file reuse the decoded clip
+                data = uploaded_file.getvalue()
+                digest = audio_digest(data)
+                audio, sr = decode_audio(digest, os.path.splitext(uploaded_file.name)[1], data)
                 
                 # Display audio player
                 st.audio(uploaded_file, format=f'audio/{uploaded_file.type.split("/")[1]}')
@@ -360,7 +437,10 @@ def main():
                 # Predict button
                 if st.button("🎯 Predict Note", type="primary"):
                     with st.spinner("Analyzing audio..."):
-                        results, processed_audio = predict_note(audio, sr, model, scaler)
+                        if fast_mode:
+                            results = cached_pitch_prediction(digest, audio, sr, load_fast_classifier())
+                        else:
+                            results = cached_prediction(digest, audio, sr, model, scaler)
                         
                         if results:
                             # Display prediction
@@ -374,6 +454,8 @@ def main():
                                 confidence = results['confidence']
                                 conf_class = "confidence-high" if confidence > 80 else "confidence-medium" if confidence > 50 else "confidence-low"
                                 st.markdown(f'<p class="{conf_class}">Confidence: {confidence:.2f}%</p>', unsafe_allow_html=True)
+                                if 'f0' in results:
+                                    st.markdown(f"Pitch: {results['f0']:.1f} Hz")
                                 st.markdown('</div>', unsafe_allow_html=True)
                                 
                                 # Cultural information
@@ -385,10 +467,10 @@ def main():
                             
                             with col2:
                                 # Waveform plot
-                                st.pyplot(plot_waveform(audio, sr))
+                                show_figure(plot_waveform(audio, sr, digest))
                                 
                                 # Confidence plot
-                                st.pyplot(plot_confidence_bars(results['all_confidences']))
+                                show_figure(plot_confidence_bars(results['all_confidences']))
                             
                             # Detailed confidence scores
                             st.markdown("### 📊 Detailed Confidence Scores")
@@ -399,14 +481,23 @@ def main():
                             st.dataframe(conf_df, use_container_width=True)
                         else:
                             st.error("Failed to process audio. Please try another file.")
+                
+                # Sequence mode for recordings of continuous playing
+                with st.expander("🎼 Continuous playing: decode a note sequence"):
+                    min_note = st.slider("Minimum note duration (seconds)", 0.25, 2.0, 0.5, 0.25)
+                    if st.button("🎼 Decode Note Sequence"):
+                        with st.spinner("Decoding note sequence..."):
+                            segments = cached_note_sequence(digest, audio, sr, model, scaler, min_note)
+                        st.markdown("### 🎼 Note Sequence")
+                        st.markdown(" → ".join(f"**{note}**" for note, _, _ in segments))
+                        st.dataframe({
+                            'Note': [note for note, _, _ in segments],
+                            'Start (s)': [f"{start:.2f}" for _, start, _ in segments],
+                            'End (s)': [f"{end:.2f}" for _, _, end in segments]
+                        }, use_container_width=True)
             
             except Exception as e:
                 st.error(f"Error processing file: {e}")
-            
-            finally:
-                # Clean up temp file
-                if os.path.exists(tmp_path):
-                    os.remove(tmp_path)
     
     # Tab 2: Real-Time Recording
     with tab2:
@@ -430,15 +521,15 @@ def main():
                 
                 if st.button("🎯 Analyze Recording", type="primary"):
                     with st.spinner("Analyzing recorded audio..."):
-                        # Save to temp file
-                        with tempfile.NamedTemporaryFile(delete=False, suffix='.wav') as tmp_file:
-                            tmp_file.write(audio_bytes.getvalue())
-                            tmp_path = tmp_file.name
-                        
                         try:
                             # Load and process
-                            audio, sr = librosa.load(tmp_path, sr=22050)
-                            results, processed_audio = predict_note(audio, sr, model, scaler)
+                            data = audio_bytes.getvalue()
+                            digest = audio_digest(data)
+                            audio, sr = decode_audio(digest, '.wav', data)
+                            if fast_mode:
+                                results = cached_pitch_prediction(digest, audio, sr, load_fast_classifier())
+                            else:
+                                results = cached_prediction(digest, audio, sr, model, scaler)
                             
                             if results:
                                 # Display results (same as upload mode)
@@ -452,6 +543,8 @@ def main():
                                     confidence = results['confidence']
                                     conf_class = "confidence-high" if confidence > 80 else "confidence-medium" if confidence > 50 else "confidence-low"
                                     st.markdown(f'<p class="{conf_class}">Confidence: {confidence:.2f}%</p>', unsafe_allow_html=True)
+                                    if 'f0' in results:
+                                        st.markdown(f"Pitch: {results['f0']:.1f} Hz")
                                     st.markdown('</div>', unsafe_allow_html=True)
                                     
                                     # Cultural information
@@ -462,15 +555,11 @@ def main():
                                     st.markdown(f"**Cultural Significance:** {info.get('cultural', 'N/A')}")
                                 
                                 with col2:
-                                    st.pyplot(plot_waveform(audio, sr))
-                                    st.pyplot(plot_confidence_bars(results['all_confidences']))
+                                    show_figure(plot_waveform(audio, sr, digest))
+                                    show_figure(plot_confidence_bars(results['all_confidences']))
                         
                         except Exception as e:
                             st.error(f"Error processing recording: {e}")
-                        
-                        finally:
-                            if os.path.exists(tmp_path):
-                                os.remove(tmp_path)
         
         except AttributeError:
             st.info("📝 Note: Audio recording requires Streamlit version 1.28+")
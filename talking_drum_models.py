@@ -0,0 +1,104 @@
+"""
+Talking Drum Model Architectures
+================================
+The two classifiers served by the backend, over the 47 features of
+``feature_extraction``. ``train_model.py`` and ``backend/main.py`` both
+import them from here, so state dicts trained here load there unchanged.
+"""
+
+import torch
+import torch.nn as nn
+
+
+class TalkingDrumModel(nn.Module):
+    """Enhanced Talking Drum Model with Cultural Context"""
+    def __init__(self, input_size=47, num_classes=7, d_model=128):
+        super(TalkingDrumModel, self).__init__()
+        self.input_size = input_size
+        self.d_model = d_model
+        
+        # Input projection
+        self.input_projection = nn.Linear(input_size, d_model)
+        
+        # Positional embedding
+        self.pos_embedding = nn.Parameter(torch.randn(1, d_model))
+        
+        # Transformer layers
+        self.transformer = nn.TransformerEncoder(
+            nn.TransformerEncoderLayer(
+                d_model=d_model,
+                nhead=8,
+                dim_feedforward=256,
+                dropout=0.1,
+                batch_first=True
+            ),
+            num_layers=6
+        )
+        
+        # Cultural attention
+        self.cultural_attention = nn.MultiheadAttention(d_model, 4, batch_first=True)
+        
+        # Layer norm
+        self.layer_norm = nn.LayerNorm(d_model)
+        
+        # Classifier
+        self.classifier = nn.Sequential(
+            nn.Linear(d_model, 64),
+            nn.ReLU(),
+            nn.Dropout(0.3),
+            nn.Linear(64, num_classes)
+        )
+    
+    def forward(self, x):
+        # Project input
+        x = self.input_projection(x)  # [batch, d_model]
+        x = x.unsqueeze(1)  # [batch, 1, d_model]
+        
+        # Add positional embedding
+        x = x + self.pos_embedding.unsqueeze(0)
+        
+        # Transformer
+        x = self.transformer(x)
+        
+        # Cultural attention
+        attn_out, _ = self.cultural_attention(x, x, x)
+        x = x + attn_out
+        
+        # Layer norm
+        x = self.layer_norm(x)
+        
+        # Classifier
+        x = x.squeeze(1)  # [batch, d_model]
+        x = self.classifier(x)
+        
+        return x
+
+
+class CNNModel(nn.Module):
+    """Convolutional Neural Network for audio classification"""
+    def __init__(self, input_size=47, num_classes=7):
+        super(CNNModel, self).__init__()
+        self.features = nn.Sequential(
+            nn.Linear(input_size, 256),
+            nn.ReLU(),
+            nn.Dropout(0.3),
+            nn.Linear(256, 128),
+            nn.ReLU(),
+            nn.Dropout(0.3),
+            nn.Linear(128, 64),
+            nn.ReLU(),
+            nn.Dropout(0.2),
+        )
+        self.classifier = nn.Linear(64, num_classes)
+        
+    def forward(self, x):
+        x = self.features(x)
+        x = self.classifier(x)
+        return x
+
+
+# Architecture names used on the command line and in model_info.json
+ARCHITECTURES = {
+    'cnn': CNNModel,
+    'transformer': TalkingDrumModel,
+}
@@ -0,0 +1,432 @@
+#!/usr/bin/env python3
+"""
+Talking Drum Model Trainer
+==========================
+Trains a classifier from an augmented dataset and writes the serving
+artifacts the backend and the app load, without a notebook session:
+
+    model/best_model.pth       state dict of CNNModel or TalkingDrumModel
+    model/scaler.pkl           StandardScaler fitted on the training split
+    model/label_encoder.pkl    LabelEncoder over the note folders
+    model/model_info.json      architecture, hyperparameters, split and metrics
+                               (<stem>_info.json for another --model-file)
+    model/model_bundle.safetensors
+                               all of the above in one pickle-free, memory-mappable
+                               file, which the backend prefers (<stem>.safetensors)
+
+Features come from a ``featurize_dataset`` feature store, built or updated
+across all CPU cores before training, so only new or changed clips are
+featurized. Batches are read from the memory-mapped store by DataLoader
+workers while the main process trains with ``--threads`` intra-op threads.
+Training stops early once validation loss has not improved for
+``--patience`` epochs, keeping the best epoch's weights.
+
+Clips are split into train, validation and test sets by source recording:
+an original and all of its augmented variations land in the same set, so the
+held-out accuracy is measured on recordings the model has never heard.
+
+The model folder is replaced in one atomic step. The new artifacts are written,
+together with any other files already in the model folder (cascade weights,
+pitch bands), to a new version folder under ``.<name>.versions``, and the
+model folder is a symbolic link that is renamed over to point at it. A crash
+mid-run leaves the previous artifacts untouched.
+"""
+
+import argparse
+import copy
+import json
+import os
+import pickle
+import re
+import shutil
+import time
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+import torch
+import torch.nn as nn
+import torch.optim as optim
+from torch.utils.data import BatchSampler, DataLoader, Dataset, RandomSampler, SequentialSampler
+from sklearn.preprocessing import LabelEncoder, StandardScaler
+
+from feature_extraction import FEATURE_EXTRACTOR_VERSION, FEATURE_NAMES, NUM_FEATURES
+from featurize_dataset import featurize_dataset, features_path_for, load_feature_store
+from model_bundle import bundle_file_for, save_bundle
+from talking_drum_models import ARCHITECTURES
+
+MODEL_FILE = 'best_model.pth'
+SCALER_FILE = 'scaler.pkl'
+LABEL_ENCODER_FILE = 'label_encoder.pkl'
+MODEL_INFO_FILE = 'model_info.json'
+
+# Suffix dataset_augmentation.py gives a variation: <source stem>_aug_<file>_<variation>.wav
+VARIATION_SUFFIX = re.compile(r'_aug_\d{2}_\d{3}$')
+
+
+def info_file_for(model_file):
+    """Metadata file of a weights file: model_info.json for best_model.pth, <stem>_info.json otherwise"""
+    return MODEL_INFO_FILE if model_file == MODEL_FILE else f"{Path(model_file).stem}_info.json"
+
+
+class FeatureBatches(Dataset):
+    """
+    Scaled feature batches read from a feature store. Indexed with a list of
+    positions (one batch per item), so each batch is one fancy-indexed read of
+    the memory map rather than a row at a time.
+    """
+
+    def __init__(self, features_path, rows, labels, mean, scale):
+        self.features_path = features_path
+        self.rows = np.asarray(rows)
+        self.labels = torch.as_tensor(np.asarray(labels), dtype=torch.long)
+        self.mean = mean
+        self.scale = scale
+        self._features = None  # Opened lazily, once per DataLoader worker
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __getitem__(self, positions):
+        if self._features is None:
+            self._features = np.load(self.features_path, mmap_mode='r')
+        batch = (self._features[self.rows[positions]] - self.mean) / self.scale
+        return torch.from_numpy(batch.astype(np.float32)), self.labels[positions]
+
+
+def _worker_init(_):
+    # Workers only slice and scale arrays; leave the cores to the training process
+    torch.set_num_threads(1)
+
+
+def make_loader(dataset, batch_size, shuffle, workers, seed):
+    """DataLoader yielding whole batches from FeatureBatches"""
+    if shuffle:
+        sampler = RandomSampler(dataset, generator=torch.Generator().manual_seed(seed))
+    else:
+        sampler = SequentialSampler(dataset)
+    return DataLoader(dataset, sampler=BatchSampler(sampler, batch_size, drop_last=False),
+                      batch_size=None, num_workers=workers, persistent_workers=workers > 0,
+                      worker_init_fn=_worker_init if workers > 0 else None)
+
+
+def source_of(entry):
+    """
+    Source recording a feature store entry was made from, as "<note>/<stem>":
+    the stem of original_<name> copies, and variations with their _aug_ suffix removed
+    """
+    stem = Path(entry['path']).stem
+    if stem.startswith('original_'):
+        stem = stem[len('original_'):]
+    return f"{entry['note']}/{VARIATION_SUFFIX.sub('', stem)}"
+
+
+def split_rows(labels, groups, val_fraction=0.2, test_fraction=0.2, seed=42):
+    """
+    Train/validation/test split of row positions by group (source recording)
+
+    Each note's sources are shuffled and shared out in the given fractions,
+    so every row of a source lands in the same set and each note appears in
+    each set in proportion. A note needs at least three sources to be in all
+    three sets; notes with fewer are kept for training.
+
+    Returns:
+        (train, val, test) sorted row positions, and the labels used for
+        training only
+    """
+    labels = np.asarray(labels)
+    groups = np.asarray(groups)
+    rng = np.random.default_rng(seed)
+    train, val, test = [], [], []
+    train_only = []
+    for label in np.unique(labels):
+        sources = np.unique(groups[labels == label])
+        rng.shuffle(sources)
+        n_test = int(round(len(sources) * test_fraction))
+        n_val = int(round(len(sources) * val_fraction))
+        if len(sources) >= 3:
+            # At least one source in each set, and at least one left for training
+            n_val = min(max(n_val, 1), len(sources) - 2)
+            n_test = min(max(n_test, 1), len(sources) - n_val - 1)
+        else:
+            n_test = n_val = 0
+            train_only.append(label)
+        test.extend(sources[:n_test])
+        val.extend(sources[n_test:n_test + n_val])
+        train.extend(sources[n_test + n_val:])
+
+    if not val or not test:
+        raise ValueError("Too few source recordings for a held-out split: every note needs "
+                         "at least three originals in the dataset for validation and test sets")
+    return (np.flatnonzero(np.isin(groups, train)), np.flatnonzero(np.isin(groups, val)),
+            np.flatnonzero(np.isin(groups, test)), np.array(train_only, dtype=int))
+
+
+def evaluate(model, loader, criterion):
+    """Mean loss and accuracy of a model over a loader"""
+    model.eval()
+    total_loss, correct, total = 0.0, 0, 0
+    with torch.no_grad():
+        for features, labels in loader:
+            outputs = model(features)
+            total_loss += criterion(outputs, labels).item() * len(labels)
+            correct += (outputs.argmax(dim=1) == labels).sum().item()
+            total += len(labels)
+    return total_loss / max(total, 1), correct / max(total, 1)
+
+
+def train(model, train_loader, val_loader, epochs=50, lr=0.001, patience=8, verbose=True):
+    """
+    Train with Adam and cross-entropy, stopping once validation loss has not
+    improved for ``patience`` epochs
+
+    Returns:
+        (best state dict, history dict with per-epoch metrics and the best epoch)
+    """
+    criterion = nn.CrossEntropyLoss()
+    optimizer = optim.Adam(model.parameters(), lr=lr)
+    history = {'train_loss': [], 'val_loss': [], 'val_accuracy': [], 'best_epoch': 0}
+    best_loss = float('inf')
+    best_state = copy.deepcopy(model.state_dict())
+
+    for epoch in range(1, epochs + 1):
+        model.train()
+        total_loss, total = 0.0, 0
+        for features, labels in train_loader:
+            optimizer.zero_grad()
+            loss = criterion(model(features), labels)
+            loss.backward()
+            optimizer.step()
+            total_loss += loss.item() * len(labels)
+            total += len(labels)
+
+        val_loss, val_accuracy = evaluate(model, val_loader, criterion)
+        history['train_loss'].append(total_loss / max(total, 1))
+        history['val_loss'].append(val_loss)
+        history['val_accuracy'].append(val_accuracy)
+
+        improved = val_loss < best_loss
+        if improved:
+            best_loss = val_loss
+            best_state = copy.deepcopy(model.state_dict())
+            history['best_epoch'] = epoch
+        if verbose:
+            print(f"   Epoch {epoch:3d}: train loss {history['train_loss'][-1]:.4f}, "
+                  f"val loss {val_loss:.4f}, val acc {val_accuracy:.2%}{' *' if improved else ''}")
+        if epoch - history['best_epoch'] >= patience:
+            if verbose:
+                print(f"⏹️  No improvement for {patience} epochs; stopping at epoch {epoch}")
+            break
+
+    return best_state, history
+
+
+def write_artifacts(output_dir, state_dict, scaler, label_encoder, info, model_file=MODEL_FILE,
+                    hyperparameters=None):
+    """
+    Publish new artifacts as the model folder in one atomic step, carrying
+    over any other files it holds.
+
+    The artifacts go into a new version folder under the hidden
+    ``.<name>.versions`` folder, and the model folder is a symbolic link to
+    the current version. A new link is renamed over it, which swaps every file
+    at once: readers see the old or the new artifacts, never a missing folder,
+    and a model registry watching the parent folder never sees a half-written
+    version. The previous version is kept for readers still loading from it;
+    older ones are deleted. A plain model folder is moved into the versions
+    folder the first time, the only step that is not atomic.
+    """
+    output_dir = Path(output_dir).absolute()
+    versions_dir = output_dir.with_name(f".{output_dir.name}.versions")
+    version = versions_dir / f"{datetime.now():%Y%m%d-%H%M%S}-{os.getpid()}"
+    version.mkdir(parents=True)
+
+    info_file = info_file_for(model_file)
+    bundle_file = bundle_file_for(model_file)
+    written = {model_file, SCALER_FILE, LABEL_ENCODER_FILE, info_file, bundle_file}
+    if output_dir.is_dir():
+        for path in output_dir.iterdir():
+            if path.is_file() and path.name not in written:
+                shutil.copy2(path, version / path.name)
+
+    torch.save(state_dict, version / model_file)
+    with open(version / SCALER_FILE, 'wb') as f:
+        pickle.dump(scaler, f)
+    with open(version / LABEL_ENCODER_FILE, 'wb') as f:
+        pickle.dump(label_encoder, f)
+    with open(version / info_file, 'w') as f:
+        json.dump(info, f, indent=2)
+    save_bundle(version / bundle_file, state_dict, info['architecture'], hyperparameters,
+                scaler.mean_, scaler.scale_, info['classes'], info)
+
+    previous = None
+    if output_dir.is_symlink():
+        previous = output_dir.resolve()
+    elif output_dir.is_dir():
+        previous = versions_dir / f"{version.name}-previous"
+        os.replace(output_dir, previous)
+
+    # Relative target, so the project folder can be moved or copied
+    link = output_dir.with_name(f".{output_dir.name}.link-{os.getpid()}")
+    if link.is_symlink():
+        link.unlink()
+    link.symlink_to(os.path.relpath(version, output_dir.parent), target_is_directory=True)
+    os.replace(link, output_dir)
+
+    keep = {version.resolve(), previous.resolve() if previous else None}
+    for path in versions_dir.iterdir():
+        if path.resolve() not in keep:
+            shutil.rmtree(path, ignore_errors=True)
+
+
+def main():
+    """Main function to run training from command line"""
+    parser = argparse.ArgumentParser(description='Talking Drum Model Trainer')
+
+    parser.add_argument('--input', '-i', type=str,
+                       default='/home/user/Documents/yomi_talking_drum/augmented_talking_drum_dataset',
+                       help='Path to augmented dataset folder (one subfolder per note)')
+
+    parser.add_argument('--features', type=str,
+                       default='/home/user/Documents/yomi_talking_drum/feature_store',
+                       help='Feature store folder, created or updated before training')
+
+    parser.add_argument('--output', '-o', type=str, default='model',
+                       help='Model folder to write (default: model)')
+
+    parser.add_argument('--architecture', '-a', choices=sorted(ARCHITECTURES), default='cnn',
+                       help='Model to train (default: cnn)')
+
+    parser.add_argument('--model-file', type=str, default=MODEL_FILE,
+                       help=f'Weights file name in the model folder (default: {MODEL_FILE}; '
+                            'cnn_model.pth or transformer_model.pth for cascade serving)')
+
+    parser.add_argument('--epochs', type=int, default=50,
+                       help='Maximum training epochs (default: 50)')
+
+    parser.add_argument('--patience', type=int, default=8,
+                       help='Epochs without validation improvement before stopping (default: 8)')
+
+    parser.add_argument('--batch-size', type=int, default=32,
+                       help='Training batch size (default: 32)')
+
+    parser.add_argument('--lr', type=float, default=0.001,
+                       help='Adam learning rate (default: 0.001)')
+
+    parser.add_argument('--val-split', type=float, default=0.2,
+                       help='Fraction of source recordings held out for early stopping (default: 0.2)')
+
+    parser.add_argument('--test-split', type=float, default=0.2,
+                       help='Fraction of source recordings held out for the final test accuracy (default: 0.2)')
+
+    parser.add_argument('--seed', type=int, default=42,
+                       help='Seed for the split, initialization and shuffling (default: 42)')
+
+    parser.add_argument('--workers', '-w', type=int, default=None,
+                       help='Featurization processes (default: number of CPUs)')
+
+    parser.add_argument('--loader-workers', type=int, default=2,
+                       help='DataLoader worker processes reading batches (default: 2)')
+
+    parser.add_argument('--threads', type=int, default=None,
+                       help='PyTorch threads for training (default: CPUs not used by loader workers)')
+
+    parser.add_argument('--decoded-cache', type=str, default=None,
+                       help='Folder caching originals decoded to float32, shared with '
+                            'dataset_augmentation.py --decoded-cache (default: off)')
+
+    parser.add_argument('--quiet', '-q', action='store_true',
+                       help='Run in quiet mode with minimal output')
+
+    args = parser.parse_args()
+    verbose = not args.quiet
+
+    if not os.path.exists(args.input):
+        print(f"❌ Error: Dataset not found at {args.input}")
+        return
+
+    start_time = time.time()
+    featurize_dataset(args.input, args.features, workers=args.workers,
+                      verbose=verbose, decoded_cache=args.decoded_cache)
+    features, index = load_feature_store(args.features)
+    notes = [entry['note'] for entry in index['entries']]
+
+    label_encoder = LabelEncoder()
+    labels = label_encoder.fit_transform(notes)
+    sources = [source_of(entry) for entry in index['entries']]
+    try:
+        train_rows, val_rows, test_rows, train_only = split_rows(labels, sources, args.val_split,
+                                                                 args.test_split, args.seed)
+    except ValueError as e:
+        print(f"❌ Error: {e}")
+        return
+    if len(train_only) and verbose:
+        print(f"⚠️  Fewer than three source recordings for {', '.join(label_encoder.classes_[train_only])}: "
+              f"used for training only, not in the validation or test accuracy")
+
+    scaler = StandardScaler()
+    scaler.fit(np.asarray(features[train_rows]))
+
+    threads = args.threads or max(1, (os.cpu_count() or 1) - args.loader_workers)
+    torch.set_num_threads(threads)
+    torch.manual_seed(args.seed)
+
+    def loader(rows, shuffle):
+        dataset = FeatureBatches(features_path_for(args.features, index), rows, labels[rows],
+                                 scaler.mean_, scaler.scale_)
+        return make_loader(dataset, args.batch_size, shuffle, args.loader_workers, args.seed)
+
+    hyperparameters = {'input_size': NUM_FEATURES, 'num_classes': len(label_encoder.classes_)}
+    model = ARCHITECTURES[args.architecture](**hyperparameters)
+    if verbose:
+        print(f"🚀 Training {type(model).__name__} on {len(train_rows)} clips "
+              f"({len(val_rows)} validation, {len(test_rows)} test), {threads} threads")
+    best_state, history = train(model, loader(train_rows, True), loader(val_rows, False),
+                                epochs=args.epochs, lr=args.lr, patience=args.patience, verbose=verbose)
+
+    model.load_state_dict(best_state)
+    criterion = nn.CrossEntropyLoss()
+    _, val_accuracy = evaluate(model, loader(val_rows, False), criterion)
+    _, test_accuracy = evaluate(model, loader(test_rows, False), criterion)
+
+    info = {
+        'architecture': args.architecture,
+        'model_class': type(model).__name__,
+        'model_file': args.model_file,
+        'input_size': NUM_FEATURES,
+        'num_classes': len(label_encoder.classes_),
+        'classes': [str(c) for c in label_encoder.classes_],
+        'hyperparameters': {
+            'epochs': args.epochs,
+            'patience': args.patience,
+            'batch_size': args.batch_size,
+            'lr': args.lr,
+            'seed': args.seed,
+        },
+        'split': {'train': len(train_rows), 'val': len(val_rows), 'test': len(test_rows),
+                  'grouped_by': 'source', 'sources': len(set(sources)),
+                  'train_only_classes': [str(c) for c in label_encoder.classes_[train_only]]},
+        'epochs_run': len(history['val_loss']),
+        'best_epoch': history['best_epoch'],
+        'val_accuracy': val_accuracy,
+        'test_accuracy': test_accuracy,
+        'feature_extractor_version': FEATURE_EXTRACTOR_VERSION,
+        'feature_names': list(FEATURE_NAMES),
+        'sample_rate': index['sample_rate'],
+        'dataset_path': str(args.input),
+        'torch_version': torch.__version__,
+        'trained_at': datetime.now().isoformat(timespec='seconds'),
+    }
+    write_artifacts(args.output, best_state, scaler, label_encoder, info, model_file=args.model_file,
+                    hyperparameters=hyperparameters)
+
+    if verbose:
+        print(f"✅ Artifacts written to {args.output}: {args.model_file}, {SCALER_FILE}, "
+              f"{LABEL_ENCODER_FILE}, {info_file_for(args.model_file)}, {bundle_file_for(args.model_file)}")
+        print(f"🎯 Best epoch {history['best_epoch']}: validation accuracy {val_accuracy:.2%}, "
+              f"test accuracy {test_accuracy:.2%}")
+        print(f"⏱️  Total time: {time.time() - start_time:.1f} seconds")
+
+
+if __name__ == "__main__":
+    main()